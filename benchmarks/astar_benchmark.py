@@ -0,0 +1,79 @@
+"""Compares A* against plain Dijkstra for long point-to-point trips.
+
+Usage: python -m benchmarks.astar_benchmark [--size 80] [--queries 200] [--intensity 2.5]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.street_grid import build_street_grid
+from src.network.geo import haversine_m
+from src.network.path_search import point_to_point
+
+
+def long_trip_pairs(graph, count, seed):
+    """Samples source/target pairs whose great-circle span is in the top half of the network."""
+    rng = random.Random(seed)
+    nodes = range(graph.node_count)
+    span_limit = float(haversine_m(graph.x.min(), graph.y.min(), graph.x.max(), graph.y.max()))
+    pairs = []
+    while len(pairs) < count:
+        s, t = rng.sample(nodes, 2)
+        if haversine_m(graph.x[s], graph.y[s], graph.x[t], graph.y[t]) >= span_limit / 2:
+            pairs.append((s, t))
+    return pairs
+
+
+def run(size, queries, intensity, seed):
+    net_graph = build_street_grid(size, size, seed=seed)
+    if intensity:
+        net_graph.simulate_traffic(intensity=intensity, seed=seed)
+    graph = net_graph.compiled
+
+    results = {}
+    for label, heuristic in (('dijkstra', False), ('astar', True)):
+        settled, latency, distances = [], [], []
+        for s, t in long_trip_pairs(graph, queries, seed):
+            start = time.perf_counter()
+            dist, _, count = point_to_point(graph, s, t, heuristic=heuristic)
+            latency.append((time.perf_counter() - start) * 1000)
+            settled.append(count)
+            distances.append(dist)
+        results[label] = {
+            'mean_settled': statistics.fmean(settled),
+            'median_latency_ms': statistics.median(latency),
+            'mean_latency_ms': statistics.fmean(latency),
+            'distances': distances,
+        }
+
+    assert all(abs(a - b) <= 1e-9 * max(1.0, a)
+               for a, b in zip(results['dijkstra']['distances'], results['astar']['distances']))
+    for entry in results.values():
+        del entry['distances']
+    return {
+        'nodes': graph.node_count,
+        'edges': graph.edge_count,
+        'queries': queries,
+        'intensity': intensity,
+        'min_cost_per_metre': graph.min_cost_per_metre(),
+        'settled_reduction': 1 - results['astar']['mean_settled'] / results['dijkstra']['mean_settled'],
+        'latency_reduction': 1 - results['astar']['mean_latency_ms'] / results['dijkstra']['mean_latency_ms'],
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=80, help='grid side length (nodes per row/column)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--intensity', type=float, default=2.5,
+                        help='simulate_traffic intensity; 0 keeps the normalized composite weight')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.queries, args.intensity, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
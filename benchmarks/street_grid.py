@@ -0,0 +1,65 @@
+import math
+import random
+
+import networkx as nx
+
+from src.network.geo import haversine_m
+from src.network.network_generator import LogisticsNetwork
+
+ORIGIN = (40.7033, -73.9894)  # DUMBO, NYC - same centre main.py samples around
+BLOCK_M = 100.0
+METRES_PER_DEG_LAT = 111_320.0
+
+
+def build_street_grid(rows, cols, seed=42, one_way_share=0.3, arterial_every=6):
+    """Builds a seeded, street-like LogisticsNetwork on a perturbed lon/lat grid.
+
+    Every arterial_every-th street is a two-way arterial; other streets are local and a
+    one_way_share of their blocks are one-way in a single direction per street. Node
+    roles, urgency and demand are assigned from the same seed, so runs are reproducible.
+    """
+    rng = random.Random(seed)
+    lat0, lon0 = ORIGIN
+    deg_lat = BLOCK_M / METRES_PER_DEG_LAT
+    deg_lon = BLOCK_M / (METRES_PER_DEG_LAT * math.cos(math.radians(lat0)))
+
+    g = nx.DiGraph()
+    for r in range(rows):
+        for c in range(cols):
+            g.add_node(r * cols + c,
+                       x=lon0 + (c + rng.uniform(-0.25, 0.25)) * deg_lon,
+                       y=lat0 + (r + rng.uniform(-0.25, 0.25)) * deg_lat)
+
+    def add_street(cells, arterial):
+        # Local one-way streets alternate direction, like a Manhattan-style grid.
+        direction = rng.choice((1, -1)) if not arterial and rng.random() < one_way_share else 0
+        speed = 48 if arterial else rng.choice((25, 32, 40))
+        for u, v in zip(cells[:-1], cells[1:]):
+            straight = float(haversine_m(g.nodes[u]['x'], g.nodes[u]['y'], g.nodes[v]['x'], g.nodes[v]['y']))
+            attrs = dict(length=straight * rng.uniform(1.0, 1.15), speed_kph=speed,
+                         capacity=rng.randint(35, 50) if arterial else rng.randint(10, 30))
+            if direction >= 0:
+                g.add_edge(u, v, **attrs)
+            if direction <= 0:
+                g.add_edge(v, u, **attrs)
+
+    for r in range(rows):
+        add_street([r * cols + c for c in range(cols)], arterial=r % arterial_every == 0)
+    for c in range(cols):
+        add_street([r * cols + c for r in range(rows)], arterial=c % arterial_every == 0)
+
+    nodes = list(g.nodes)
+    rng.shuffle(nodes)
+    for i, node in enumerate(nodes):
+        if i == 0:
+            role = {'type': 'warehouse', 'urgency': 0, 'demand': 0}
+        elif i < 4:
+            role = {'type': 'hub', 'urgency': 0, 'demand': 0}
+        else:
+            role = {'type': 'customer', 'urgency': rng.choices([0, 1, 2], weights=[0.6, 0.3, 0.1])[0],
+                    'demand': rng.uniform(5, 25)}
+        g.nodes[node].update(role)
+
+    # Keep the largest strongly connected component, as SpatialDataMapper does.
+    largest = max(nx.strongly_connected_components(g), key=len)
+    return LogisticsNetwork(input_graph=g.subgraph(largest).copy())
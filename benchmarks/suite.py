@@ -0,0 +1,217 @@
+"""Times and memory-profiles the routing pipeline on synthetic street grids.
+
+Usage: python -m benchmarks.suite [--sizes 100,1000,10000,100000] [--stops 10,50,200]
+                                  [--fleets 1,3] [--solvers greedy,or_tools] [--output FILE]
+       python -m benchmarks.suite --compare BASELINE.json CANDIDATE.json [--threshold 1.2]
+
+Every stage is run once untraced for wall time and once under tracemalloc for peak
+Python heap use. Results are written as JSON (one record per stage) tagged with the git
+commit, so two runs can be diffed with --compare.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.street_grid import build_street_grid
+from src.solvers.decomposition_solver import DecompositionSolver
+from src.solvers.greedy_solver import GreedySolver
+from src.solvers.local_search import LocalSearchSolver
+from src.solvers.or_solver import ORSolver
+
+SOLVERS = {
+    'greedy': GreedySolver,
+    'or_tools': ORSolver,
+    'decomposition': DecompositionSolver,
+    'local_search': LocalSearchSolver,
+}
+
+
+def build_network(node_count, seed):
+    """Street grid with roughly node_count nodes (before the largest-SCC cut)."""
+    side = max(2, math.ceil(math.sqrt(node_count)))
+    return build_street_grid(side, side, seed=seed)
+
+
+def measure(stage, setup=None, memory=True):
+    """Returns (result, seconds, peak_bytes) for stage(); setup() runs before each pass untimed.
+
+    peak_bytes is None when memory is False.
+    """
+    if setup:
+        setup()
+    start = time.perf_counter()
+    result = stage()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            stage()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def problem_for(net_graph, stops, fleet, seed):
+    """Samples a hub and stops customers, with a capacity that lets the fleet carry all demand."""
+    rng = random.Random(seed)
+    nodes = list(net_graph.NetGraph.nodes(data=True))
+    hub = next(node for node, data in nodes if data.get('type') == 'warehouse')
+    customers = [node for node, data in nodes if data.get('type') == 'customer']
+    chosen = rng.sample(customers, min(stops, len(customers)))
+    demands = {node: net_graph.NetGraph.nodes[node]['demand'] for node in chosen}
+    capacity = math.ceil(1.2 * sum(demands.values()) / fleet)
+    return hub, chosen, demands, capacity
+
+
+def run_size(node_count, stops_list, fleets, solvers, queries, seed, memory):
+    """Benchmarks every stage for one network size; returns a list of result records."""
+    records = []
+    net_graph, seconds, peak = measure(lambda: build_network(node_count, seed), memory=memory)
+    graph = net_graph.compiled
+    shape = {'nodes': graph.node_count, 'edges': graph.edge_count}
+
+    def record(stage, seconds, peak, **extra):
+        records.append({'size': node_count, **shape, 'stage': stage, **extra, 'seconds': seconds,
+                        'peak_mib': None if peak is None else peak / 2**20})
+        shape_note = ' '.join(f"{key}={extra[key]}" for key in ('stops', 'fleet') if key in extra)
+        print(f"  {stage:<18} {shape_note:<18} {seconds:8.3f}s", file=sys.stderr)
+
+    record('build_network', seconds, peak)
+
+    def drop_snapshot():
+        net_graph._compiled = None
+
+    _, seconds, peak = measure(lambda: net_graph.compiled, setup=drop_snapshot, memory=memory)
+    record('compile', seconds, peak)
+
+    rng = random.Random(seed)
+    pairs = [tuple(rng.sample(graph.node_ids, 2)) for _ in range(queries)]
+
+    def point_queries():
+        return [net_graph.get_path_distance(s, t) for s, t in pairs]
+
+    _, seconds, peak = measure(point_queries, setup=net_graph.path_cache.clear, memory=memory)
+    record('get_path_distance', seconds, peak, queries=queries, mean_ms=1000 * seconds / queries)
+
+    for stops in stops_list:
+        hub, customers, demands, _ = problem_for(net_graph, stops, 1, seed)
+        locations = [hub] + customers
+        _, seconds, peak = measure(lambda: ORSolver()._build_time_matrix(net_graph, locations),
+                                   setup=net_graph.path_cache.clear, memory=memory)
+        record('build_time_matrix', seconds, peak, stops=len(customers))
+
+        for fleet in fleets:
+            hub, customers, demands, capacity = problem_for(net_graph, stops, fleet, seed)
+            for name in solvers:
+                solver = SOLVERS[name]()
+                solution, seconds, peak = measure(
+                    lambda: solver.solve(hub, customers, vehicle_count=fleet, capacity=capacity,
+                                         net_graph=net_graph, demands=demands),
+                    setup=net_graph.path_cache.clear, memory=memory)
+                record(f'solve_{name}', seconds, peak, stops=len(customers), fleet=fleet,
+                       served=len(solution.served), total_time=float(sum(solution.travel_times)))
+    return records
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def record_key(entry):
+    """Identifies the same measurement across two result files."""
+    return (entry['size'], entry['stage'], entry.get('stops'), entry.get('fleet'))
+
+
+def compare(baseline, candidate, threshold, min_seconds=0.01):
+    """Prints candidate/baseline time ratios; returns the keys slower than threshold.
+
+    Stages that slowed by less than min_seconds are never flagged (timer noise).
+    """
+    before = {record_key(entry): entry for entry in baseline['results']}
+    regressions = []
+    print(f"baseline {baseline['environment']['commit']} -> candidate {candidate['environment']['commit']}")
+    for entry in candidate['results']:
+        old = before.get(record_key(entry))
+        if old is None or not old['seconds']:
+            continue
+        ratio = entry['seconds'] / old['seconds']
+        slower = ratio > threshold and entry['seconds'] - old['seconds'] >= min_seconds
+        flag = ' REGRESSION' if slower else ''
+        print(f"{str(record_key(entry)):<48} {old['seconds']:9.3f}s -> {entry['seconds']:9.3f}s  x{ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(record_key(entry))
+    return regressions
+
+
+def int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int_list, default=[100, 1_000, 10_000, 100_000],
+                        help='approximate node counts, comma separated')
+    parser.add_argument('--stops', type=int_list, default=[10, 50, 200])
+    parser.add_argument('--fleets', type=int_list, default=[1, 3])
+    parser.add_argument('--solvers', default=','.join(SOLVERS),
+                        help=f"comma separated subset of {','.join(SOLVERS)}")
+    parser.add_argument('--queries', type=int, default=20, help='point-to-point queries per size')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'))
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='time ratio above which --compare reports a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            regressions = compare(json.load(f), json.load(g), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    solvers = [name for name in args.solvers.split(',') if name]
+    unknown = set(solvers) - set(SOLVERS)
+    if unknown:
+        parser.error(f"unknown solvers: {sorted(unknown)}")
+
+    results = []
+    for size in args.sizes:
+        print(f"size ~{size} nodes", file=sys.stderr)
+        results.extend(run_size(size, args.stops, args.fleets, solvers, args.queries, args.seed,
+                                memory=not args.no_memory))
+
+    report = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,49 +3,55 @@ from src.network.spatial_data_mapper import SpatialDataMapper
 from src.network.network_generator import LogisticsNetwork
 from src.solvers.greedy_solver import GreedySolver
 from src.solvers.or_solver import ORSolver
+from src.solvers.portfolio import SolverPortfolio
+from src import instrumentation
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
-DATA_PATH = "data/brooklyn_net.json"
+DATA_PATH = "data/brooklyn_net.npz"
+LEGACY_DATA_PATH = "data/brooklyn_net.json"  # older JSON caches are migrated on first run
 HUB_NODE = 42469596  # must be a valid node ID in the graph
 RUN_TYPE = 'multi' #option to select between single ('single') and multiple ('multi') vehicle runs
 VEHICLE_CAPACITY = 150
 VEHICLE_COUNT = 3
+PORTFOLIO_DEADLINE = 30  # seconds; solvers still running after this are dropped
+INSTRUMENT = True  # record per-stage timings and counters
+REPORT_PATH = "results/run_report.json"
 
 def main():
-    if os.path.exists(DATA_PATH):
-        logger.info("Loading network from cache...")
-        nyc_network = LogisticsNetwork.load_from_json(DATA_PATH)
-    else:
-        nyc_network = SpatialDataMapper.from_place("Brooklyn, NYC, NY, USA", center_point=(40.7033, -73.9894)) #Centre around DUMBO, NYC
-        os.makedirs("data", exist_ok=True)
-        nyc_network.save_to_json(DATA_PATH)
+    if INSTRUMENT:
+        instrumentation.enable()
+
+    with instrumentation.span('load_network'):
+        nyc_network = load_network()
     logger.info(f"Network built with {nyc_network.get_stats()} elements.")
 
-    start = list(nyc_network.NetGraph.nodes)[0]
-    end = list(nyc_network.NetGraph.nodes)[-1]
+    node_ids = nyc_network.compiled.node_ids
+    start, end = node_ids[0], node_ids[-1]
 
-    # Clear Roads
-    nyc_network.simulate_traffic(intensity=1.0)
-    time_clear = nyc_network.get_path_distance(start, end)
+    with instrumentation.span('traffic'):
+        # Clear roads vs. rush hour, compared side by side without mutating the graph
+        nyc_network.simulate_traffic_scenarios(intensities=[1.0, 2.5])
+        time_clear = nyc_network.get_path_distance(start, end, scenario=0)
+        time_rush = nyc_network.get_path_distance(start, end, scenario=1)
 
-    # Rush Hour
-    nyc_network.simulate_traffic(intensity=2.5)
-    time_rush = nyc_network.get_path_distance(start, end)
+        # Dispatch runs under rush-hour weights
+        nyc_network.simulate_traffic(intensity=2.5)
 
     logger.info(f"Midnight Run: {time_clear:.1f} mins")
     logger.info(f"Rush Hour: {time_rush:.1f} mins")
     logger.info(f"Traffic Delay: {time_rush - time_clear:.1f} mins")
 
-    #Convert to dataframes
-    node_df, _ = nyc_network.convert_to_dataframes()
+    with instrumentation.span('select_customers'):
+        #Only the urgency column is needed to pick the customers
+        node_df = nyc_network.node_table(columns=['urgency'])
 
-    urgent_cust_df = node_df.loc[node_df['urgency']>=1].copy()
-    urgent_nodes = urgent_cust_df['node_id'].tolist()
-    logger.info(f'High Urgency Nodes: {urgent_nodes}')
+        urgent_cust_df = node_df.loc[node_df['urgency']>=1].copy()
+        urgent_nodes = urgent_cust_df['node_id'].tolist()
+        logger.info(f'High Urgency Nodes: {urgent_nodes}')
 
-    demands = resolve_demands(urgent_nodes, nyc_network)
+        demands = resolve_demands(urgent_nodes, nyc_network)
 
     solvers = {
         'greedy': GreedySolver(),
@@ -54,11 +60,21 @@ def main():
 
     vehicle_count = 1 if RUN_TYPE == 'single' else VEHICLE_COUNT
 
-    for solver_name, solver in solvers.items():
+    # Both solvers run side by side on one shared cost matrix.
+    portfolio = SolverPortfolio(solvers, deadline=PORTFOLIO_DEADLINE)
+    with instrumentation.span('solve'):
+        result = portfolio.run(HUB_NODE, urgent_nodes, vehicle_count=vehicle_count,
+                               capacity=VEHICLE_CAPACITY, net_graph=nyc_network, demands=demands)
+    logger.info(f"Cost matrix built in {result.matrix_seconds:.2f}s; portfolio took {result.wall_seconds:.2f}s")
+
+    for run in result.runs:
+        solver_name = run.solver_name
+        if run.solution is None:
+            logger.error(f"No solution from {solver_name}: {run.error or 'deadline reached'}")
+            continue
+        solution = run.solution
         try:
-            solution = solver.solve(HUB_NODE, urgent_nodes, vehicle_count=vehicle_count,
-                                        capacity=VEHICLE_CAPACITY, net_graph=nyc_network,
-                                        demands=demands)
+            logger.info(f'[{solver_name}] Solved in {run.elapsed:.2f}s')
 
             for i, route in enumerate(solution.routes):
                 logger.info(f'[{solver_name}] Vehicle: {i}')
@@ -66,14 +82,43 @@ def main():
                 logger.info(f'[{solver_name}] Travel time: {solution.travel_times[i]}')
 
             print_fleet_summary(solution, urgent_nodes, demands)
-            save_solution_plots(nyc_network, solution, solver_name)
-        
         except Exception as ex:
-            logger.error(f"Error occurred while solving with {solver_name}: {ex}")
+            logger.error(f"Error occurred while reporting {solver_name}: {ex}")
             continue
 
+    # The street base map is drawn once; each solver's routes are overlaid in parallel.
+    solutions = [run.solution for run in result.runs if run.solution is not None]
+    try:
+        with instrumentation.span('plot'):
+            save_solution_plots(nyc_network, solutions)
+    except Exception as ex:
+        logger.error(f"Error occurred while plotting solutions: {ex}")
+
+    if result.best is not None:
+        logger.info(f"Best solution: {result.best.solver_name}")
+
     os.makedirs("results", exist_ok=True)
-    nyc_network.visualize(save_path="results/fleet_dispatch_schematic.png")
+    with instrumentation.span('plot'):
+        nyc_network.visualize(save_path="results/fleet_dispatch_schematic.png")
+
+    if instrumentation.is_enabled():
+        instrumentation.write_report(REPORT_PATH)
+
+
+def load_network():
+    """Loads the cached network, migrating a legacy JSON cache or building it from OSM if needed."""
+    if os.path.exists(DATA_PATH):
+        logger.info("Loading network from cache...")
+        return LogisticsNetwork.load_from_npz(DATA_PATH)
+    if os.path.exists(LEGACY_DATA_PATH):
+        logger.info("Migrating JSON network cache to the binary format...")
+        nyc_network = LogisticsNetwork.load_from_json(LEGACY_DATA_PATH)
+        nyc_network.save_to_npz(DATA_PATH)
+        return nyc_network
+    nyc_network = SpatialDataMapper.from_place("Brooklyn, NYC, NY, USA", center_point=(40.7033, -73.9894)) #Centre around DUMBO, NYC
+    os.makedirs("data", exist_ok=True)
+    nyc_network.save_to_npz(DATA_PATH)
+    return nyc_network
 
 
 def resolve_demands(customer_nodes, net_graph, demands=None):
@@ -106,15 +151,16 @@ def print_fleet_summary(solution, urgent_nodes, demands):
               f"{solution.travel_times[i]:.1f} mins, load={load:.2f}")
 
 
-def save_solution_plots(net_graph, solution, solver_name):
-    """Saves the street-network visualization for a solution's routes."""
+def save_solution_plots(net_graph, solutions):
+    """Saves the street-network visualization for each solution's routes."""
     os.makedirs("results", exist_ok=True)
     fleet_colors = ['#e74c3c', '#2ecc71', '#f1c40f'] 
 
-    net_graph.save_street_visualization(
-        f"results/{solver_name}_street_network.png",
-        route=[(route, fleet_colors[i % len(fleet_colors)]) for i, route in enumerate(solution.routes)]
-    )
+    net_graph.save_street_visualizations({
+        f"results/{solution.solver_name}_street_network.png":
+            [(route, fleet_colors[i % len(fleet_colors)]) for i, route in enumerate(solution.routes)]
+        for solution in solutions
+    })
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Disabled by default: span() then hands back one shared no-op object and count() returns
+# straight away, so instrumented code pays a flag check and nothing else.
+_enabled = False
+_started = None
+_spans = {}      # "outer/inner" path -> [count, total_seconds, max_seconds]
+_counters = {}
+_local = threading.local()
+
+
+def enable():
+    """Turns recording on (keeping anything already recorded)."""
+    global _enabled, _started
+    _enabled = True
+    if _started is None:
+        _started = time.time()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Drops all recorded spans, counters and this thread's open spans; restarts the run clock."""
+    global _started
+    _spans.clear()
+    _counters.clear()
+    _stack().clear()
+    _started = time.time() if _enabled else None
+
+
+def span(name):
+    """Context manager timing a pipeline stage. Spans nest: a span opened inside another
+    is recorded under "outer/inner"."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def count(name, value=1):
+    """Adds value to counter name."""
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    """Returns the recorded spans and counters as plain, JSON-ready dictionaries."""
+    return {
+        'spans': {path: {'count': n, 'total_seconds': total, 'max_seconds': longest}
+                  for path, (n, total, longest) in _spans.items()},
+        'counters': dict(_counters),
+    }
+
+
+def merge(other, under=None):
+    """Folds a snapshot() taken elsewhere (e.g. in a worker process) into this one.
+
+    Its spans are nested below the currently open span, and below under if given.
+    """
+    if not _enabled:
+        return
+    prefix = '/'.join(_stack() + ([under] if under else []))
+    for path, stats in other['spans'].items():
+        _record('/'.join(filter(None, (prefix, path))), stats['total_seconds'], stats['count'], stats['max_seconds'])
+    for name, value in other['counters'].items():
+        count(name, value)
+
+
+def report():
+    """Structured run report: start time, wall time since enable()/reset(), spans and counters."""
+    started = _started or time.time()
+    return {
+        'started_at': datetime.fromtimestamp(started, timezone.utc).isoformat(timespec='seconds'),
+        'wall_seconds': time.time() - started,
+        **snapshot(),
+    }
+
+
+def write_report(file_path):
+    """Writes report() as JSON to file_path."""
+    with open(file_path, 'w') as f:
+        json.dump(report(), f, indent=2)
+    logger.info(f"Run report written to {file_path}")
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(path, seconds, n=1, longest=None):
+    stats = _spans.get(path)
+    if stats is None:
+        stats = _spans[path] = [0, 0.0, 0.0]
+    stats[0] += n
+    stats[1] += seconds
+    stats[2] = max(stats[2], seconds if longest is None else longest)
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _stack().append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = _stack()
+        _record('/'.join(stack), elapsed)
+        stack.pop()
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
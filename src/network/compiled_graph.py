@@ -0,0 +1,168 @@
+import copy
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.network.geo import haversine_m
+
+
+class CompiledGraph:
+    """Read-only CSR snapshot of a LogisticsNetwork graph for routing queries.
+
+    Nodes are mapped to dense indices 0..n-1 (in NetGraph iteration order). The
+    out-edges of node i are targets[offsets[i]:offsets[i+1]], with matching
+    float64 costs in weights. x/y hold node lon/lat (NaN where missing). version records
+    the network version it was built from.
+    """
+
+    def __init__(self, node_ids, offsets, targets, weights, version=0, x=None, y=None):
+        self.node_ids = list(node_ids)
+        self.node_index = {node: i for i, node in enumerate(self.node_ids)}
+        self.offsets = self._freeze(np.asarray(offsets, dtype=np.int32))
+        self.targets = self._freeze(np.asarray(targets, dtype=np.int32))
+        self.weights = self._freeze(np.asarray(weights, dtype=np.float64))
+        missing = np.full(len(self.node_ids), np.nan)
+        self.x = self._freeze(missing.copy() if x is None else np.asarray(x, dtype=np.float64))
+        self.y = self._freeze(missing.copy() if y is None else np.asarray(y, dtype=np.float64))
+        self.version = version
+        self._min_cost_per_metre = None
+        self._unit_vectors = None
+        self._adjacency = None
+        self._reverse_adjacency = None
+        self._adjacency_lists = None
+        self._edge_keys = None
+
+    @classmethod
+    def from_networkx(cls, graph, weight='weight', version=0):
+        """Compiles a networkx DiGraph into CSR arrays."""
+        node_ids = list(graph.nodes)
+        node_index = {node: i for i, node in enumerate(node_ids)}
+
+        offsets = [0]
+        targets = []
+        weights = []
+        # Walking the adjacency dict source by source yields edges already grouped in CSR order.
+        for _, neighbours in graph.adjacency():
+            for v, data in neighbours.items():
+                targets.append(node_index[v])
+                weights.append(data.get(weight, 1))
+            offsets.append(len(targets))
+
+        x = [data.get('x', np.nan) for _, data in graph.nodes(data=True)]
+        y = [data.get('y', np.nan) for _, data in graph.nodes(data=True)]
+        return cls(node_ids, offsets, targets, weights, version=version, x=x, y=y)
+
+    def with_weights(self, weights, version=None):
+        """Returns a snapshot sharing this one's nodes and CSR layout but with other edge weights."""
+        snapshot = copy.copy(self)
+        snapshot.weights = self._freeze(np.asarray(weights, dtype=np.float64))
+        snapshot.version = self.version if version is None else version
+        snapshot._adjacency = None
+        snapshot._reverse_adjacency = None
+        snapshot._adjacency_lists = None
+        snapshot._min_cost_per_metre = None
+        return snapshot
+
+    @staticmethod
+    def _freeze(array):
+        array.flags.writeable = False
+        return array
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def index_of(self, node):
+        """Returns the dense index of node, raising NodeNotFound if it is not in the graph."""
+        try:
+            return self.node_index[node]
+        except KeyError:
+            raise nx.NodeNotFound(f"Node {node} not in graph") from None
+
+    def indices_of(self, nodes):
+        """Returns an int64 array of dense indices for nodes."""
+        nodes = list(nodes)
+        return np.fromiter((self.index_of(node) for node in nodes), dtype=np.int64, count=len(nodes))
+
+    def adjacency(self):
+        """Returns a scipy CSR matrix view over the snapshot arrays (built once, no copies)."""
+        if self._adjacency is None:
+            # Explicit zeros are kept by csgraph, so zero-cost edges stay traversable.
+            self._adjacency = csr_matrix((self.weights, self.targets, self.offsets),
+                                         shape=(self.node_count, self.node_count), copy=False)
+        return self._adjacency
+
+    def reverse_adjacency(self):
+        """Returns the transposed CSR matrix, so searches from a node follow edges backwards."""
+        if self._reverse_adjacency is None:
+            # tocsr() keeps explicit zeros, so zero-cost edges survive the transpose.
+            self._reverse_adjacency = self.adjacency().T.tocsr()
+        return self._reverse_adjacency
+
+    def adjacency_lists(self):
+        """Returns (offsets, targets, weights) as plain lists for pure-Python search loops."""
+        if self._adjacency_lists is None:
+            self._adjacency_lists = (self.offsets.tolist(), self.targets.tolist(), self.weights.tolist())
+        return self._adjacency_lists
+
+    def edge_sources(self):
+        """Returns the source node index of every edge, aligned with targets/weights."""
+        return np.repeat(np.arange(self.node_count, dtype=np.int32), np.diff(self.offsets))
+
+    def edge_indices(self, sources, targets):
+        """Returns the edge index (position in targets/weights) of each sources[k] -> targets[k] edge.
+
+        Vectorized over node-index arrays; raises ValueError if any pair is not an edge.
+        """
+        if self._edge_keys is None:
+            # Edge ids depend only on topology, so snapshots from with_weights share this lookup.
+            keys = self.edge_sources().astype(np.int64) * self.node_count + self.targets
+            order = np.argsort(keys, kind='stable')
+            self._edge_keys = self._freeze(keys[order]), self._freeze(order)
+        sorted_keys, order = self._edge_keys
+        wanted = np.asarray(sources, dtype=np.int64) * self.node_count + np.asarray(targets, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_keys, wanted), max(len(sorted_keys) - 1, 0))
+        if len(wanted) and (not len(sorted_keys) or not np.array_equal(sorted_keys[found], wanted)):
+            raise ValueError("Some node pairs are not edges of the graph")
+        return order[found]
+
+    def min_cost_per_metre(self):
+        """Smallest edge weight per metre of great-circle distance between its endpoints.
+
+        Scaling great-circle distance by this gives an admissible, consistent A* heuristic.
+        Returns 0.0 (plain Dijkstra) when any node lacks coordinates.
+        """
+        if self._min_cost_per_metre is None:
+            sources = self.edge_sources()
+            span = haversine_m(self.x[sources], self.y[sources], self.x[self.targets], self.y[self.targets])
+            ratio = 0.0
+            if np.isfinite(span).all() and (span > 0).any():
+                ratio = float((self.weights[span > 0] / span[span > 0]).min())
+            self._min_cost_per_metre = ratio
+        return self._min_cost_per_metre
+
+    def unit_vectors(self):
+        """Returns an (n, 3) array of node positions on the unit sphere (for chord distances)."""
+        if self._unit_vectors is None:
+            lon, lat = np.radians(self.x), np.radians(self.y)
+            self._unit_vectors = self._freeze(
+                np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))))
+        return self._unit_vectors
+
+    def path_from_predecessors(self, predecessors, source_idx, target_idx):
+        """Walks a predecessor array back from target_idx and returns the node-id path.
+
+        Raises NetworkXNoPath when target_idx was not reached from source_idx.
+        """
+        if source_idx != target_idx and predecessors[target_idx] < 0:
+            raise nx.NetworkXNoPath(
+                f"No path between {self.node_ids[source_idx]} and {self.node_ids[target_idx]}.")
+        path = [target_idx]
+        while path[-1] != source_idx:
+            path.append(predecessors[path[-1]])
+        return [self.node_ids[i] for i in reversed(path)]
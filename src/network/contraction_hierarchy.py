@@ -0,0 +1,335 @@
+import copy
+import heapq
+from array import array
+from collections import deque
+
+import numpy as np
+
+LEAF_SIZE = 32
+
+
+class ContractionHierarchy:
+    """Customizable contraction hierarchy (CCH) over a CompiledGraph.
+
+    Preprocessing is split in two phases:
+      * topology - a nested-dissection contraction order and the resulting chordal
+        "upward" graph, which depend only on which edges exist;
+      * metric   - customize() fills upward/downward arc weights from the graph's current
+        edge weights (basic pass over lower triangles, then a perfect pass over upper and
+        intermediate ones) and prunes arcs that cannot lie on any shortest path.
+
+    Weight-only changes (e.g. simulate_traffic) therefore only need customize(); the
+    topology phase is redone only when edges are added or removed.
+    """
+
+    def __init__(self, graph):
+        self._build_topology(graph)
+        self.customize(graph)
+
+    def matches_topology(self, graph):
+        """True if graph has the same nodes and edges this hierarchy was built for."""
+        return (graph.node_count == self.node_count
+                and np.array_equal(graph.offsets, self._offsets)
+                and np.array_equal(graph.targets, self._targets))
+
+    def _build_topology(self, graph):
+        n = graph.node_count
+        self.node_count = n
+        self._offsets = graph.offsets.copy()
+        self._targets = graph.targets.copy()
+        sources = np.repeat(np.arange(n), np.diff(graph.offsets)).tolist()
+        targets = graph.targets.tolist()
+
+        neighbours = [set() for _ in range(n)]
+        for u, v in zip(sources, targets):
+            if u != v:
+                neighbours[u].add(v)
+                neighbours[v].add(u)
+
+        # Eliminate in nested-dissection order; each contracted node's remaining neighbours
+        # become a clique (fill-in), which makes the upward graph chordal and the triangle
+        # passes exact. Separators go last, so upward search spaces stay small.
+        order = _nested_dissection_order(neighbours)
+        rank = [-1] * n
+        upward = [None] * n
+        for position, x in enumerate(order):
+            rank[x] = position
+            remaining = neighbours[x]
+            upward[x] = list(remaining)
+            for u in remaining:
+                neighbours[u].discard(x)
+                neighbours[u].update(remaining)
+                neighbours[u].discard(u)
+            neighbours[x] = set()
+        self.rank = np.asarray(rank, dtype=np.int64)
+
+        # Arcs are numbered contiguously per lower endpoint.
+        arc_of = {}
+        heads = []
+        first_arc = [0] * (n + 1)
+        for x in range(n):
+            first_arc[x] = len(heads)
+            for u in upward[x]:
+                arc_of[(x, u)] = len(heads)
+                heads.append(u)
+        first_arc[n] = len(heads)
+        self.arc_count = len(heads)
+        self._arc_of = arc_of
+        self._heads = np.asarray(heads, dtype=np.int64)
+        self._tails = np.repeat(np.arange(n), np.diff(first_arc))
+
+        # Lower triangles {x, u, v} with x ranked lowest and u below v.
+        xu_arcs, xv_arcs, uv_arcs, bottoms = array('q'), array('q'), array('q'), array('q')
+        for x in order:
+            ups = sorted(upward[x], key=rank.__getitem__)
+            for i, u in enumerate(ups):
+                xu = arc_of[(x, u)]
+                for v in ups[i + 1:]:
+                    xu_arcs.append(xu)
+                    xv_arcs.append(arc_of[(x, v)])
+                    uv_arcs.append(arc_of[(u, v)])
+                    bottoms.append(x)
+        triangles = tuple(np.frombuffer(column, dtype=np.int64) for column in (xu_arcs, xv_arcs, uv_arcs, bottoms))
+
+        # Both passes run one batch of triangles at a time. The basic pass writes arcs above
+        # x from arcs out of x, so it batches by level (longest chain of lower neighbours
+        # below x); the perfect pass writes arcs out of x from arcs above x, so it batches by
+        # height (longest chain of upward neighbours above x). Triangles in one batch never
+        # write what another triangle of the batch reads.
+        level = [0] * n
+        for x in order:
+            for u in upward[x]:
+                level[u] = max(level[u], level[x] + 1)
+        height = [0] * n
+        for x in reversed(order):
+            height[x] = max((height[u] + 1 for u in upward[x]), default=0)
+        self._basic_batches = _batches(triangles, np.asarray(level, dtype=np.int64))
+        self._perfect_batches = _batches(triangles, np.asarray(height, dtype=np.int64))
+
+        # Where each input edge lands: arc id, and whether it runs up (lower -> higher rank).
+        edge_arc = np.full(graph.edge_count, -1, dtype=np.int64)
+        edge_up = np.zeros(graph.edge_count, dtype=bool)
+        for k, (u, v) in enumerate(zip(sources, targets)):
+            if u == v:
+                continue
+            if rank[u] < rank[v]:
+                edge_arc[k] = arc_of[(u, v)]
+                edge_up[k] = True
+            else:
+                edge_arc[k] = arc_of[(v, u)]
+        self._edge_arc = edge_arc
+        self._edge_up = edge_up
+
+    def customize(self, graph):
+        """Metric phase: recomputes arc weights from graph.weights (same topology required)."""
+        up = np.full(self.arc_count, np.inf)
+        down = np.full(self.arc_count, np.inf)
+        weights = np.asarray(graph.weights, dtype=np.float64)
+
+        is_arc = self._edge_arc >= 0
+        up_edges = is_arc & self._edge_up
+        down_edges = is_arc & ~self._edge_up
+        np.minimum.at(up, self._edge_arc[up_edges], weights[up_edges])
+        np.minimum.at(down, self._edge_arc[down_edges], weights[down_edges])
+
+        up_mid = np.full(self.arc_count, -1, dtype=np.int64)
+        down_mid = np.full(self.arc_count, -1, dtype=np.int64)
+
+        # Basic pass, bottom-up: u -> x -> v and v -> x -> u through the lower node x.
+        for xu, xv, uv, x in self._basic_batches:
+            _relax(up, up_mid, uv, down[xu] + up[xv], x)
+            _relax(down, down_mid, uv, down[xv] + up[xu], x)
+
+        # Perfect pass, top-down: afterwards every arc weight is the true shortest distance.
+        # Arcs out of x combine their basic weights (shortest via lower nodes) with the
+        # already perfect arcs above x. An arc whose weight drops here is never on a
+        # shortest up-down path, so it is pruned.
+        basic_up, basic_down = up, down
+        up, down = up.copy(), down.copy()
+        for xu, xv, uv, _ in self._perfect_batches:
+            np.minimum.at(up, xu, basic_up[xv] + down[uv])
+            np.minimum.at(down, xu, up[uv] + basic_down[xv])
+            np.minimum.at(up, xv, basic_up[xu] + up[uv])
+            np.minimum.at(down, xv, down[uv] + basic_down[xu])
+
+        self._up_mid, self._down_mid = up_mid.tolist(), down_mid.tolist()
+        self._upward_adj = self._search_adjacency(basic_up, up)
+        self._downward_adj = self._search_adjacency(basic_down, down)
+        self.version = graph.version
+
+    def customized_copy(self, graph):
+        """Returns a copy customized for graph's weights, sharing this one's topology."""
+        hierarchy = copy.copy(self)
+        hierarchy.customize(graph)
+        return hierarchy
+
+    def _search_adjacency(self, basic, perfect):
+        """Per-node lists of (head, weight, arc) for arcs that survive pruning."""
+        keep = np.flatnonzero((basic == perfect) & np.isfinite(basic))
+        adjacency = [[] for _ in range(self.node_count)]
+        for tail, head, weight, arc in zip(self._tails[keep].tolist(), self._heads[keep].tolist(),
+                                           basic[keep].tolist(), keep.tolist()):
+            adjacency[tail].append((head, weight, arc))
+        return adjacency
+
+    def distance(self, source_idx, target_idx):
+        """Returns the shortest-path cost from source_idx to target_idx (inf if unreachable)."""
+        return self._query(source_idx, target_idx)[0]
+
+    def path(self, source_idx, target_idx):
+        """Returns the shortest path as a list of node indices, or None if unreachable."""
+        _, meet, forward_parent, backward_parent = self._query(source_idx, target_idx)
+        if meet < 0:
+            return None
+
+        upward_arcs = []
+        node = meet
+        while node != source_idx:
+            node, arc = forward_parent[node]
+            upward_arcs.append(arc)
+
+        path = [source_idx]
+        for arc in reversed(upward_arcs):
+            path.extend(self._unpack(arc, upward=True)[1:])
+        node = meet
+        while node != target_idx:
+            node, arc = backward_parent[node]
+            path.extend(self._unpack(arc, upward=False)[1:])
+        return path
+
+    def _query(self, source_idx, target_idx):
+        """Bidirectional upward search; returns (distance, meeting node, both parent maps)."""
+        forward, forward_parent = _upward_search(source_idx, self._upward_adj)
+        meet = [float('inf'), -1]
+        _, backward_parent = _upward_search(target_idx, self._downward_adj, forward, meet)
+        return meet[0], meet[1], forward_parent, backward_parent
+
+    def _unpack(self, arc, upward):
+        """Expands a (possibly shortcut) arc into original node indices, in travel order."""
+        path = []
+        stack = [(arc, upward)]
+        while stack:
+            arc, upward = stack.pop()
+            low, high = int(self._tails[arc]), int(self._heads[arc])
+            mid = self._up_mid[arc] if upward else self._down_mid[arc]
+            start, end = (low, high) if upward else (high, low)
+            if mid < 0:
+                if not path:
+                    path.append(start)
+                path.append(end)
+                continue
+            # start -> mid runs down from start, mid -> end runs up to end; push in reverse.
+            stack.append((self._arc_of[(mid, end)], True))
+            stack.append((self._arc_of[(mid, start)], False))
+        return path
+
+
+def _batches(triangles, key):
+    """Splits triangle columns into groups of equal key[bottom], in ascending key order."""
+    order = np.argsort(key[triangles[3]], kind='stable')
+    columns = tuple(column[order] for column in triangles)
+    bounds = np.flatnonzero(np.diff(key[columns[3]])) + 1
+    return list(zip(*(np.split(column, bounds) for column in columns)))
+
+
+def _relax(weights, mids, arcs, via, bottoms):
+    """weights[arcs] = min(weights[arcs], via), recording the bottom node of each strict improvement."""
+    before = weights[arcs]
+    np.minimum.at(weights, arcs, via)
+    better = (via < before) & (via == weights[arcs])
+    mids[arcs[better]] = bottoms[better]
+
+
+def _upward_search(start, adjacency, other_side=None, meet=None):
+    """Dijkstra over pruned upward arcs from start.
+
+    Without other_side the search runs to exhaustion. With it (the opposite side's
+    distances), meet is updated in place with the best [distance, node] and the search
+    stops as soon as its frontier can no longer beat it.
+    """
+    dist = {start: 0.0}
+    parent = {}
+    settled = set()
+    heap = [(0.0, start)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        if other_side is not None:
+            if d >= meet[0]:
+                break
+            total = d + other_side.get(u, float('inf'))
+            if total < meet[0]:
+                meet[0], meet[1] = total, u
+        settled.add(u)
+        for head, weight, arc in adjacency[u]:
+            candidate = d + weight
+            if candidate < dist.get(head, float('inf')):
+                dist[head] = candidate
+                parent[head] = (u, arc)
+                heapq.heappush(heap, (candidate, head))
+    return dist, parent
+
+
+def _nested_dissection_order(neighbours, leaf_size=LEAF_SIZE):
+    """Returns a contraction order from recursive BFS level-structure bisection.
+
+    Each part is split at the median BFS level (grown from a pseudo-peripheral node);
+    that level is a separator and is ordered after both halves. Parts of at most
+    leaf_size nodes are ordered as-is.
+    """
+    part = [0] * len(neighbours)
+    next_part = 1
+
+    def bfs_levels(start, part_id):
+        level = {start: 0}
+        queue = deque([start])
+        last = start
+        while queue:
+            u = queue.popleft()
+            last = u
+            for v in neighbours[u]:
+                if part[v] == part_id and v not in level:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level, last
+
+    order = []
+    # LIFO work list of (nodes, is_separator); halves are pushed after their separator
+    # so the emitted order is left half, right half, separator.
+    work = [(list(range(len(neighbours))), False)]
+    while work:
+        nodes, is_separator = work.pop()
+        if is_separator or len(nodes) <= leaf_size:
+            order.extend(nodes)
+            continue
+
+        part_id = next_part
+        next_part += 1
+        for x in nodes:
+            part[x] = part_id
+
+        level, far = bfs_levels(nodes[0], part_id)
+        if len(level) < len(nodes):
+            # Disconnected part: handle the reached component and the rest independently.
+            work.append(([x for x in nodes if x not in level], False))
+            work.append((list(level), False))
+            continue
+
+        level, _ = bfs_levels(far, part_id)
+        by_level = {}
+        for x, depth in level.items():
+            by_level.setdefault(depth, []).append(x)
+
+        reached = 0
+        cut = 0
+        for depth in sorted(by_level):
+            reached += len(by_level[depth])
+            if reached * 2 >= len(nodes):
+                cut = depth
+                break
+
+        work.append((by_level[cut], True))
+        work.append(([x for x, depth in level.items() if depth > cut], False))
+        work.append(([x for x, depth in level.items() if depth < cut], False))
+    return order
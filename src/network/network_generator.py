@@ -1,65 +1,141 @@
 
 import json
 import osmnx as ox
+import numpy as np
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import random
+from itertools import chain
+from scipy.sparse.csgraph import dijkstra
+from src.network.compiled_graph import CompiledGraph
+from src.network.contraction_hierarchy import ContractionHierarchy
+from src.network.network_store import NetworkStore, column_kind
+from src.network.path_cache import (DEFAULT_CACHE_BYTES, DEFAULT_RETAINED_PATH_BYTES, RetainedPaths,
+                                    ShortestPathCache, path_subtrees)
+from src.network.path_search import iter_settled, point_to_point
+from src.network.spatial_index import SpatialIndex
+from src.network.street_renderer import StreetRenderer
+from src.network.traffic import TimeDependentCosts, TrafficScenarios, simulate_scenarios
+from src import instrumentation
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Rows per chunk when streaming edge tables to CSV/Parquet.
+EXPORT_CHUNK_ROWS = 100_000
+
 class LogisticsNetwork:
 
-    def __init__(self, input_graph=None):
-        self.NetGraph = nx.DiGraph() if input_graph is None else input_graph 
-        #ensure that the 'pos' metadata is available for input graphs as well.
-        self.add_pos_data()
-        self._initialize_metadata()
-    
+    QUERY_METHODS = ('dijkstra', 'astar', 'ch')
+
+    def __init__(self, input_graph=None, path_cache_bytes=DEFAULT_CACHE_BYTES, store=None,
+                 retained_path_bytes=DEFAULT_RETAINED_PATH_BYTES):
+        # A network opened from a binary cache (load_from_npz) serves routing and attribute
+        # arrays from the store; NetGraph is only built when something asks for it.
+        self._store = store
+        self._net_graph = None
+        if store is None:
+            self.NetGraph = nx.DiGraph() if input_graph is None else input_graph
+        # Bumped whenever edge weights or topology change; the CSR snapshot is rebuilt lazily against it.
+        self._graph_version = 0
+        self._compiled = None
+        self.path_cache = ShortestPathCache(max_bytes=path_cache_bytes)
+        # Path subtrees between cost-matrix locations, so stitching routes needs no search.
+        self.retained_paths = RetainedPaths(max_bytes=retained_path_bytes)
+        self.query_method = 'dijkstra'
+        self._contraction_hierarchy = None
+        self.traffic_scenarios = None
+        self._scenario_graphs = {}
+        self._street_renderer = None
+        self._spatial_index = None
+        if store is None:
+            with instrumentation.span('network.init'):
+                #ensure that the 'pos' metadata is available for input graphs as well.
+                self.add_pos_data()
+                self._initialize_metadata()
+        # The store stays authoritative only until the graph changes.
+        self._store_version = self._graph_version
+
+    @property
+    def NetGraph(self):
+        """The networkx graph; for networks loaded from a binary cache it is built on first access."""
+        if self._net_graph is None and self._store is not None:
+            logger.info(f"Materializing NetGraph from cache ({self._store.node_count} nodes)...")
+            with instrumentation.span('network.materialize'):
+                self._net_graph = self._store.to_networkx()
+                self.add_pos_data()
+        return self._net_graph
+
+    @NetGraph.setter
+    def NetGraph(self, graph):
+        self._net_graph = graph
+
+    def _current_store(self):
+        """Returns the binary cache store while it still reflects the graph, else None.
+
+        Once NetGraph is materialized it may be edited in place, so it takes over.
+        """
+        if self._store is not None and self._net_graph is None and self._store_version == self._graph_version:
+            return self._store
+        return None
+
     def _initialize_metadata(self):
         """Ensures the graph has necessary attributes without overwriting existing ones."""
-        # Check if any node has a type; if not, assign roles
-        if not any('type' in data for _, data in self.NetGraph.nodes(data=True)) or \
-            not any('urgency' in data for _, data in self.NetGraph.nodes(data=True)) or \
-            not any('demand' in data for _, data in self.NetGraph.nodes(data=True)):
+        # One pass over the node dicts collects every attribute name in use.
+        node_keys = set().union(*(data for _, data in self.NetGraph.nodes(data=True)))
+        if not {'type', 'urgency', 'demand'} <= node_keys:
             self.assign_roles()
-            
-        # Check if any edge has capacity
-        sample_edge = next(iter(self.NetGraph.edges(data=True)), (None, None, {}))
-        if 'capacity' not in sample_edge[2]:
-            self.add_capacity_data()
-            
+
+        # Edge data dicts are pulled out once and shared by every vectorized step below.
+        edge_data = self._edge_data()
+        sample_edge = edge_data[0] if edge_data else {}
+        if 'capacity' not in sample_edge:
+            self.add_capacity_data(edge_data)
+
         # Ensure travel times/weights are calculated
-        if 'weight' not in sample_edge[2]:
-            self.add_travel_time()
+        if 'weight' not in sample_edge:
+            self.add_travel_time(edge_data)
+
+        self.normalize_edge_attributes(time_weight=0.7, dist_weight=0.3, edge_data=edge_data)
+
+    def _edge_data(self):
+        """Returns the edge data dicts in NetGraph edge order (the order the CSR snapshot uses)."""
+        return [data for _, _, data in self.NetGraph.edges(data=True)]
 
-        self.normalize_edge_attributes(time_weight=0.7, dist_weight=0.3)
+    @staticmethod
+    def _edge_column(edge_data, key, default):
+        """Gathers one edge attribute into a float64 array, using default where it is missing."""
+        return np.fromiter((data.get(key, default) for data in edge_data), dtype=np.float64,
+                           count=len(edge_data))
 
-    def add_capacity_data(self):
+    def add_capacity_data(self, edge_data=None):
         """Adds maximum travel capacity to network edges."""
-        for u,v,data in self.NetGraph.edges(data=True):
-            if 'capacity' not in data:
-                self.NetGraph.edges[u,v]['capacity'] = random.randint(10,50)
-    
-    def add_travel_time(self):
+        edge_data = self._edge_data() if edge_data is None else edge_data
+        missing = [data for data in edge_data if 'capacity' not in data]
+        # Seeded from the stdlib RNG so random.seed() still makes runs reproducible.
+        rng = np.random.default_rng(random.getrandbits(64))
+        for data, capacity in zip(missing, rng.integers(10, 51, size=len(missing)).tolist()):
+            data['capacity'] = capacity
+
+    def add_travel_time(self, edge_data=None):
         """Adds nominal travel times to edges - which are also used as weights."""
-        for u,v, data in self.NetGraph.edges(data=True):
-            distance_metres = data.get('length',1)
-            speed_kmh = data.get('speed_kph',30)
-            speed_mpm = (speed_kmh * 1000) / 60  # meters per minute
-            travel_time_min = distance_metres / speed_mpm
+        edge_data = self._edge_data() if edge_data is None else edge_data
+        distance_metres = self._edge_column(edge_data, 'length', 1)
+        speed_mpm = self._edge_column(edge_data, 'speed_kph', 30) * 1000 / 60  # meters per minute
+        travel_time_min = (distance_metres / speed_mpm).tolist()
 
-            self.NetGraph.edges[u, v]['travel_time'] = travel_time_min
-            self.NetGraph.edges[u, v]['weight'] = travel_time_min
+        for data, minutes in zip(edge_data, travel_time_min):
+            data['travel_time'] = minutes
+            data['weight'] = minutes
+        self.mark_graph_changed()
 
     def add_pos_data(self):
         """Ensures all nodes have a 'pos' attribute for NetworkX drawing."""
-        #TODO: Optimize further to avoid checks for each node.
-        for n, data in self.NetGraph.nodes(data=True):
+        for _, data in self.NetGraph.nodes(data=True):
             if 'pos' not in data and 'x' in data and 'y' in data:
-                self.NetGraph.nodes[n]['pos'] = (data['x'], data['y'])   
+                data['pos'] = (data['x'], data['y'])
 
     def add_location(self, loc_id:str, loc_type:str, x:float, y:float, demand:float = 0):
         """Adds node to the network."""
@@ -71,6 +147,7 @@ class LogisticsNetwork:
             y=y,
             demand=demand
         )
+        self.mark_graph_changed()
 
     def add_edge(self, start_loc:str, end_loc:str, distance:float, traffic_factor:float=1):
         """Adds an edge to the network."""
@@ -81,9 +158,85 @@ class LogisticsNetwork:
             distance=distance,
             weight=weighted_dist
         )
+        self.mark_graph_changed()
+
+    def mark_graph_changed(self):
+        """Invalidates routing snapshots. Call after editing NetGraph weights or topology directly."""
+        self._graph_version += 1
+        # Cached trees were computed under the old weights; never let them leak into a new scenario.
+        self.path_cache.clear()
+        self.retained_paths.clear()
+
+    @property
+    def compiled(self):
+        """Read-only CSR snapshot of NetGraph, rebuilt when the graph version has moved on."""
+        if self._compiled is None or self._compiled.version != self._graph_version:
+            store = self._current_store()
+            with instrumentation.span('network.compile'):
+                if store is not None:
+                    self._compiled = store.compiled(weight='weight', version=self._graph_version)
+                else:
+                    self._compiled = CompiledGraph.from_networkx(self.NetGraph, weight='weight',
+                                                                 version=self._graph_version)
+        return self._compiled
+
+    def set_query_method(self, method):
+        """Selects how point-to-point queries (get_path_distance, shortest_path) are answered.
+
+        'dijkstra' - single-source trees, shared through the path cache (default).
+        'astar'    - goal-directed A* using great-circle distance over node x/y (lon/lat).
+        'ch'       - contraction hierarchy index, built on first use. Weight changes only
+                     re-run its cheap metric customization; topology changes rebuild it.
+        """
+        if method not in self.QUERY_METHODS:
+            raise ValueError(f"method must be one of {self.QUERY_METHODS}, got {method!r}")
+        self.query_method = method
+
+    @property
+    def contraction_hierarchy(self):
+        """Customizable contraction hierarchy over the compiled snapshot, kept in sync with it."""
+        graph = self.compiled
+        hierarchy = self._contraction_hierarchy
+        if hierarchy is None or not hierarchy.matches_topology(graph):
+            logger.info(f"Building contraction hierarchy over {graph.node_count} nodes...")
+            with instrumentation.span('network.ch_build'):
+                self._contraction_hierarchy = ContractionHierarchy(graph)
+        elif hierarchy.version != graph.version:
+            with instrumentation.span('network.ch_customize'):
+                hierarchy.customize(graph)
+        return self._contraction_hierarchy
+
+    @property
+    def spatial_index(self):
+        """KD-tree over node lon/lat, reused until nodes are added, removed or moved."""
+        graph = self.compiled
+        index = self._spatial_index
+        if index is None or (index.version != graph.version and not index.matches(graph)):
+            with instrumentation.span('network.spatial_index'):
+                self._spatial_index = SpatialIndex.from_compiled(graph)
+        else:
+            # Weight-only changes (traffic, scenarios) leave node positions alone.
+            index.version = graph.version
+        return self._spatial_index
+
+    def snap_to_nodes(self, lons, lats, max_distance=None):
+        """Snaps raw lon/lat points (e.g. delivery addresses) to their nearest graph nodes, in bulk.
+
+        Returns one node id per point, or None where no node lies within max_distance metres.
+        """
+        return self.spatial_index.snap(lons, lats, max_distance=max_distance)
 
     def get_stats(self):
         """Returns a dictionary containing high-level graph metrics."""
+        store = self._current_store()
+        if store is not None:
+            nodes, edges = store.node_count, store.edge_count
+            return {
+                "node_count": nodes,
+                "edge_count": edges,
+                "is_directed": True,
+                "density": edges / (nodes * (nodes - 1)) if nodes > 1 else 0
+            }
         return {
             "node_count": self.NetGraph.number_of_nodes(),
             "edge_count": self.NetGraph.number_of_edges(),
@@ -95,33 +248,305 @@ class LogisticsNetwork:
         """Assign roles, urgency and demand to nodes."""
         nodes = list(self.NetGraph.nodes)
         random.shuffle(nodes)
-        
+        node_data = [self.NetGraph.nodes[n] for n in nodes]
+
         # Assign 1 WH, 3 Hubs, rest are customers
-        self.NetGraph.nodes[nodes[0]].update({'type': 'warehouse', 'urgency': 0, 'demand': 0})
+        node_data[0].update({'type': 'warehouse', 'urgency': 0, 'demand': 0})
 
-        for i in range(1, 4):
-            self.NetGraph.nodes[nodes[i]].update({'type': 'hub', 'urgency': 0, 'demand': 0})
-        
-        # Ensure remaining nodes are customers
-        for i in range(4, len(nodes)):
-            self.NetGraph.nodes[nodes[i]]['type'] = 'customer'
-            self.NetGraph.nodes[nodes[i]]['urgency'] = random.choices([0, 1, 2], weights=[0.6, 0.3, 0.1])[0]
-            if 'demand' not in self.NetGraph.nodes[nodes[i]]:
-                self.NetGraph.nodes[nodes[i]]['demand'] = random.uniform(5,25)
-
-    def get_path_distance(self, source_node, target_node):
-        """Returns the shortest path distance between the source and the target."""
-        try:
-            path_dist = nx.shortest_path_length(self.NetGraph, 
-                                        source=source_node, 
-                                        target=target_node, 
-                                        weight='weight')
+        for data in node_data[1:4]:
+            data.update({'type': 'hub', 'urgency': 0, 'demand': 0})
+
+        # Ensure remaining nodes are customers; urgencies are drawn in one call.
+        customers = node_data[4:]
+        urgencies = random.choices([0, 1, 2], weights=[0.6, 0.3, 0.1], k=len(customers))
+        for data, urgency in zip(customers, urgencies):
+            data['type'] = 'customer'
+            data['urgency'] = urgency
+            if 'demand' not in data:
+                data['demand'] = random.uniform(5,25)
 
-            return path_dist
-        except nx.NetworkXNoPath:
+    def get_path_distance(self, source_node, target_node, scenario=None):
+        """Returns the shortest path distance between the source and the target.
+
+        scenario: optional index into traffic_scenarios to cost the trip under that
+        scenario's weights instead of NetGraph's.
+        """
+        graph = self.routing_graph(scenario)
+        source_idx = graph.index_of(source_node)
+        target_idx = graph.index_of(target_node)
+
+        instrumentation.count(f'queries.{self.query_method}')
+        if self.query_method == 'ch':
+            path_dist = self._hierarchy_for(scenario).distance(source_idx, target_idx)
+        elif self.query_method == 'astar':
+            path_dist, _, settled = point_to_point(graph, source_idx, target_idx, heuristic=True)
+            instrumentation.count('search.settled', settled)
+        else:
+            distances, _ = self._shortest_path_tree(source_idx, scenario)
+            path_dist = float(distances[target_idx])
+        if path_dist == float('inf'):
             # Instead of crashing, return a penalty value (infinity)
             logger.warning(f"No path found between {source_node} and {target_node}")
-            return float('inf')
+        return path_dist
+
+    def shortest_path(self, source_node, target_node, scenario=None):
+        """Returns the node-id list of the shortest path from source to target.
+
+        Paths between locations of an earlier build_cost_matrix are rebuilt from
+        retained_paths when still held; anything else is searched on demand.
+        Raises NetworkXNoPath when target is unreachable.
+        """
+        graph = self.routing_graph(scenario)
+        source_idx = graph.index_of(source_node)
+        target_idx = graph.index_of(target_node)
+
+        path = self.retained_paths.path(self._tree_key(source_idx, scenario), target_idx)
+        if path is not None:
+            return [graph.node_ids[i] for i in path]
+
+        if self.query_method == 'ch':
+            path = self._hierarchy_for(scenario).path(source_idx, target_idx)
+            if path is None:
+                raise nx.NetworkXNoPath(f"No path between {source_node} and {target_node}.")
+            return [graph.node_ids[i] for i in path]
+
+        if self.query_method == 'astar':
+            path_dist, predecessors, settled = point_to_point(graph, source_idx, target_idx, heuristic=True)
+            instrumentation.count('search.settled', settled)
+            if path_dist == float('inf'):
+                raise nx.NetworkXNoPath(f"No path between {source_node} and {target_node}.")
+        else:
+            _, predecessors = self._shortest_path_tree(source_idx, scenario)
+        return graph.path_from_predecessors(predecessors, source_idx, target_idx)
+
+    def iter_nearest_nodes(self, source_node):
+        """Yields (node, distance) pairs outward from source_node in nondecreasing distance order.
+
+        Runs a single Dijkstra lazily, so stopping at the first node of interest is cheap.
+        Nodes unreachable from source_node are never yielded.
+        """
+        graph = self.compiled
+        settled = 0
+        try:
+            for node_idx, dist in iter_settled(graph, graph.index_of(source_node)):
+                settled += 1
+                yield graph.node_ids[node_idx], dist
+        finally:
+            instrumentation.count('search.settled', settled)
+
+    def _shortest_path_tree(self, source_idx, scenario=None):
+        """Returns the (distances, predecessors) tree rooted at source_idx, via the path cache."""
+        key = self._tree_key(source_idx, scenario)
+        tree = self.path_cache.get(key)
+        if tree is None:
+            tree = dijkstra(self.routing_graph(scenario).adjacency(), directed=True, indices=source_idx,
+                            return_predecessors=True)
+            self._count_dijkstra(tree[0])
+            self.path_cache.put(key, *tree)
+        return tree
+
+    @staticmethod
+    def _count_dijkstra(distances):
+        """Records one scipy Dijkstra call; every finitely-reached node counts as settled."""
+        if instrumentation.is_enabled():
+            distances = np.atleast_2d(distances)
+            instrumentation.count('dijkstra.calls')
+            instrumentation.count('dijkstra.sources', len(distances))
+            instrumentation.count('dijkstra.settled', int(np.isfinite(distances).sum()))
+
+    @staticmethod
+    def _tree_key(source_idx, scenario):
+        return source_idx if scenario is None else (scenario, source_idx)
+
+    def build_cost_matrix(self, sources, targets=None, scenario=None):
+        """Returns a NumPy matrix of shortest-path costs from each source to each target.
+
+        Runs one single-source search per distinct source (batched through scipy's
+        csgraph Dijkstra) rather than one search per pair. Trees already in the path
+        cache are reused and new ones are added to it. Unreachable pairs are inf.
+        The parts of each tree on paths to the targets are kept in retained_paths.
+        scenario: optional index into traffic_scenarios to cost under its weights.
+        """
+        with instrumentation.span('network.cost_matrix'):
+            return self._build_cost_matrix(list(sources), targets, scenario)
+
+    def _build_cost_matrix(self, sources, targets, scenario):
+        targets = sources if targets is None else list(targets)
+        graph = self.routing_graph(scenario)
+
+        source_idx = graph.indices_of(sources)
+        target_idx = graph.indices_of(targets)
+
+        # Search once per distinct source, then fan rows back out to the requested order.
+        unique_sources, source_rows = np.unique(source_idx, return_inverse=True)
+        rows = np.empty((len(unique_sources), len(target_idx)), dtype=np.float64)
+
+        missing = []
+        cached_predecessors = {}
+        for row, source in enumerate(unique_sources):
+            tree = self.path_cache.get(self._tree_key(int(source), scenario))
+            if tree is None:
+                missing.append(row)
+            else:
+                rows[row] = tree[0][target_idx]
+                cached_predecessors[row] = tree[1]
+
+        if missing:
+            dist, pred = dijkstra(graph.adjacency(), directed=True, indices=unique_sources[missing],
+                                  return_predecessors=True)
+            self._count_dijkstra(dist)
+            rows[missing] = dist[:, target_idx]
+            for k, row in enumerate(missing):
+                # Copy so a cached row does not pin the whole batch array in memory.
+                self.path_cache.put(self._tree_key(int(unique_sources[row]), scenario),
+                                    dist[k].copy(), pred[k].copy())
+            self._retain_paths(unique_sources[missing], pred, target_idx, scenario)
+        if cached_predecessors:
+            self._retain_paths(unique_sources[list(cached_predecessors)],
+                               np.stack(list(cached_predecessors.values())), target_idx, scenario)
+
+        return rows[source_rows]
+
+    def _retain_paths(self, sources, predecessors, target_idx, scenario):
+        """Keeps the path subtrees of predecessor rows (one per source) not already retained."""
+        if self.retained_paths.max_bytes <= 0:
+            return
+        keys = [self._tree_key(int(source), scenario) for source in sources]
+        new = [k for k, key in enumerate(keys) if key not in self.retained_paths]
+        if not new:
+            return
+        with instrumentation.span('network.retain_paths'):
+            for k, (nodes, parents) in zip(new, path_subtrees(predecessors[new], np.unique(target_idx))):
+                self.retained_paths.put(keys[k], int(sources[k]), nodes, parents)
+
+    def build_reverse_cost_matrix(self, sources, targets, scenario=None):
+        """Returns the same source x target costs as build_cost_matrix, searching backwards.
+
+        One search runs per distinct target over the reversed graph, which is the cheaper
+        direction when there are fewer targets than sources (e.g. a few new stops that
+        every existing stop needs a column for). These trees are not cached.
+        """
+        with instrumentation.span('network.reverse_cost_matrix'):
+            graph = self.routing_graph(scenario)
+            source_idx = graph.indices_of(sources)
+            unique_targets, target_cols = np.unique(graph.indices_of(targets), return_inverse=True)
+            if len(unique_targets) == 0:
+                return np.empty((len(source_idx), 0))
+            dist = dijkstra(graph.reverse_adjacency(), directed=True, indices=unique_targets)
+            self._count_dijkstra(dist)
+            return dist[:, source_idx].T[:, target_cols]
+
+    def update_cost_matrix(self, matrix, old_locations, new_locations, scenario=None):
+        """Returns the square cost matrix over new_locations, reusing matrix (over old_locations).
+
+        Entries between locations present in both lists are copied. Only the rows of new
+        locations (forward searches) and the columns from kept to new locations (backward
+        searches, one per new location) are computed.
+        """
+        old_index = {node: i for i, node in enumerate(old_locations)}
+        new_locations = list(new_locations)
+        kept = [i for i, node in enumerate(new_locations) if node in old_index]
+        fresh = [i for i, node in enumerate(new_locations) if node not in old_index]
+
+        updated = np.empty((len(new_locations), len(new_locations)), dtype=np.float64)
+        kept_old = [old_index[new_locations[i]] for i in kept]
+        updated[np.ix_(kept, kept)] = np.asarray(matrix)[np.ix_(kept_old, kept_old)]
+        if fresh:
+            fresh_nodes = [new_locations[i] for i in fresh]
+            updated[fresh, :] = self.build_cost_matrix(fresh_nodes, new_locations, scenario)
+            if kept:
+                updated[np.ix_(kept, fresh)] = self.build_reverse_cost_matrix(
+                    [new_locations[i] for i in kept], fresh_nodes, scenario)
+        return updated
+
+    def build_time_dependent_costs(self, locations, bucket_minutes=15, start=0.0, scenarios=None):
+        """Precomputes a stack of cost matrices over locations, one per departure-time bucket.
+
+        Bucket b is costed under traffic scenario scenarios[b] (default: every scenario of
+        traffic_scenarios, in order), so a profile such as rush_hour_intensities() drawn
+        with simulate_traffic_scenarios() becomes a TimeDependentCosts whose bucket b
+        starts at start + b * bucket_minutes.
+        """
+        if self.traffic_scenarios is None:
+            raise ValueError("No traffic scenarios; call simulate_traffic_scenarios() first.")
+        scenarios = range(len(self.traffic_scenarios)) if scenarios is None else scenarios
+        locations = list(locations)
+        with instrumentation.span('network.time_dependent_costs'):
+            costs = np.stack([self.build_cost_matrix(locations, scenario=s) for s in scenarios])
+        return TimeDependentCosts(locations, costs, bucket_minutes, start)
+
+    def edge_attribute_array(self, name, default):
+        """Returns edge attribute name as a float64 array in the compiled snapshot's edge order."""
+        store = self._current_store()
+        if store is not None:
+            return store.column('edge', name, default)
+        return np.fromiter(
+            (data.get(name, default) for _, neighbours in self.NetGraph.adjacency() for data in neighbours.values()),
+            dtype=np.float64, count=self.NetGraph.number_of_edges())
+
+    def node_attribute_array(self, name, default):
+        """Returns node attribute name as a float64 array in the compiled snapshot's node order."""
+        store = self._current_store()
+        if store is not None:
+            return store.column('node', name, default)
+        return np.fromiter((data.get(name, default) for _, data in self.NetGraph.nodes(data=True)),
+                           dtype=np.float64, count=self.NetGraph.number_of_nodes())
+
+    def simulate_traffic_scenarios(self, intensities, seeds=42):
+        """Simulates several traffic scenarios at once without touching NetGraph.
+
+        Draws an (S x E) array of edge weights, one row per intensity, with the same
+        capacity-dependent volatility as simulate_traffic. The result is kept as
+        self.traffic_scenarios so queries and matrix builds can take a scenario index.
+
+        seeds: a single seed shared by all scenarios, or one seed per intensity.
+        """
+        graph = self.compiled
+        with instrumentation.span('network.traffic_scenarios'):
+            weights, congestion = simulate_scenarios(self.edge_attribute_array('travel_time', 1.0),
+                                                     self.edge_attribute_array('capacity', 30),
+                                                     intensities, seeds)
+        intensities = np.atleast_1d(intensities).tolist()
+        seeds = [seeds] * len(intensities) if np.isscalar(seeds) else list(seeds)
+        self.traffic_scenarios = TrafficScenarios(weights, congestion, intensities, seeds,
+                                                  graph.offsets, graph.targets)
+        self._scenario_graphs = {}
+        # Trees cached under a scenario index were searched over the previous draw.
+        self.path_cache.clear()
+        self.retained_paths.clear()
+        return self.traffic_scenarios
+
+    def routing_graph(self, scenario=None):
+        """Returns the compiled snapshot, re-weighted for a traffic scenario if one is given."""
+        graph = self.compiled
+        if scenario is None:
+            return graph
+        if self.traffic_scenarios is None:
+            raise ValueError("No traffic scenarios; call simulate_traffic_scenarios() first.")
+
+        key = (graph.version, scenario)
+        scenario_graph = self._scenario_graphs.get(key)
+        if scenario_graph is None:
+            if not self.traffic_scenarios.matches(graph):
+                raise ValueError("traffic_scenarios were drawn for a different network topology; "
+                                 "call simulate_traffic_scenarios() again.")
+            # Drop snapshots (and CH customizations) left over from older graph versions.
+            self._scenario_graphs = {k: v for k, v in self._scenario_graphs.items() if k[0] == graph.version}
+            scenario_graph = graph.with_weights(self.traffic_scenarios.weights[scenario])
+            self._scenario_graphs[key] = scenario_graph
+        return scenario_graph
+
+    def _hierarchy_for(self, scenario):
+        """Returns the contraction hierarchy customized for the base weights or a scenario."""
+        hierarchy = self.contraction_hierarchy
+        if scenario is None:
+            return hierarchy
+        key = (hierarchy.version, 'ch', scenario)
+        customized = self._scenario_graphs.get(key)
+        if customized is None:
+            customized = hierarchy.customized_copy(self.routing_graph(scenario))
+            self._scenario_graphs[key] = customized
+        return customized
 
     def visualize(self, save_path=None):
         """Advanced visualization using normalized costs and node demand.
@@ -204,66 +629,60 @@ class LogisticsNetwork:
         else:
             plt.show()
 
-    def _stitch_route(self, route):
-        """Expands a stop-to-stop itinerary into an edge-adjacent path."""
+    def stitch_route(self, route):
+        """Expands a stop-to-stop itinerary into an edge-adjacent path of node ids.
+
+        Each leg is a shortest_path, so legs between locations of an earlier
+        build_cost_matrix are rebuilt from retained_paths without searching.
+        """
         full_route = [route[0]]
         for u, v in zip(route[:-1], route[1:]):
             if u == v:
                 continue
-            segment = nx.shortest_path(self.NetGraph, u, v, weight='weight')
+            segment = self.shortest_path(u, v)
             full_route.extend(segment[1:])
         return full_route
 
+    @property
+    def street_renderer(self):
+        """Base-map renderer for the current graph version; its street raster is drawn once."""
+        graph = self.compiled
+        if self._street_renderer is None or self._street_renderer.version != graph.version:
+            self._street_renderer = StreetRenderer(graph)
+        return self._street_renderer
+
     def save_street_visualization(self, filepath, route=None):
-        """Renders and saves the actual Brooklyn street network (real lat/lon geometry)."""
-
-        # OSMnx's plotting/gdf conversion requires a MultiDiGraph with edge keys;
-        # self.NetGraph is a plain DiGraph, so convert a throwaway copy for plotting.
-        multi_graph = nx.MultiDiGraph(self.NetGraph)
-
-        is_multi_route = bool(route) and isinstance(route[0], tuple)
-
-        if is_multi_route:
-            routes = [self._stitch_route(r) for r, _ in route]
-            colors = [c for _, c in route]
-
-            fig, ax = ox.plot_graph_routes(
-                multi_graph,
-                routes,
-                route_colors=colors,
-                route_linewidths=3,
-                node_size=15,
-                node_color='#3498db',
-                show=False,
-                close=False
-            )
-        elif route:
-            full_route = self._stitch_route(route)
-
-            fig, ax = ox.plot_graph_route(
-                multi_graph,
-                full_route,
-                node_size=15,
-                node_color='#3498db',
-                route_color='#e74c3c',
-                route_linewidth=3,
-                show=False,
-                close=False
-            )
-        else:
-            fig, ax = ox.plot_graph(
-                multi_graph,
-                node_size=15,
-                node_color='#3498db',
-                edge_color='#999999',
-                show=False,
-                close=False
-            )
-
-        fig.savefig(filepath, dpi=150, bbox_inches='tight')
-        plt.close(fig)
+        """Renders and saves the actual Brooklyn street network (real lat/lon geometry).
+
+        route: a stop list, or a list of (stops, color) pairs for several vehicles.
+        The street layer is reused from street_renderer; only the routes are drawn.
+        """
+        with instrumentation.span('network.render'):
+            lines, colors = self._route_overlay(route)
+            self.street_renderer.render(filepath, lines, colors)
         logger.info(f"Street network visualization saved to {filepath}")
 
+    def save_street_visualizations(self, jobs, max_workers=None):
+        """save_street_visualization for many {filepath: route} jobs, rendered in parallel processes.
+
+        Routes are stitched here (through the path cache); workers only draw.
+        """
+        with instrumentation.span('network.render'):
+            overlays = {filepath: self._route_overlay(route) for filepath, route in jobs.items()}
+            self.street_renderer.render_many(overlays, max_workers=max_workers)
+        for filepath in jobs:
+            logger.info(f"Street network visualization saved to {filepath}")
+
+    def _route_overlay(self, route):
+        """Stitched route coordinates and colours for a save_street_visualization route argument."""
+        if not route:
+            return [], []
+        if isinstance(route[0], tuple):
+            paths, colors = [self.stitch_route(r) for r, _ in route], [c for _, c in route]
+        else:
+            paths, colors = [self.stitch_route(route)], ['#e74c3c']
+        return self.street_renderer.route_lines(paths), colors
+
     def save_to_json(self, file_path: str):
         """Saves the edge data to json files."""
         G_copy = self.NetGraph.copy()
@@ -286,87 +705,199 @@ class LogisticsNetwork:
             seed (int, optional)
         """
         rng = random.Random(seed)
-        for u,v, data in self.NetGraph.edges(data=True):
+        with instrumentation.span('network.simulate_traffic'):
+            for u,v, data in self.NetGraph.edges(data=True):
 
-            base_time = data.get('travel_time', 1.0)
-            capacity = data.get('capacity', 30)
+                base_time = data.get('travel_time', 1.0)
+                capacity = data.get('capacity', 30)
 
-            volatility = 0.4 if capacity < 20 else 0.1
+                volatility = 0.4 if capacity < 20 else 0.1
 
-            multi_factor = max(1.0, rng.gauss(intensity, intensity*volatility))
+                multi_factor = max(1.0, rng.gauss(intensity, intensity*volatility))
 
-            self.NetGraph.edges[u,v]['weight'] = base_time*multi_factor
-            self.NetGraph.edges[u,v]['congestion_factor'] = multi_factor
+                self.NetGraph.edges[u,v]['weight'] = base_time*multi_factor
+                self.NetGraph.edges[u,v]['congestion_factor'] = multi_factor
+        self.mark_graph_changed()
 
     def convert_to_dataframes(self):
         """Converts the graph's nodes and edges to pandas DataFrames."""
+        return self.node_table(), self.edge_table()
 
-        nodes_data = []
-        for n, data in self.NetGraph.nodes(data=True): 
-            node_info = {'node_id': n}
-            node_info.update(data)
-            nodes_data.append(node_info)
-        nodes_df = pd.DataFrame(nodes_data)
+    def node_table(self, columns=None):
+        """Returns a DataFrame of node_id plus the given node attributes (default: all).
 
-        edges_data = []
-        for u, v, data in self.NetGraph.edges(data=True):
-            edge_info = {'start_node': u, 'end_node': v}
-            
-            for key, value in data.items():
-                if key == 'geometry': continue 
-                # Convert lists (like multiple street names) to strings
-                if isinstance(value, list):
-                    edge_info[key] = ", ".join(map(str, value))
-                else:
-                    edge_info[key] = value
-                    
-            edges_data.append(edge_info)
-        
-        return pd.DataFrame(nodes_data), pd.DataFrame(edges_data)
-    
-    def export_to_csv(self, prefix="network"):
-        """Exports the current state of nodes and edges to CSV files."""
-        nodes_df, edges_df = self.convert_to_dataframes()
-        
+        Built column by column from the binary cache arrays or NetGraph, so asking for a
+        few columns only gathers those.
+        """
+        return pd.DataFrame(next(self._iter_table_columns('node', columns)))
+
+    def edge_table(self, columns=None):
+        """Returns a DataFrame of start_node, end_node plus the given edge attributes (default: all)."""
+        return pd.DataFrame(next(self._iter_table_columns('edge', columns)))
+
+    def iter_edge_tables(self, columns=None, chunk_size=EXPORT_CHUNK_ROWS):
+        """Yields edge_table() in chunks of at most chunk_size edges (in compiled edge order)."""
+        for table in self._iter_table_columns('edge', columns, chunk_size):
+            yield pd.DataFrame(table)
+
+    def export_to_csv(self, prefix="network", node_columns=None, edge_columns=None, chunk_size=EXPORT_CHUNK_ROWS):
+        """Exports the current state of nodes and edges to CSV files, writing edges in chunks."""
         nodes_file = f"{prefix}_nodes.csv"
         edges_file = f"{prefix}_edges.csv"
-        
-        nodes_df.to_csv(nodes_file, index=False)
-        edges_df.to_csv(edges_file, index=False)
-        
+
+        self.node_table(node_columns).to_csv(nodes_file, index=False)
+        with open(edges_file, 'w', newline='') as f:
+            for i, chunk in enumerate(self.iter_edge_tables(edge_columns, chunk_size)):
+                chunk.to_csv(f, index=False, header=(i == 0))
+
         logger.info(f"Tabular export complete: \n- {nodes_file} \n- {edges_file}")
 
-    def _min_max_scale(self, values: list, inverse=False):
-        """Helper to scale a list of values between 0 and 1."""
-        v_min, v_max = min(values), max(values)
+    def export_to_parquet(self, prefix="network", node_columns=None, edge_columns=None,
+                          chunk_size=EXPORT_CHUNK_ROWS):
+        """Exports nodes and edges to Parquet, streaming edges one row group per chunk.
+
+        Arrow tables are built straight from the attribute columns (no DataFrames). Column
+        types are fixed from the whole column up front: numeric attributes keep their
+        type, anything else is written as strings. Requires pyarrow.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("export_to_parquet requires pyarrow (pip install pyarrow)") from None
+
+        types = {'bool': pa.bool_(), 'int64': pa.int64(), 'float64': pa.float64(), 'json': pa.string()}
+        for scope, columns in (('node', node_columns), ('edge', edge_columns)):
+            file_path = f"{prefix}_{scope}s.parquet"
+            kinds = self._column_kinds(scope, columns)
+            schema = pa.schema([(name, types[kind]) for name, kind in kinds.items()])
+            text_columns = {name for name, kind in kinds.items() if kind == 'json'}
+            with pq.ParquetWriter(file_path, schema) as writer:
+                for table in self._iter_table_columns(scope, columns, chunk_size, text_columns):
+                    writer.write_table(pa.table(table, schema=schema))
+
+        logger.info(f"Parquet export complete: \n- {prefix}_nodes.parquet \n- {prefix}_edges.parquet")
+
+    def _row_count(self, scope):
+        store = self._current_store()
+        if store is not None:
+            return store.node_count if scope == 'node' else store.edge_count
+        return self.NetGraph.number_of_nodes() if scope == 'node' else self.NetGraph.number_of_edges()
+
+    def _attribute_records(self, scope):
+        if scope == 'node':
+            return [data for _, data in self.NetGraph.nodes(data=True)]
+        return self._edge_data()
+
+    def _column_names(self, scope, columns=None):
+        """The requested attribute names, or all of them in first-seen order (never geometry)."""
+        if columns is not None:
+            return list(columns)
+        store = self._current_store()
+        if store is not None:
+            return store.column_names(scope)
+        keys = dict.fromkeys(chain.from_iterable(self._attribute_records(scope)))
+        return [name for name in keys if name != 'geometry']
+
+    def _column_kinds(self, scope, columns=None):
+        """Storage kind of every table column ('bool', 'int64', 'float64' or 'json'), keys first."""
+        node_ids = self.compiled.node_ids
+        keys = ['node_id'] if scope == 'node' else ['start_node', 'end_node']
+        kinds = dict.fromkeys(keys, 'int64' if column_kind(node_ids) == 'int64' else 'json')
+
+        store = self._current_store()
+        records = None if store is not None else self._attribute_records(scope)
+        for name in self._column_names(scope, columns):
+            if store is None:
+                kinds[name] = column_kind([data.get(name) for data in records])
+            elif name in store.column_names(scope):
+                kinds[name] = store.column_kind(scope, name)
+            else:
+                kinds[name] = 'json'
+        return kinds
+
+    def _iter_table_columns(self, scope, columns=None, chunk_size=None, text_columns=()):
+        """Yields dicts of column lists covering chunk_size rows each (all rows by default).
+
+        Edge list values (e.g. several street names) are joined into one string; values
+        of text_columns that are not strings already are converted with str().
+        """
+        names = self._column_names(scope, columns)
+        row_count = self._row_count(scope)
+        chunk_size = chunk_size or max(row_count, 1)
+        graph = self.compiled
+        sources = graph.edge_sources() if scope == 'edge' else None
+        store = self._current_store()
+        records = None if store is not None else self._attribute_records(scope)
+
+        for start in range(0, max(row_count, 1), chunk_size):
+            stop = min(start + chunk_size, row_count)
+            if scope == 'node':
+                table = {'node_id': graph.node_ids[start:stop]}
+            else:
+                table = {'start_node': [graph.node_ids[i] for i in sources[start:stop].tolist()],
+                         'end_node': [graph.node_ids[i] for i in graph.targets[start:stop].tolist()]}
+            for key in table:
+                if key in text_columns:
+                    table[key] = [str(v) for v in table[key]]
+
+            for name in names:
+                if store is not None:
+                    values = store.values(scope, name, start, stop)
+                else:
+                    values = [data.get(name) for data in records[start:stop]]
+                if scope == 'edge' and list in set(map(type, values)):
+                    values = [", ".join(map(str, v)) if isinstance(v, list) else v for v in values]
+                if name in text_columns:
+                    values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+                table[name] = values
+            yield table
+
+    def _min_max_scale(self, values, inverse=False):
+        """Helper to scale a sequence of values between 0 and 1 (returns a numpy array)."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return values
+        v_min, v_max = values.min(), values.max()
         v_range = (v_max - v_min) if v_max != v_min else 1
-        
+
         if inverse:
-            return [(v_max - v) / v_range for v in values]
-        return [(v - v_min) / v_range for v in values]
-    
-    def normalize_edge_attributes(self, time_weight=0.7, dist_weight=0.3):
+            return (v_max - values) / v_range
+        return (values - v_min) / v_range
+
+    def normalize_edge_attributes(self, time_weight=0.7, dist_weight=0.3, edge_data=None):
         """Normalizes edge weights to a 0-1 scale, where higher values indicate more congestion."""
-        edges = list(self.NetGraph.edges(data=True))
-        travel_times = [data.get('travel_time', 1.0) for _, _, data in self.NetGraph.edges(data=True)]
-        norm_times = self._min_max_scale(travel_times)
+        edge_data = self._edge_data() if edge_data is None else edge_data
+        norm_times = self._min_max_scale(self._edge_column(edge_data, 'travel_time', 1.0))
+        norm_dists = self._min_max_scale(self._edge_column(edge_data, 'length', 1.0))
+
+        # Combine into a single cost metric
+        composite_costs = (time_weight * norm_times) + (dist_weight * norm_dists)
+
+        # Update edge metadata in place; the dicts are NetGraph's own, so no per-edge lookups.
+        for data, t_cost, d_cost, composite_cost in zip(edge_data, norm_times.tolist(),
+                                                        norm_dists.tolist(), composite_costs.tolist()):
+            data['norm_time_cost'] = t_cost
+            data['norm_dist_cost'] = d_cost
+            data['weight'] = composite_cost  # Primary weight for Dijkstra
+        self.mark_graph_changed()
+
+    def save_to_npz(self, file_path: str):
+        """Saves the network to the versioned binary cache format (see NetworkStore)."""
+        store = self._current_store() or NetworkStore.from_networkx(self.NetGraph)
+        store.save(file_path)
+        logger.info(f"Network successfully saved to {file_path}")
 
-        lengths = [data.get('length', 1.0) for _, _, data in self.NetGraph.edges(data=True)]
-        norm_dists = self._min_max_scale(lengths)
-        
-        for i, (u, v, data) in enumerate(edges):
-            t_cost = norm_times[i]
-            d_cost = norm_dists[i]
-            
-            # Combine into a single cost metric
-            composite_cost = (time_weight * t_cost) + (dist_weight * d_cost)
-            
-            # Update edge metadata
-            self.NetGraph.edges[u, v].update({
-                'norm_time_cost': t_cost,
-                'norm_dist_cost': d_cost,
-                'weight': composite_cost  # Primary weight for Dijkstra
-            })
+    @classmethod
+    def load_from_npz(cls, file_path: str, mmap=True):
+        """Opens a binary network cache without building the networkx graph.
+
+        Routing, cost matrices and attribute arrays read the memory-mapped arrays directly;
+        NetGraph is materialized on first access.
+        """
+        network = cls(store=NetworkStore.load(file_path, mmap=mmap))
+        logger.info(f"Network successfully loaded from {file_path}")
+        return network
 
     @classmethod
     def load_from_json(cls, file_path: str):
@@ -0,0 +1,351 @@
+import json
+import os
+import struct
+import zipfile
+
+import networkx as nx
+import numpy as np
+
+from src.network.compiled_graph import CompiledGraph
+
+FORMAT_VERSION = 2
+
+# Attributes that are not written: geometry is dropped (as the JSON cache always did) and
+# pos is rebuilt from x/y by LogisticsNetwork.add_pos_data.
+SKIPPED_ATTRIBUTES = ('geometry', 'pos')
+
+# Size of the fixed part of a zip local file header; name and extra field lengths sit at 26..30.
+_LOCAL_HEADER_SIZE = 30
+
+
+class NetworkStore:
+    """Versioned binary network cache (.npz) with lazy, memory-mapped column access.
+
+    Layout: a JSON manifest, the node ids, CSR offsets/targets (edges grouped by source in
+    NetGraph adjacency order, i.e. the CompiledGraph edge order) and one member per node or
+    edge attribute column:
+      * bool/int/float columns as typed arrays, plus a bool mask when some entries are missing;
+      * anything else as UTF-8 JSON, one value per entry (null for missing) with byte offsets
+        so any row range decodes on its own; no pickles are involved.
+
+    Archives are written uncompressed, so on load every array member is memory-mapped
+    straight from the file and nothing is read until a column is asked for.
+    """
+
+    def __init__(self, manifest, members):
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported network cache format {manifest.get('format_version')!r}, "
+                             f"expected {FORMAT_VERSION}")
+        self.manifest = manifest
+        self._members = members
+        self._columns = {'node': manifest['node_columns'], 'edge': manifest['edge_columns']}
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Builds a store from a networkx DiGraph (in memory; use save() to write it)."""
+        node_ids = list(graph.nodes)
+        node_index = {node: i for i, node in enumerate(node_ids)}
+        members = {'node_ids': _encode_node_ids(node_ids)}
+
+        offsets = [0]
+        targets = []
+        edge_data = []
+        for _, neighbours in graph.adjacency():
+            for v, data in neighbours.items():
+                targets.append(node_index[v])
+                edge_data.append(data)
+            offsets.append(len(targets))
+        members['offsets'] = np.asarray(offsets, dtype=np.int32)
+        members['targets'] = np.asarray(targets, dtype=np.int32)
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'node_id_kind': 'int' if members['node_ids'].dtype.kind == 'i' else 'str',
+            'graph': _jsonable(dict(graph.graph)),
+            'node_columns': _encode_columns('node', [data for _, data in graph.nodes(data=True)], members),
+            'edge_columns': _encode_columns('edge', edge_data, members),
+        }
+        return cls(manifest, members)
+
+    @classmethod
+    def from_arrays(cls, node_ids, offsets, targets, node_columns=None, edge_columns=None, graph=None):
+        """Builds a store straight from CSR arrays, without a networkx graph.
+
+        node_columns/edge_columns map attribute names to one value per node/edge: numeric
+        NumPy arrays are stored as they are, anything else (e.g. lists of strings) as JSON.
+        """
+        members = {'node_ids': _encode_node_ids(node_ids),
+                   'offsets': np.asarray(offsets, dtype=np.int32),
+                   'targets': np.asarray(targets, dtype=np.int32)}
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'node_id_kind': 'int' if members['node_ids'].dtype.kind == 'i' else 'str',
+            'graph': _jsonable(dict(graph or {})),
+            'node_columns': _encode_array_columns('node', node_columns or {}, members),
+            'edge_columns': _encode_array_columns('edge', edge_columns or {}, members),
+        }
+        return cls(manifest, members)
+
+    def save(self, file_path):
+        """Writes the store as an uncompressed .npz archive.
+
+        The archive is written next to file_path and moved into place, so stores still
+        mapping an older file at that path keep reading valid data.
+        """
+        members = {name: self._member(name) for name in self._member_names()}
+        members['manifest'] = _json_bytes(self.manifest)
+        partial_path = f"{file_path}.partial"
+        with open(partial_path, 'wb') as f:
+            np.savez(f, **members)
+        os.replace(partial_path, file_path)
+
+    @classmethod
+    def load(cls, file_path, mmap=True):
+        """Opens a store written by save(); columns are read on first access.
+
+        mmap=False reads members into memory instead of mapping them.
+        """
+        members = _NpzMembers(file_path, mmap=mmap)
+        manifest = json.loads(members['manifest'].tobytes().decode('utf-8'))
+        return cls(manifest, members)
+
+    @property
+    def node_count(self):
+        return len(self._member('offsets')) - 1
+
+    @property
+    def edge_count(self):
+        return len(self._member('targets'))
+
+    def node_ids(self):
+        """Returns node ids as a plain list (ints or strings, as they were saved)."""
+        return self._member('node_ids').tolist()
+
+    def column_names(self, scope):
+        """Returns the stored attribute names of scope ('node' or 'edge'), in saved order."""
+        return list(self._columns[scope])
+
+    def column_kind(self, scope, name):
+        """Returns 'bool', 'int64', 'float64' or 'json' (any other value type) for a column."""
+        return self._columns[scope][name]['kind']
+
+    def column(self, scope, name, default):
+        """Returns a numeric node or edge column as float64, with default for missing entries."""
+        size = self._size(scope)
+        spec = self._columns[scope].get(name)
+        if spec is None:
+            return np.full(size, default, dtype=np.float64)
+        if spec['kind'] == 'json':
+            values = self.values(scope, name)
+            return np.fromiter((default if v is None else v for v in values), dtype=np.float64, count=size)
+
+        values = np.asarray(self._member(spec['member']), dtype=np.float64)
+        if 'mask' in spec:
+            values = np.where(self._member(spec['mask']), values, default)
+        return values
+
+    def values(self, scope, name, start=0, stop=None):
+        """Returns rows start:stop of a column as Python values, with None for missing entries."""
+        stop = self._size(scope) if stop is None else stop
+        spec = self._columns[scope].get(name)
+        if spec is None:
+            return [None] * (stop - start)
+        if spec['kind'] == 'json':
+            offsets = self._member(spec['offsets'])
+            # Entries are stored comma-terminated, so a byte range is a JSON list body.
+            body = self._member(spec['member'])[offsets[start]:offsets[stop]].tobytes()
+            return json.loads(b'[' + body[:-1] + b']')
+        values = self._member(spec['member'])[start:stop].tolist()
+        if 'mask' in spec:
+            values = [v if present else None
+                      for v, present in zip(values, self._member(spec['mask'])[start:stop].tolist())]
+        return values
+
+    def _size(self, scope):
+        return self.node_count if scope == 'node' else self.edge_count
+
+    def compiled(self, weight='weight', version=0):
+        """Builds the CSR routing snapshot straight from the stored arrays."""
+        return CompiledGraph(self.node_ids(), self._member('offsets'), self._member('targets'),
+                             self.column('edge', weight, 1), version=version,
+                             x=self.column('node', 'x', np.nan), y=self.column('node', 'y', np.nan))
+
+    def to_networkx(self):
+        """Materializes the stored network as a networkx DiGraph."""
+        node_ids = self.node_ids()
+        graph = nx.DiGraph()
+        graph.graph.update(self.manifest['graph'])
+        graph.add_nodes_from(zip(node_ids, self._attribute_dicts('node', len(node_ids))))
+
+        counts = np.diff(self._member('offsets')).tolist()
+        sources = (u for u, count in zip(node_ids, counts) for _ in range(count))
+        targets = (node_ids[v] for v in self._member('targets').tolist())
+        graph.add_edges_from(zip(sources, targets, self._attribute_dicts('edge', self.edge_count)))
+        return graph
+
+    def _attribute_dicts(self, scope, size):
+        dicts = [{} for _ in range(size)]
+        for name in self._columns[scope]:
+            for data, value in zip(dicts, self.values(scope, name)):
+                if value is not None:
+                    data[name] = value
+        return dicts
+
+    def _member(self, name):
+        return self._members[name]
+
+    def _member_names(self):
+        names = ['node_ids', 'offsets', 'targets']
+        for columns in self._columns.values():
+            for spec in columns.values():
+                names.extend(spec[key] for key in ('member', 'mask', 'offsets') if key in spec)
+        return names
+
+
+class _NpzMembers:
+    """Lazy member access for an .npz archive, memory-mapping uncompressed members."""
+
+    def __init__(self, file_path, mmap=True):
+        self.file_path = file_path
+        self.mmap = mmap
+        self._cache = {}
+        with zipfile.ZipFile(file_path) as archive:
+            self._infos = {info.filename[:-len('.npy')]: info for info in archive.infolist()}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            self._cache[name] = self._read(self._infos[name])
+        return self._cache[name]
+
+    def _read(self, info):
+        if not self.mmap or info.compress_type != zipfile.ZIP_STORED:
+            with zipfile.ZipFile(self.file_path) as archive, archive.open(info) as f:
+                return np.lib.format.read_array(f, allow_pickle=False)
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(_LOCAL_HEADER_SIZE)[26:30])
+            f.seek(info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+            major, _ = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.file_path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                         order='F' if fortran_order else 'C')
+
+
+def _encode_node_ids(node_ids):
+    if isinstance(node_ids, np.ndarray) and node_ids.dtype.kind in 'iu':
+        return node_ids.astype(np.int64, copy=False)
+    if all(isinstance(node, (int, np.integer)) and not isinstance(node, bool) for node in node_ids):
+        return np.asarray(node_ids, dtype=np.int64)
+    if all(isinstance(node, str) for node in node_ids):
+        return np.asarray(node_ids, dtype=str)
+    raise TypeError("Network cache supports integer or string node ids only")
+
+
+def _encode_columns(scope, records, members):
+    """Adds one member (and optional mask) per attribute name to members; returns the specs."""
+    names = {}
+    for data in records:
+        for name in data:
+            if name not in SKIPPED_ATTRIBUTES:
+                names.setdefault(name, None)
+
+    specs = {}
+    for position, name in enumerate(names):
+        member = f"{scope}_{position}"
+        values = [data.get(name) for data in records]
+        present = [value is not None for value in values]
+        dtype = _numeric_dtype(values)
+        if dtype is None:
+            specs[name] = _encode_json_column(member, values, members)
+            continue
+
+        fill = dtype.type(0)
+        members[member] = np.asarray([fill if value is None else value for value in values], dtype=dtype)
+        specs[name] = {'kind': dtype.name, 'member': member}
+        if not all(present):
+            members[f"{member}_mask"] = np.asarray(present, dtype=bool)
+            specs[name]['mask'] = f"{member}_mask"
+    return specs
+
+
+def _encode_array_columns(scope, columns, members):
+    """Like _encode_columns, for {name: values} columns that are already one entry per row."""
+    specs = {}
+    for position, (name, values) in enumerate(columns.items()):
+        member = f"{scope}_{position}"
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+            dtype = np.dtype(bool) if values.dtype.kind == 'b' else (
+                np.dtype(np.float64) if values.dtype.kind == 'f' else np.dtype(np.int64))
+            members[member] = values.astype(dtype, copy=False)
+            specs[name] = {'kind': dtype.name, 'member': member}
+        else:
+            specs[name] = _encode_json_column(member, list(values), members)
+    return specs
+
+
+def _encode_json_column(member, values, members):
+    """Stores values as comma-terminated UTF-8 JSON entries plus byte offsets; returns the spec."""
+    # Columns such as road types repeat a handful of values, so encode each distinct one once.
+    memo = {}
+    encoded = []
+    for value in values:
+        key = (type(value), value) if isinstance(value, (str, int, float, bool, type(None))) else None
+        entry = memo.get(key) if key is not None else None
+        if entry is None:
+            entry = json.dumps(_jsonable(value)).encode('utf-8') + b','
+            if key is not None:
+                memo[key] = entry
+        encoded.append(entry)
+    members[member] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    members[f"{member}_offsets"] = np.concatenate(
+        ([0], np.cumsum([len(entry) for entry in encoded], dtype=np.int64)))
+    return {'kind': 'json', 'member': member, 'offsets': f"{member}_offsets"}
+
+
+def column_kind(values):
+    """Storage kind for a column of Python values: 'bool', 'int64', 'float64' or 'json'."""
+    dtype = _numeric_dtype(values)
+    return 'json' if dtype is None else dtype.name
+
+
+def _numeric_dtype(values):
+    """Smallest of bool/int64/float64 holding every non-missing value, or None if not numeric."""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, (bool, np.bool_)):
+            kinds.add('bool')
+        elif isinstance(value, (int, np.integer)):
+            kinds.add('int')
+        elif isinstance(value, (float, np.floating)):
+            kinds.add('float')
+        else:
+            return None
+    if not kinds or (len(kinds) > 1 and 'bool' in kinds):
+        return None
+    if kinds == {'bool'}:
+        return np.dtype(bool)
+    if kinds == {'int'}:
+        return np.dtype(np.int64)
+    return np.dtype(np.float64)
+
+
+def _jsonable(value):
+    """Converts numpy scalars and tuples/sets to plain JSON types."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return value
+
+
+def _json_bytes(value):
+    return np.frombuffer(json.dumps(value).encode('utf-8'), dtype=np.uint8)
@@ -0,0 +1,406 @@
+import bz2
+import gzip
+import math
+import re
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src import instrumentation
+from src.logger import get_logger
+from src.network.geo import EARTH_RADIUS_M, haversine_m
+from src.network.network_generator import LogisticsNetwork
+from src.network.network_store import NetworkStore
+
+logger = get_logger(__name__)
+
+# Same exclusions as osmnx's 'drive' network type.
+EXCLUDED_HIGHWAYS = frozenset({
+    'abandoned', 'bridleway', 'bus_guideway', 'construction', 'corridor', 'cycleway', 'elevator',
+    'escalator', 'footway', 'no', 'path', 'pedestrian', 'planned', 'platform', 'proposed', 'raceway',
+    'razed', 'service', 'steps', 'track',
+})
+EXCLUDED_ACCESS = frozenset({'no', 'private'})
+# Ways that are one-way without saying so.
+IMPLIED_ONEWAY_HIGHWAYS = frozenset({'motorway'})
+# Fallback speeds (km/h) where a way has no usable maxspeed.
+DEFAULT_SPEEDS_KPH = {
+    'motorway': 100, 'motorway_link': 60, 'trunk': 80, 'trunk_link': 50, 'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 40, 'tertiary': 40, 'tertiary_link': 30, 'unclassified': 40,
+    'residential': 30, 'living_street': 10, 'road': 40,
+}
+DEFAULT_SPEED_KPH = 30  # as LogisticsNetwork.add_travel_time assumes
+MPH_TO_KPH = 1.609344
+
+_MAXSPEED = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(mph)?', re.IGNORECASE)
+
+
+class OSMLoader:
+    """Builds a LogisticsNetwork from a local OSM extract without downloading anything.
+
+    Reads OSM XML (.osm, optionally .gz/.bz2), osmnx-style GraphML (.graphml) and, when the
+    optional osmium package is installed, .osm.pbf. Files are streamed element by element:
+    nodes outside bbox and non-drivable ways are dropped as they are read, and what is kept
+    is held in flat typed arrays rather than Python objects, so memory follows the kept
+    part of the map rather than the file.
+
+    OSM ways are split into edges at intersections and way ends (like osmnx simplification;
+    simplify=False keeps every way node), parallel edges are reduced to the fastest one and
+    only the largest strongly connected component is kept. The result goes straight into a
+    NetworkStore, so no networkx graph is built: node roles, edge capacities and composite
+    weights are filled in the same way LogisticsNetwork initialization fills them, from seed.
+
+    bbox: (west, south, east, north) in degrees; None keeps the whole file.
+    """
+
+    def __init__(self, bbox=None, simplify=True, seed=42):
+        self.bbox = bbox
+        self.simplify = simplify
+        self.seed = seed
+
+    def load(self, path) -> LogisticsNetwork:
+        path = str(path)
+        with instrumentation.span('osm.read'):
+            if path.endswith('.graphml'):
+                nodes, edges = self._read_graphml(path)
+            else:
+                collector = _WayCollector(self.bbox)
+                if path.endswith('.pbf'):
+                    _read_pbf(path, collector)
+                else:
+                    _read_osm_xml(path, collector)
+                nodes = collector.node_arrays()
+                edges = collector.edges(nodes, simplify=self.simplify)
+        with instrumentation.span('osm.assemble'):
+            store = self._assemble(nodes, edges)
+        logger.info(f"Loaded {store.node_count} nodes and {store.edge_count} edges from {path}")
+        return LogisticsNetwork(store=store)
+
+    def _read_graphml(self, path):
+        """Streams nodes and edges out of a GraphML file (osmnx save_graphml layout)."""
+        keys = {}
+        ids, lons, lats = [], array('d'), array('d')
+        index = {}
+        sources, targets, lengths, speeds, highways, oneways = array('q'), array('q'), array('d'), array('d'), [], []
+        graph = None
+        for event, element in ET.iterparse(_open(path), events=('start', 'end')):
+            tag = element.tag.rpartition('}')[2]
+            if event == 'start':
+                if tag == 'graph':
+                    graph = element
+                continue
+            if tag == 'key':
+                keys[element.get('id')] = element.get('attr.name')
+            elif tag == 'node':
+                data = _graphml_data(element, keys)
+                x, y = float(data.get('x', 'nan')), float(data.get('y', 'nan'))
+                if _inside(self.bbox, x, y):
+                    index[element.get('id')] = len(ids)
+                    ids.append(element.get('id'))
+                    lons.append(x)
+                    lats.append(y)
+            elif tag == 'edge':
+                data = _graphml_data(element, keys)
+                u, v = index.get(element.get('source')), index.get(element.get('target'))
+                highway = _first_tag(data.get('highway'))
+                if u is not None and v is not None and (highway is None or _drivable({**data, 'highway': highway})):
+                    sources.append(u)
+                    targets.append(v)
+                    lengths.append(float(data.get('length', 'nan')))
+                    # A missing, zero or unreadable speed would make the travel time infinite.
+                    speed = _positive_float(data.get('speed_kph'))
+                    speeds.append(speed if speed else _speed_kph(data.get('maxspeed'), highway))
+                    highways.append(highway)
+                    oneways.append(str(data.get('oneway', '')).lower() in ('true', 'yes', '1'))
+            else:
+                continue
+            if tag in ('node', 'edge') and graph is not None:
+                # Nodes and edges are children of <graph>: drop them once read.
+                graph.clear()
+        node_ids = _node_id_array(ids)
+        lon, lat = np.frombuffer(lons), np.frombuffer(lats)
+        sources, targets = np.frombuffer(sources, dtype=np.int64), np.frombuffer(targets, dtype=np.int64)
+        lengths = np.frombuffer(lengths).copy()
+        missing = ~np.isfinite(lengths)
+        lengths[missing] = haversine_m(lon[sources[missing]], lat[sources[missing]],
+                                       lon[targets[missing]], lat[targets[missing]])
+        edges = (sources, targets, lengths, np.frombuffer(speeds), highways, np.asarray(oneways, dtype=bool))
+        return (node_ids, lon, lat), edges
+
+    def _assemble(self, nodes, edges):
+        """Compacts, deduplicates and trims edges to the largest SCC, then fills a NetworkStore."""
+        node_ids, lon, lat = nodes
+        sources, targets, length, speed_kph, highway, oneway = edges
+        highway = np.asarray(highway, dtype=object)
+        travel_time = length / (speed_kph * 1000 / 60)  # minutes, as add_travel_time computes
+
+        # Self-loops never help a route; of parallel edges keep the fastest.
+        keep = sources != targets
+        order = np.lexsort((travel_time[keep], targets[keep], sources[keep]))
+        selected = np.flatnonzero(keep)[order]
+        pairs = sources[selected] * len(node_ids) + targets[selected]
+        selected = selected[np.concatenate(([True], pairs[1:] != pairs[:-1]))] if len(selected) else selected
+        sources, targets = sources[selected], targets[selected]
+
+        # Largest strongly connected component, as SpatialDataMapper keeps.
+        adjacency = csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(len(node_ids),) * 2)
+        _, labels = connected_components(adjacency, directed=True, connection='strong')
+        used = np.zeros(len(node_ids), dtype=bool)
+        used[sources] = used[targets] = True
+        if not used.any():
+            raise ValueError("No drivable roads found in the extract (check bbox and file)")
+        largest = np.bincount(labels[used]).argmax()
+        inside = (labels[sources] == largest) & (labels[targets] == largest)
+        selected, sources, targets = selected[inside], sources[inside], targets[inside]
+
+        kept_nodes = np.flatnonzero(used & (labels == largest))
+        remap = np.full(len(node_ids), -1, dtype=np.int64)
+        remap[kept_nodes] = np.arange(len(kept_nodes))
+        sources, targets = remap[sources], remap[targets]
+        # CSR: edges grouped by source.
+        order = np.argsort(sources, kind='stable')
+        selected, sources, targets = selected[order], sources[order], targets[order]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(kept_nodes)))))
+
+        rng = np.random.default_rng(self.seed)
+        edge_columns = {
+            'length': length[selected],
+            'speed_kph': speed_kph[selected],
+            'highway': highway[selected].tolist(),
+            'oneway': oneway[selected],
+            'capacity': rng.integers(10, 51, size=len(selected)),
+            'travel_time': travel_time[selected],
+        }
+        # Composite weight, as LogisticsNetwork.normalize_edge_attributes computes it.
+        edge_columns['norm_time_cost'] = _min_max_scale(edge_columns['travel_time'])
+        edge_columns['norm_dist_cost'] = _min_max_scale(edge_columns['length'])
+        edge_columns['weight'] = 0.7 * edge_columns['norm_time_cost'] + 0.3 * edge_columns['norm_dist_cost']
+
+        node_ids = node_ids[kept_nodes]
+        return NetworkStore.from_arrays(node_ids, offsets, targets,
+                                        node_columns={'x': lon[kept_nodes], 'y': lat[kept_nodes],
+                                                      **_node_roles(len(kept_nodes), rng)},
+                                        edge_columns=edge_columns,
+                                        graph={'crs': 'epsg:4326'})
+
+
+class _WayCollector:
+    """Accumulates OSM nodes (inside bbox) and drivable ways in flat typed arrays."""
+
+    def __init__(self, bbox):
+        self.bbox = bbox
+        self.node_ids, self.lons, self.lats = array('q'), array('d'), array('d')
+        self.refs, self.way_offsets = array('q'), array('q', [0])
+        self.oneway, self.speeds, self.highways = array('b'), array('d'), []
+
+    def add_node(self, node_id, lon, lat):
+        if _inside(self.bbox, lon, lat):
+            self.node_ids.append(node_id)
+            self.lons.append(lon)
+            self.lats.append(lat)
+
+    def add_way(self, refs, tags):
+        if len(refs) < 2 or not _drivable(tags):
+            return
+        highway = tags['highway']
+        self.refs.extend(refs)
+        self.way_offsets.append(len(self.refs))
+        self.oneway.append(_oneway(tags))
+        self.speeds.append(_speed_kph(tags.get('maxspeed'), highway))
+        self.highways.append(highway)
+
+    def node_arrays(self):
+        node_ids = np.frombuffer(self.node_ids, dtype=np.int64)
+        order = np.argsort(node_ids, kind='stable')
+        return node_ids[order], np.frombuffer(self.lons)[order], np.frombuffer(self.lats)[order]
+
+    def edges(self, nodes, simplify=True):
+        """Splits ways into edges between graph nodes (intersections and run ends), vectorized."""
+        node_ids, lon, lat = nodes
+        refs = np.frombuffer(self.refs, dtype=np.int64)
+        offsets = np.frombuffer(self.way_offsets, dtype=np.int64)
+        way = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        # Position of each ref in the node arrays, -1 if the node is outside bbox or absent.
+        found = np.minimum(np.searchsorted(node_ids, refs), max(len(node_ids) - 1, 0))
+        present = (node_ids[found] == refs) if len(node_ids) else np.zeros(len(refs), dtype=bool)
+        position = np.where(present, found, -1)
+
+        # A segment joins refs i and i+1 of the same way when both nodes are kept.
+        segment = present[:-1] & present[1:] & (way[:-1] == way[1:])
+        seg_length = np.zeros(len(segment))
+        a, b = position[:-1][segment], position[1:][segment]
+        seg_length[segment] = haversine_m(lon[a], lat[a], lon[b], lat[b])
+        distance = np.concatenate(([0.0], np.cumsum(seg_length)))
+
+        # Runs are maximal chains of segments; graph nodes are run ends and shared nodes.
+        starts = present & ~np.concatenate(([False], segment))
+        ends = present & ~np.concatenate((segment, [False]))
+        if simplify:
+            uses = np.bincount(position[present], minlength=len(node_ids))
+            graph_node = present & (starts | ends | (uses[np.maximum(position, 0)] > 1))
+        else:
+            graph_node = present.copy()
+        run = np.cumsum(starts) - 1
+
+        at = np.flatnonzero(graph_node)
+        link = run[at[:-1]] == run[at[1:]]
+        first, second = at[:-1][link], at[1:][link]
+        length = distance[second] - distance[first]
+        ways = way[first]
+        u, v = position[first], position[second]
+
+        # oneway 1: along the way; -1: against it; 0: both directions.
+        direction = np.frombuffer(self.oneway, dtype=np.int8)[ways]
+        forward, backward = direction >= 0, direction <= 0
+        sources = np.concatenate((u[forward], v[backward]))
+        targets = np.concatenate((v[forward], u[backward]))
+        ways = np.concatenate((ways[forward], ways[backward]))
+        highways = np.asarray(self.highways, dtype=object)[ways] if len(ways) else np.zeros(0, dtype=object)
+        oneway = np.concatenate((direction[forward], direction[backward])) != 0
+        return (sources, targets, np.concatenate((length[forward], length[backward])),
+                np.frombuffer(self.speeds)[ways], highways, oneway)
+
+
+def _read_osm_xml(path, collector):
+    """Streams an OSM XML file into collector, clearing each element once read."""
+    refs, tags = [], {}
+    context = ET.iterparse(_open(path), events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        tag = element.tag
+        if event == 'start':
+            if tag in ('node', 'way', 'relation'):
+                refs, tags = [], {}
+            continue
+        if tag == 'nd':
+            refs.append(int(element.get('ref')))
+        elif tag == 'tag':
+            tags[element.get('k')] = element.get('v')
+        elif tag == 'node':
+            collector.add_node(int(element.get('id')), float(element.get('lon')), float(element.get('lat')))
+        elif tag == 'way':
+            collector.add_way(refs, tags)
+        else:
+            continue
+        if tag in ('node', 'way', 'relation'):
+            # Children are read already; drop them and detach from the root.
+            element.clear()
+            root.clear()
+
+
+def _read_pbf(path, collector):
+    try:
+        import osmium
+    except ImportError as ex:
+        raise ImportError("Reading .osm.pbf files needs the optional 'osmium' package "
+                          "(pip install osmium); .osm XML and .graphml load without it.") from ex
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            if node.location.valid():
+                collector.add_node(node.id, node.location.lon, node.location.lat)
+
+        def way(self, way):
+            collector.add_way([ref.ref for ref in way.nodes], {tag.k: tag.v for tag in way.tags})
+
+    Handler().apply_file(path)
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _inside(bbox, lon, lat):
+    if bbox is None:
+        return True
+    west, south, east, north = bbox
+    return west <= lon <= east and south <= lat <= north
+
+
+def _drivable(tags):
+    highway = tags.get('highway')
+    return (highway is not None and highway not in EXCLUDED_HIGHWAYS
+            and tags.get('area') != 'yes'
+            and tags.get('access') not in EXCLUDED_ACCESS
+            and tags.get('motor_vehicle') not in EXCLUDED_ACCESS
+            and tags.get('motorcar') not in EXCLUDED_ACCESS)
+
+
+def _oneway(tags):
+    value = tags.get('oneway', '').lower()
+    if value in ('-1', 'reverse'):
+        return -1
+    if value in ('yes', 'true', '1') or tags.get('junction') == 'roundabout' or (
+            value == '' and tags.get('highway') in IMPLIED_ONEWAY_HIGHWAYS):
+        return 1
+    return 0
+
+
+def _speed_kph(maxspeed, highway):
+    """km/h from an OSM maxspeed ('25 mph', '50', '40;50'), else the road type's default."""
+    match = _MAXSPEED.match(str(maxspeed).split(';')[0]) if maxspeed else None
+    if match and float(match.group(1)) > 0:
+        return float(match.group(1)) * (MPH_TO_KPH if match.group(2) else 1.0)
+    return float(DEFAULT_SPEEDS_KPH.get(highway, DEFAULT_SPEED_KPH))
+
+
+def _positive_float(value):
+    """float(value) if that is a positive number, else None."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if 0 < number < math.inf else None
+
+
+def _first_tag(value):
+    """First entry of a GraphML list-valued tag such as "['primary', 'secondary']"."""
+    if value is None or not value.startswith('['):
+        return value
+    entries = re.findall(r"'([^']*)'", value)
+    return entries[0] if entries else None
+
+
+def _graphml_data(element, keys):
+    return {keys.get(child.get('key'), child.get('key')): child.text
+            for child in element if child.tag.rpartition('}')[2] == 'data'}
+
+
+def _node_id_array(ids):
+    try:
+        return np.asarray([int(node) for node in ids], dtype=np.int64)
+    except ValueError:
+        return np.asarray(ids, dtype=object)
+
+
+def _node_roles(count, rng):
+    """type/urgency/demand columns drawn like LogisticsNetwork.assign_roles."""
+    order = rng.permutation(count)
+    types = np.full(count, 'customer', dtype=object)
+    types[order[:1]] = 'warehouse'
+    types[order[1:4]] = 'hub'
+    customer = types == 'customer'
+    urgency = np.where(customer, rng.choice([0, 1, 2], p=[0.6, 0.3, 0.1], size=count), 0)
+    demand = np.where(customer, rng.uniform(5, 25, size=count), 0.0)
+    return {'type': types.tolist(), 'urgency': urgency.astype(np.int64), 'demand': demand}
+
+
+def _min_max_scale(values):
+    span = values.max() - values.min() if len(values) else 0
+    return (values - values.min()) / (span if span else 1) if len(values) else values
+
+
+def bbox_around(center_point, radius_m):
+    """(west, south, east, north) of the square of half-side radius_m around a (lat, lon) centre."""
+    lat, lon = center_point
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-9)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
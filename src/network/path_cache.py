@@ -0,0 +1,184 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src import instrumentation
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ShortestPathCache:
+    """Bounded LRU cache of single-source shortest-path trees keyed by source node index.
+
+    Each tree is a (distances, predecessors) pair of arrays over the compiled graph.
+    Trees are evicted least-recently-used first once max_bytes is exceeded; a tree
+    larger than the whole budget is simply not kept. max_bytes=0 disables caching.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._trees = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._trees)
+
+    def __contains__(self, source):
+        return source in self._trees
+
+    @property
+    def used_bytes(self):
+        return self._bytes
+
+    def get(self, source):
+        """Returns the cached (distances, predecessors) tree for source, or None on a miss."""
+        tree = self._trees.get(source)
+        if tree is None:
+            self.misses += 1
+            instrumentation.count('path_cache.misses')
+            return None
+        self._trees.move_to_end(source)
+        self.hits += 1
+        instrumentation.count('path_cache.hits')
+        return tree
+
+    def put(self, source, distances, predecessors):
+        """Stores a tree for source, evicting least-recently-used trees to stay within budget."""
+        size = distances.nbytes + predecessors.nbytes
+        if size > self.max_bytes:
+            return
+        if source in self._trees:
+            self._discard(source)
+
+        while self._trees and self._bytes + size > self.max_bytes:
+            oldest = next(iter(self._trees))
+            self._discard(oldest)
+            self.evictions += 1
+            instrumentation.count('path_cache.evictions')
+
+        self._trees[source] = (distances, predecessors)
+        self._bytes += size
+
+    def clear(self):
+        """Drops every cached tree (counters are kept)."""
+        self._trees.clear()
+        self._bytes = 0
+
+    def stats(self):
+        """Returns a dictionary of cache counters and memory usage."""
+        return {
+            "entries": len(self._trees),
+            "used_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _discard(self, source):
+        distances, predecessors = self._trees.pop(source)
+        self._bytes -= distances.nbytes + predecessors.nbytes
+
+
+DEFAULT_RETAINED_PATH_BYTES = 16 * 1024 * 1024
+
+
+class RetainedPaths:
+    """Compact shortest-path subtrees kept from cost-matrix builds, keyed like the tree cache.
+
+    Only the predecessor links on a source's paths to the matrix targets are kept, as
+    sorted int32 node indices with their int32 parents: 8 bytes per node on those paths,
+    where a full cached tree costs 12 bytes per graph node. Paths between matrix
+    locations can then be rebuilt by walking parents, with no search. Subtrees are
+    evicted least-recently-used first past max_bytes; path() then returns None and the
+    caller searches on demand. max_bytes=0 disables retention.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_RETAINED_PATH_BYTES):
+        self.max_bytes = max_bytes
+        self._trees = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._trees)
+
+    def __contains__(self, key):
+        return key in self._trees
+
+    @property
+    def used_bytes(self):
+        return self._bytes
+
+    def put(self, key, source_idx, nodes, parents):
+        """Keeps the subtree of source_idx given as sorted nodes and their parents."""
+        size = nodes.nbytes + parents.nbytes
+        if size > self.max_bytes:
+            return
+        if key in self._trees:
+            self._discard(key)
+        while self._trees and self._bytes + size > self.max_bytes:
+            self._discard(next(iter(self._trees)))
+            instrumentation.count('retained_paths.evictions')
+        self._trees[key] = (source_idx, nodes, parents)
+        self._bytes += size
+
+    def path(self, key, target_idx):
+        """Returns the index path from the subtree's source to target_idx, or None if not retained."""
+        entry = self._trees.get(key)
+        if entry is None:
+            instrumentation.count('retained_paths.misses')
+            return None
+        source_idx, nodes, parents = entry
+        path = [target_idx]
+        while path[-1] != source_idx:
+            i = int(np.searchsorted(nodes, path[-1]))
+            if i == len(nodes) or nodes[i] != path[-1] or parents[i] < 0:
+                instrumentation.count('retained_paths.misses')
+                return None
+            path.append(int(parents[i]))
+        self._trees.move_to_end(key)
+        instrumentation.count('retained_paths.hits')
+        return path[::-1]
+
+    def clear(self):
+        self._trees.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return {"entries": len(self._trees), "used_bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _discard(self, key):
+        _, nodes, parents = self._trees.pop(key)
+        self._bytes -= nodes.nbytes + parents.nbytes
+
+
+def path_subtrees(predecessors, target_idx):
+    """Splits (S x V) predecessor rows into the subtrees spanning each row's paths to target_idx.
+
+    Walks parents for every (row, target) at once, one hop per step, marking visited
+    (row, node) pairs so shared path prefixes are walked once. Returns, per row,
+    (nodes, parents) int32 arrays sorted by node; unreachable targets appear with a
+    negative parent.
+    """
+    rows, size = predecessors.shape
+    flat_predecessors = predecessors.reshape(-1)
+    visited = np.zeros(rows * size, dtype=bool)
+    frontier = np.unique((np.arange(rows, dtype=np.int64)[:, None] * size
+                          + np.asarray(target_idx, dtype=np.int64)[None, :]).reshape(-1))
+    while frontier.size:
+        visited[frontier] = True
+        parents = flat_predecessors[frontier]
+        reached = parents >= 0
+        frontier = frontier[reached] - frontier[reached] % size + parents[reached]
+        frontier = np.unique(frontier[~visited[frontier]])
+
+    kept = np.flatnonzero(visited)
+    bounds = np.searchsorted(kept, np.arange(rows + 1, dtype=np.int64) * size)
+    subtrees = []
+    for row in range(rows):
+        flat = kept[bounds[row]:bounds[row + 1]]
+        subtrees.append(((flat - row * size).astype(np.int32), flat_predecessors[flat].astype(np.int32)))
+    return subtrees
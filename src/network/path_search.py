@@ -0,0 +1,77 @@
+import heapq
+
+import numpy as np
+
+from src.network.geo import EARTH_RADIUS_M
+
+
+def iter_settled(graph, source_idx):
+    """Yields (node_idx, distance) pairs in nondecreasing distance order from source_idx.
+
+    Lazy Dijkstra over a CompiledGraph's CSR arrays: a caller that stops iterating
+    once it has found what it needs never pays for the rest of the search.
+    """
+    offsets, targets, weights = graph.adjacency_lists()
+    best = {source_idx: 0.0}
+    settled = set()
+    heap = [(0.0, source_idx)]
+
+    while heap:
+        dist, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        yield u, dist
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            candidate = dist + weights[k]
+            if candidate < best.get(v, float('inf')):
+                best[v] = candidate
+                heapq.heappush(heap, (candidate, v))
+
+
+def point_to_point(graph, source_idx, target_idx, heuristic=False):
+    """Single-pair search over a CompiledGraph, stopping once target_idx is settled.
+
+    With heuristic=True this is A*: each node's priority adds a lower bound on the remaining
+    cost, graph.min_cost_per_metre() times the straight-line (chord) distance to the target.
+    The chord never exceeds the great-circle distance and obeys the triangle inequality, so
+    the bound is admissible and consistent. Without it (or when that scale is 0) this is
+    plain Dijkstra.
+
+    Returns (distance, parents, settled_count); distance is inf if target is unreachable
+    and parents maps each reached node index to its predecessor.
+    """
+    offsets, targets, weights = graph.adjacency_lists()
+    scale = graph.min_cost_per_metre() if heuristic else 0.0
+    if scale > 0:
+        # Pull the bound in a hair so floating-point noise never makes it inadmissible.
+        scale *= EARTH_RADIUS_M * (1 - 1e-9)
+        positions = graph.unit_vectors()
+        estimate = (scale * np.linalg.norm(positions - positions[target_idx], axis=1)).tolist()
+    else:
+        estimate = [0.0] * graph.node_count
+
+    best = {source_idx: 0.0}
+    parents = {source_idx: -1}
+    settled = set()
+    heap = [(estimate[source_idx], 0.0, source_idx)]
+
+    while heap:
+        _, dist, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target_idx:
+            return dist, parents, len(settled)
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            candidate = dist + weights[k]
+            if candidate < best.get(v, float('inf')):
+                best[v] = candidate
+                parents[v] = u
+                heapq.heappush(heap, (candidate + estimate[v], candidate, v))
+
+    return float('inf'), parents, len(settled)
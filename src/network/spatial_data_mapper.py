@@ -3,6 +3,8 @@ import networkx as nx
 import random
 
 from .network_generator import LogisticsNetwork
+from .osm_loader import OSMLoader, bbox_around
+from .spatial_index import SpatialIndex
 from src.logger import get_logger
 
 logger = get_logger(__name__)
@@ -25,7 +27,7 @@ class SpatialDataMapper:
         #Generate a sub-graph
         if center_point is not None:
             lat, lon = center_point
-            start_node = ox.distance.nearest_nodes(graph, X=lon, Y=lat)
+            start_node = SpatialIndex.from_networkx(graph).snap(lon, lat)[0]
         else:
             start_node = random.Random(seed).choice(list(graph.nodes))
         logger.info(f"BFS sample start_node={start_node}, center_point={center_point}, seed={seed}")
@@ -38,3 +40,16 @@ class SpatialDataMapper:
         final_G = sub_G.subgraph(largest_scc).copy()
 
         return LogisticsNetwork(final_G)
+
+    @staticmethod
+    def from_file(path, bbox=None, center_point=None, radius_m=2000, seed=42):
+        """Builds a LogisticsNetwork from a local .osm/.osm.pbf/.graphml extract, offline.
+
+        bbox: (west, south, east, north) to cut out of the extract; alternatively center_point,
+        a (lat, lon) tuple, keeps the square of half-side radius_m around it. With neither the
+        whole extract is loaded.
+        """
+        if bbox is None and center_point is not None:
+            bbox = bbox_around(center_point, radius_m)
+        logger.info(f"Loading {path} (bbox={bbox})")
+        return OSMLoader(bbox=bbox, seed=seed).load(path)
@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from src.network.geo import EARTH_RADIUS_M
+
+
+class SpatialIndex:
+    """KD-tree over node positions for snapping lon/lat points to nodes and geographic queries.
+
+    Nodes are placed on a sphere of the Earth's radius (3-D, in metres), so straight-line
+    (chord) order matches great-circle order exactly and no map projection zone has to be
+    chosen. Query distances are converted back to great-circle metres. Nodes without
+    coordinates are left out. version records the CompiledGraph it was last checked against.
+    """
+
+    def __init__(self, node_ids, x, y, version=0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.node_ids = list(node_ids)
+        self.version = version
+        self.x, self.y = x, y
+        # Tree rows map back to node indices through self.indices.
+        self.indices = np.flatnonzero(np.isfinite(x) & np.isfinite(y)).astype(np.int32)
+        # Tree row -> node index, with -1 for the row past the end (cKDTree's "not found").
+        self._row_nodes = np.append(self.indices, -1)
+        self.points = _to_points(x[self.indices], y[self.indices])
+        self.points.flags.writeable = False
+        self.tree = cKDTree(self.points)
+
+    @classmethod
+    def from_compiled(cls, graph):
+        return cls(graph.node_ids, graph.x, graph.y, version=graph.version)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        x = [data.get('x', np.nan) for _, data in graph.nodes(data=True)]
+        y = [data.get('y', np.nan) for _, data in graph.nodes(data=True)]
+        return cls(graph.nodes, x, y)
+
+    def matches(self, graph):
+        """True if graph has the same nodes at the same positions (weights may differ)."""
+        return (graph.node_ids == self.node_ids
+                and np.array_equal(graph.x, self.x, equal_nan=True)
+                and np.array_equal(graph.y, self.y, equal_nan=True))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def coordinates(self, node_indices):
+        """Returns (m, 3) metric coordinates of the given node indices (usable for clustering)."""
+        node_indices = np.asarray(node_indices, dtype=np.int64)
+        rows = np.searchsorted(self.indices, node_indices)
+        if not np.array_equal(self._row_nodes[rows], node_indices):
+            raise ValueError("Some nodes have no coordinates")
+        return self.points[rows]
+
+    def nearest(self, lons, lats, k=1, max_distance=None):
+        """k nearest nodes to each lon/lat point, in bulk.
+
+        Returns (indices, distances): node indices and great-circle metres, shaped (m,) for
+        k == 1 and (m, k) otherwise. Slots with no node within max_distance metres (or
+        beyond the node count) hold index -1 and distance inf.
+        """
+        bound = np.inf if max_distance is None else _chord(max_distance)
+        chords, rows = self.tree.query(_to_points(lons, lats), k=k, distance_upper_bound=bound)
+        found = np.isfinite(chords)
+        indices = np.where(found, self._row_nodes[np.minimum(rows, len(self.indices))], -1)
+        return indices, np.where(found, _arc(chords), np.inf)
+
+    def within(self, lon, lat, radius):
+        """Node indices within radius metres (great-circle) of one lon/lat point, nearest first."""
+        center = _to_points(lon, lat)
+        rows = np.asarray(self.tree.query_ball_point(center, _chord(radius)), dtype=np.intp)
+        order = np.argsort(np.linalg.norm(self.points[rows] - center, axis=1), kind='stable')
+        return self.indices[rows[order]]
+
+    def snap(self, lons, lats, max_distance=None):
+        """Node id of the nearest node to each lon/lat point (None where none within max_distance)."""
+        indices, _ = self.nearest(np.atleast_1d(lons), np.atleast_1d(lats), max_distance=max_distance)
+        return [self.node_ids[i] if i >= 0 else None for i in indices.tolist()]
+
+
+def _to_points(lons, lats):
+    lon, lat = np.radians(np.asarray(lons, dtype=np.float64)), np.radians(np.asarray(lats, dtype=np.float64))
+    return EARTH_RADIUS_M * np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def _chord(metres):
+    """Great-circle metres -> straight-line metres through the sphere."""
+    return 2 * EARTH_RADIUS_M * np.sin(np.minimum(metres, np.pi * EARTH_RADIUS_M) / (2 * EARTH_RADIUS_M))
+
+
+def _arc(chords):
+    """Straight-line metres through the sphere -> great-circle metres."""
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chords / (2 * EARTH_RADIUS_M), 0.0, 1.0))
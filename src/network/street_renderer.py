@@ -0,0 +1,120 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from src.network.compiled_graph import CompiledGraph
+
+# Same look as the osmnx plots this replaces (ox.plot_graph defaults plus our node styling).
+BACKGROUND = '#111111'
+EDGE_COLOR = '#999999'
+NODE_COLOR = '#3498db'
+NODE_SIZE = 15
+ROUTE_LINEWIDTH = 3
+ROUTE_ALPHA = 0.5
+PADDING = 0.02  # fraction of the extent added on every side
+
+
+class StreetRenderer:
+    """Draws routes over a street base map that is rendered only once.
+
+    The base layer (every street segment and node of a CompiledGraph, as straight
+    segments between node coordinates) is rasterized on first use and kept. Each route
+    image is then that raster plus the route polylines, so drawing a solution costs as
+    much as its routes rather than as much as the whole network. Route jobs can be
+    rendered in parallel worker processes, which only receive the raster and the route
+    coordinates.
+    """
+
+    def __init__(self, graph: CompiledGraph, width=8, dpi=150):
+        self.graph = graph
+        self.width = width
+        self.dpi = dpi
+        self._base = None
+
+    @property
+    def version(self):
+        return self.graph.version
+
+    def base_layer(self):
+        """Returns (raster, view) for the street layer, rendering it on first call.
+
+        raster is an (H x W x 4) uint8 RGBA image; view holds the axis limits and figure
+        size it was drawn at, which route overlays must reuse to line up with it.
+        """
+        if self._base is None:
+            view = self._view()
+            fig, ax = _figure(view)
+            sources = self.graph.edge_sources()
+            segments = np.stack([np.column_stack((self.graph.x[sources], self.graph.y[sources])),
+                                 np.column_stack((self.graph.x[self.graph.targets], self.graph.y[self.graph.targets]))],
+                                axis=1)
+            ax.add_collection(LineCollection(segments, colors=EDGE_COLOR, linewidths=1, zorder=1))
+            ax.scatter(self.graph.x, self.graph.y, s=NODE_SIZE, c=NODE_COLOR, edgecolor='none', zorder=2)
+            fig.canvas.draw()
+            raster = np.asarray(fig.canvas.buffer_rgba()).copy()
+            self._base = raster, view
+        return self._base
+
+    def route_lines(self, paths):
+        """Converts node-id paths into (x, y) coordinate arrays."""
+        lines = []
+        for path in paths:
+            index = self.graph.indices_of(path)
+            lines.append((self.graph.x[index], self.graph.y[index]))
+        return lines
+
+    def render(self, filepath, lines, colors):
+        """Saves the base map with lines ((x, y) arrays, one colour each) drawn on top."""
+        raster, view = self.base_layer()
+        _render_overlay(raster, view, lines, colors, filepath)
+
+    def render_many(self, jobs, max_workers=None):
+        """Renders {filepath: (lines, colors)} jobs, in parallel worker processes if max_workers > 1."""
+        raster, view = self.base_layer()
+        if max_workers == 1 or len(jobs) <= 1:
+            for filepath, (lines, colors) in jobs.items():
+                _render_overlay(raster, view, lines, colors, filepath)
+            return
+        with ProcessPoolExecutor(min(max_workers or len(jobs), len(jobs))) as pool:
+            futures = [pool.submit(_render_overlay, raster, view, lines, colors, filepath)
+                       for filepath, (lines, colors) in jobs.items()]
+            for future in futures:
+                future.result()
+
+    def _view(self):
+        """Axis limits (padded like osmnx) and a figure size that keeps the map undistorted."""
+        x, y = self.graph.x, self.graph.y
+        left, right = float(np.nanmin(x)), float(np.nanmax(x))
+        bottom, top = float(np.nanmin(y)), float(np.nanmax(y))
+        pad_x = (right - left) * PADDING or 0.5
+        pad_y = (top - bottom) * PADDING or 0.5
+        xlim = (left - pad_x, right + pad_x)
+        ylim = (bottom - pad_y, top + pad_y)
+        # Lon/lat degrees: a degree of longitude is cos(lat) as long as a degree of latitude.
+        coslat = np.cos(np.radians((bottom + top) / 2)) if abs(bottom) <= 90 and abs(top) <= 90 else 1.0
+        aspect = (ylim[1] - ylim[0]) / ((xlim[1] - xlim[0]) * coslat)
+        height = min(max(self.width * aspect, 1.0), 4 * self.width)
+        return {'xlim': xlim, 'ylim': ylim, 'figsize': (self.width, height), 'dpi': self.dpi}
+
+
+def _figure(view):
+    fig = Figure(figsize=view['figsize'], dpi=view['dpi'], facecolor=BACKGROUND)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_facecolor(BACKGROUND)
+    ax.set_xlim(view['xlim'])
+    ax.set_ylim(view['ylim'])
+    ax.set_axis_off()
+    return fig, ax
+
+
+def _render_overlay(raster, view, lines, colors, filepath):
+    fig, ax = _figure(view)
+    ax.imshow(raster, extent=(*view['xlim'], *view['ylim']), aspect='auto', interpolation='nearest', zorder=0)
+    for (x, y), color in zip(lines, colors):
+        ax.plot(x, y, c=color, lw=ROUTE_LINEWIDTH, alpha=ROUTE_ALPHA, zorder=3)
+        ax.scatter([x[0], x[-1]], [y[0], y[-1]], s=100, c=color, alpha=ROUTE_ALPHA, edgecolor='none', zorder=4)
+    fig.savefig(filepath, dpi=view['dpi'], facecolor=BACKGROUND)
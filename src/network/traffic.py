@@ -0,0 +1,130 @@
+import numpy as np
+
+# Same volatility split as LogisticsNetwork.simulate_traffic: local roads are noisier.
+LOW_CAPACITY_THRESHOLD = 20
+LOW_CAPACITY_VOLATILITY = 0.4
+HIGH_CAPACITY_VOLATILITY = 0.1
+
+
+class TrafficScenarios:
+    """Edge weights for S traffic realizations, as (S x E) arrays in CompiledGraph edge order.
+
+    weights[s] is travel_time * congestion[s] for scenario s; intensities[s] and seeds[s]
+    describe how it was drawn. offsets/targets pin the topology the rows are aligned with.
+    """
+
+    def __init__(self, weights, congestion, intensities, seeds, offsets, targets):
+        self.weights = weights
+        self.congestion = congestion
+        self.intensities = list(intensities)
+        self.seeds = list(seeds)
+        self._offsets = offsets
+        self._targets = targets
+
+    def __len__(self):
+        return len(self.weights)
+
+    def matches(self, graph):
+        """True if graph has the edge layout these scenarios were generated for."""
+        if graph.offsets is self._offsets and graph.targets is self._targets:
+            return True
+        return np.array_equal(graph.offsets, self._offsets) and np.array_equal(graph.targets, self._targets)
+
+
+def simulate_scenarios(travel_times, capacities, intensities, seeds=42):
+    """Draws congestion factors for every (intensity, seed) scenario in one vectorized pass.
+
+    Mirrors simulate_traffic: factor ~ max(1, N(intensity, intensity * volatility)) with
+    volatility 0.4 below capacity 20 and 0.1 otherwise. seeds may be a single int (shared by
+    every scenario, like calling simulate_traffic with a fixed seed) or one seed per intensity.
+
+    Returns (weights, congestion), both (S x E) float64 arrays.
+    """
+    intensities = np.asarray(intensities, dtype=np.float64).reshape(-1)
+    seeds = [seeds] * len(intensities) if np.isscalar(seeds) else list(seeds)
+    if len(seeds) != len(intensities):
+        raise ValueError(f"Expected {len(intensities)} seeds, got {len(seeds)}")
+
+    travel_times = np.asarray(travel_times, dtype=np.float64)
+    volatility = np.where(np.asarray(capacities) < LOW_CAPACITY_THRESHOLD,
+                          LOW_CAPACITY_VOLATILITY, HIGH_CAPACITY_VOLATILITY)
+
+    noise = np.empty((len(intensities), len(travel_times)))
+    for row, seed in enumerate(seeds):
+        noise[row] = np.random.default_rng(seed).standard_normal(len(travel_times))
+
+    congestion = intensities[:, None] * (1.0 + volatility[None, :] * noise)
+    np.maximum(congestion, 1.0, out=congestion)
+    return travel_times[None, :] * congestion, congestion
+
+
+class TimeDependentCosts:
+    """Travel costs between fixed locations for consecutive departure-time buckets.
+
+    costs[b, i, j] is the cost of leaving locations[i] for locations[j] during bucket b,
+    i.e. at a time in [start + b * bucket_minutes, start + (b + 1) * bucket_minutes).
+    Times before the first bucket use the first one and times past the last use the last,
+    so every lookup is plain array indexing.
+    """
+
+    def __init__(self, locations, costs, bucket_minutes, start=0.0):
+        self.locations = list(locations)
+        self.costs = np.asarray(costs, dtype=np.float64)
+        if self.costs.ndim != 3 or self.costs.shape[1:] != (len(self.locations), len(self.locations)):
+            raise ValueError(f"Expected a (buckets x {len(self.locations)} x {len(self.locations)}) "
+                             f"cost stack, got shape {self.costs.shape}")
+        self.bucket_minutes = bucket_minutes
+        self.start = start
+
+    def __len__(self):
+        return len(self.costs)
+
+    def bucket(self, time):
+        """Index of the bucket covering time (clamped to the profile)."""
+        return min(max(int((time - self.start) // self.bucket_minutes), 0), len(self.costs) - 1)
+
+    def buckets(self, times):
+        """bucket() for an array of times."""
+        index = np.floor_divide(np.asarray(times, dtype=np.float64) - self.start, self.bucket_minutes)
+        return np.clip(index, 0, len(self.costs) - 1).astype(np.intp)
+
+    def at(self, time):
+        """The static cost matrix for departures at time."""
+        return self.costs[self.bucket(time)]
+
+    def departure_matrix(self, departures):
+        """Cost matrix whose row i is costed in the bucket of departures[i].
+
+        With departures taken from a solved plan this is the matrix that plan actually
+        runs into: each stop's outgoing legs are priced for when the vehicle leaves it.
+        """
+        rows = np.arange(len(self.locations))
+        return self.costs[self.buckets(departures), rows]
+
+    def route_times(self, route, departure):
+        """Departure time from each stop of route (location indices), starting at departure.
+
+        Returns (times, total): times[k] is when route[k] is left (its arrival, as stops
+        take no service time) and total the route's time-dependent travel time.
+        """
+        times = [departure]
+        for i, j in zip(route, route[1:]):
+            time = times[-1]
+            times.append(time + self.costs[self.bucket(time), i, j])
+        return times, times[-1] - departure
+
+
+def rush_hour_intensities(bucket_minutes=15, horizon_minutes=24 * 60, start=0.0, base=1.0,
+                          peaks=((8 * 60, 3.0), (17.5 * 60, 2.5)), width_minutes=60):
+    """Traffic intensity per time bucket for a day with morning and evening rush hours.
+
+    Each peak is (minute of day, intensity) and rises from base as a Gaussian bump of
+    width_minutes; buckets are sampled at their midpoints. The result can be passed to
+    LogisticsNetwork.simulate_traffic_scenarios to draw one scenario per bucket.
+    """
+    centres = start + (np.arange(int(np.ceil(horizon_minutes / bucket_minutes))) + 0.5) * bucket_minutes
+    minute_of_day = centres % (24 * 60)
+    intensities = np.full(len(centres), float(base))
+    for minute, peak in peaks:
+        intensities += (peak - base) * np.exp(-0.5 * ((minute_of_day - minute) / width_minutes) ** 2)
+    return intensities.tolist()
@@ -0,0 +1,332 @@
+"""Long-running dispatch service that keeps a LogisticsNetwork loaded between requests.
+
+Usage: python -m src.service.dispatch_service [--network data/brooklyn_net.npz]
+                                              [--host 127.0.0.1 --port 8080 | --socket PATH]
+                                              [--workers N]
+
+Speaks a minimal HTTP/1.1 (standard library only) over TCP or a Unix socket:
+  POST /solve   {"hub": ..., "customers": [...], "vehicle_count": 3, "capacity": 150,
+                 "solver": "or_tools", "demands": [...]}   (demands optional, aligned with customers)
+  GET  /health
+  GET  /stats
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing as mp
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from src import instrumentation
+from src.logger import get_logger
+from src.network.network_generator import LogisticsNetwork
+from src.solvers.decomposition_solver import DecompositionSolver
+from src.solvers.greedy_solver import GreedySolver
+from src.solvers.or_solver import ORSolver
+
+logger = get_logger(__name__)
+
+DEFAULT_SOLVERS = {
+    'greedy': GreedySolver,
+    'or_tools': ORSolver,
+    'decomposition': DecompositionSolver,
+}
+MATRIX_CACHE_SIZE = 32  # cost matrices kept, least recently used first out
+MAX_BODY_BYTES = 10 * 2**20
+
+# Per-worker state set by _attach_worker: the network, inherited from the service process.
+_worker_state = {}
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+
+class RequestError(ValueError):
+    """A request that cannot be served as sent (reported as HTTP 400)."""
+    status = 400
+
+
+class PayloadTooLarge(RequestError):
+    """A request body over MAX_BODY_BYTES (reported as HTTP 413)."""
+    status = 413
+
+
+class DispatchService:
+    """Serves solve requests against one network loaded for the life of the process.
+
+    Solver work runs in a pool of worker processes forked after the network is loaded,
+    so they share it without reloading or pickling it. Cost matrices are built in the
+    service (warming its path cache) and kept in an LRU keyed by graph version and
+    locations. Identical requests that arrive while one is being solved wait on that
+    solve instead of starting their own.
+    """
+
+    def __init__(self, net_graph: LogisticsNetwork, solvers=None, max_workers=None,
+                 matrix_cache_size=MATRIX_CACHE_SIZE):
+        self.net_graph = net_graph
+        self.solvers = dict(DEFAULT_SOLVERS if solvers is None else solvers)
+        self.max_workers = max_workers or mp.cpu_count()
+        self.matrix_cache_size = matrix_cache_size
+        self._matrices = OrderedDict()
+        self._in_flight = {}
+        self._pool = None
+        self.stats = {'requests': 0, 'solves': 0, 'coalesced': 0, 'matrix_hits': 0,
+                      'matrix_misses': 0, 'errors': 0}
+
+    def start_pool(self):
+        """Forks the solver workers; call once the network is fully prepared."""
+        if self._pool is None:
+            # Build the routing snapshot first so every worker inherits it ready-made.
+            self.net_graph.compiled
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context('fork'),
+                                             initializer=_attach_worker, initargs=(self.net_graph,))
+            # Fork every worker now, before the event loop starts helper threads.
+            self._pool.submit(int).result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def solve(self, request):
+        """Solves one request dict; identical concurrent requests share a single solve."""
+        self.stats['requests'] += 1
+        problem = self._parse(request)
+        task = self._in_flight.get(problem)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            instrumentation.count('service.coalesced')
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._solve(problem))
+        self._in_flight[problem] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(problem, None))
+        return await asyncio.shield(task)
+
+    async def _solve(self, problem):
+        solver_name, hub_node, customers, vehicle_count, capacity, demands = problem
+        self.start_pool()
+        started = time.perf_counter()
+        matrix = await self._cost_matrix([hub_node] + list(customers))
+        solution, shares_matrix = await asyncio.get_running_loop().run_in_executor(
+            self._pool, _solve_in_worker, self.solvers[solver_name],
+            (hub_node, list(customers), vehicle_count, capacity, dict(zip(customers, demands)), matrix))
+        if shares_matrix:
+            solution.cost_matrix = matrix
+        self.stats['solves'] += 1
+        return {
+            'solver': solution.solver_name,
+            'routes': solution.routes,
+            'travel_times': [float(t) for t in solution.travel_times],
+            'served': sorted(solution.served, key=str),
+            'skipped': sorted(solution.skipped, key=str),
+            'elapsed_seconds': time.perf_counter() - started,
+        }
+
+    async def _cost_matrix(self, locations):
+        key = (self.net_graph.compiled.version, tuple(locations))
+        matrix = self._matrices.get(key)
+        if matrix is not None:
+            self._matrices.move_to_end(key)
+            self.stats['matrix_hits'] += 1
+            return matrix
+
+        self.stats['matrix_misses'] += 1
+        # Built on a thread so the event loop keeps accepting requests meanwhile.
+        matrix = await asyncio.to_thread(self.net_graph.build_cost_matrix, locations)
+        matrix.flags.writeable = False
+        self._matrices[key] = matrix
+        while len(self._matrices) > self.matrix_cache_size:
+            self._matrices.popitem(last=False)
+        return matrix
+
+    def _parse(self, request):
+        """Validates a request dict into a hashable problem tuple."""
+        try:
+            solver_name = request.get('solver', 'or_tools')
+            hub_node = request['hub']
+            customers = tuple(request['customers'])
+            vehicle_count = request['vehicle_count']
+            capacity = request['capacity']
+            demands = request.get('demands')
+        except (KeyError, TypeError, ValueError, AttributeError) as ex:
+            raise RequestError(f"Malformed solve request: {ex!r}") from ex
+
+        if solver_name not in self.solvers:
+            raise RequestError(f"Unknown solver {solver_name!r}; expected one of {sorted(self.solvers)}")
+        if not _is_integral(vehicle_count) or vehicle_count < 1:
+            raise RequestError(f"vehicle_count must be a positive integer, got {vehicle_count!r}")
+        vehicle_count = int(vehicle_count)
+        # OR-Tools takes integer capacities only.
+        if not _is_integral(capacity):
+            raise RequestError(f"capacity must be an integer, got {capacity!r}")
+        capacity = int(capacity)
+        if not customers:
+            raise RequestError("A solve request needs at least one customer")
+        graph = self.net_graph.compiled
+        try:
+            unknown = [node for node in (hub_node,) + customers if node not in graph.node_index]
+        except TypeError as ex:
+            raise RequestError(f"Node ids must be integers or strings: {ex}") from ex
+        if unknown:
+            raise RequestError(f"Unknown node ids: {unknown[:10]}")
+
+        if demands is None:
+            demands = tuple(self.net_graph.node_attribute_array('demand', 0)[graph.indices_of(customers)].tolist())
+        else:
+            if not isinstance(demands, (list, tuple)) or len(demands) != len(customers):
+                raise RequestError(f"Expected a list of {len(customers)} demands, got {demands!r:.100}")
+            bad = [demand for demand in demands if not _is_number(demand) or not math.isfinite(demand)]
+            if bad:
+                raise RequestError(f"Demands must be numbers, got {bad[:10]!r}")
+        return solver_name, hub_node, customers, vehicle_count, capacity, tuple(demands)
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP requests on one connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except RequestError as ex:
+                    # Past a malformed request the stream cannot be trusted: answer and close.
+                    self.stats['errors'] += 1
+                    _write_response(writer, ex.status, {'error': str(ex)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, payload = await self._route(method, path, body)
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok', 'graph_version': self.net_graph.compiled.version}
+        if path == '/stats' and method == 'GET':
+            return 200, {**self.stats, 'in_flight': len(self._in_flight), 'cached_matrices': len(self._matrices)}
+        if path != '/solve' or method != 'POST':
+            return 404, {'error': f"No route for {method} {path}"}
+
+        try:
+            return 200, await self.solve(json.loads(body or b'{}'))
+        except (RequestError, json.JSONDecodeError) as ex:
+            self.stats['errors'] += 1
+            return 400, {'error': str(ex)}
+        except Exception as ex:
+            self.stats['errors'] += 1
+            logger.exception("Solve request failed")
+            return 500, {'error': repr(ex)}
+
+    async def serve(self, host='127.0.0.1', port=8080, socket_path=None):
+        """Listens on TCP host:port, or on the Unix socket socket_path if given, until cancelled."""
+        self.start_pool()
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info(f"Dispatch service listening on {socket_path or f'{host}:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+async def _read_request(reader):
+    """Reads one HTTP request; returns (method, path, body, keep_alive) or None at EOF."""
+    request_line = await _read_line(reader)
+    if not request_line.strip():
+        return None
+    try:
+        method, path, version = request_line.decode('latin-1').split(maxsplit=2)
+    except ValueError:
+        raise RequestError(f"Malformed request line {request_line[:100]!r}") from None
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise RequestError(f"Malformed Content-Length {headers['content-length'][:100]!r}")
+    if length > MAX_BODY_BYTES:
+        raise PayloadTooLarge(f"Request body of {length} bytes exceeds {MAX_BODY_BYTES}")
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = (headers.get('connection', '').lower() != 'close'
+                  and version.strip().upper() == 'HTTP/1.1')
+    return method.upper(), path, body, keep_alive
+
+
+async def _read_line(reader):
+    try:
+        return await reader.readline()
+    except ValueError as ex:  # line longer than the stream limit
+        raise RequestError("Request line or header too long") from ex
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_integral(value):
+    return _is_number(value) and math.isfinite(value) and float(value).is_integer()
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, default=str).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+
+
+def _attach_worker(net_graph):
+    _worker_state['net_graph'] = net_graph
+
+
+def _solve_in_worker(solver_class, problem):
+    """Returns (solution, shares_matrix); a solution holding the request's matrix comes back without it."""
+    hub_node, customers, vehicle_count, capacity, demands, matrix = problem
+    solution = solver_class().solve(hub_node, customers, vehicle_count=vehicle_count, capacity=capacity,
+                                    net_graph=_worker_state['net_graph'], demands=demands, cost_matrix=matrix)
+    # The service already holds the matrix; don't pickle a copy of it back.
+    shares_matrix = solution.cost_matrix is matrix
+    if shares_matrix:
+        solution.cost_matrix = None
+    return solution, shares_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--network', default="data/brooklyn_net.npz", help='binary network cache to serve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, help='solver worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    service = DispatchService(LogisticsNetwork.load_from_npz(args.network), max_workers=args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+import math
+import multiprocessing as mp
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+from src import instrumentation
+from src.logger import get_logger
+from src.network.network_generator import LogisticsNetwork
+from src.solvers.or_solver import ORSolver
+from src.solvers.routing_solver import RoutingSolver
+from src.solvers.solution import FleetSolution
+
+logger = get_logger(__name__)
+
+# Per-worker state set by _attach_worker: the network and the solver run on each cluster.
+_worker_state = {}
+
+
+class DecompositionSolver(RoutingSolver):
+    """Cluster-first, route-second solver for large stop counts.
+
+    Customers are split into roughly cluster_size-stop groups, either by KMeans on
+    coordinates or by sweep angle around the hub (contiguous, demand-balanced slices).
+    Every cluster gets at least one vehicle and the rest of the fleet in proportion to
+    its demand. The sub-problems are solved by sub_solver in worker processes, each
+    handed its block of one shared cost matrix, so total work grows with the number of
+    clusters rather than with the square of the stop count.
+
+    A boundary-repair pass then moves stops between routes of different clusters when
+    that shortens the plan, trying only each stop's nearest neighbours, and inserts any
+    skipped stops wherever they still fit.
+
+    partition: 'kmeans' or 'sweep'. max_workers=1 solves clusters in this process, as does
+    running inside a daemonic worker (one of a SolverPortfolio's, say).
+    """
+
+    PARTITIONS = ('kmeans', 'sweep')
+    REPAIR_NEIGHBOURS = 8  # nearest stops tried as relocation anchors per stop
+    REPAIR_PASSES = 3
+
+    def __init__(self, sub_solver=None, cluster_size=150, partition='sweep', max_workers=None, repair=True):
+        if partition not in self.PARTITIONS:
+            raise ValueError(f"partition must be one of {self.PARTITIONS}, got {partition!r}")
+        self.sub_solver = sub_solver or ORSolver()
+        self.cluster_size = cluster_size
+        self.partition = partition
+        self.max_workers = max_workers or mp.cpu_count()
+        self.repair = repair
+
+    def solve(self, hub_node, customer_nodes, vehicle_count, capacity,
+              net_graph: LogisticsNetwork, demands=None, cost_matrix=None) -> FleetSolution:
+        customer_nodes = list(customer_nodes)
+        locations = [hub_node] + customer_nodes
+        cluster_count = max(1, min(vehicle_count, math.ceil(len(customer_nodes) / self.cluster_size)))
+        if cost_matrix is None:
+            cost_matrix = net_graph.build_cost_matrix(locations)
+        if demands is None:
+            demands = {node: net_graph.NetGraph.nodes[node]['demand'] for node in customer_nodes}
+
+        with instrumentation.span('decomposition.partition'):
+            clusters = self._partition(hub_node, customer_nodes, cluster_count, net_graph, demands)
+            vehicles = self._allocate_vehicles(clusters, vehicle_count, demands)
+        logger.info(f"Decomposed {len(customer_nodes)} stops into {len(clusters)} clusters "
+                    f"(vehicles {vehicles})")
+
+        # Each sub-problem gets its rows/columns of the shared matrix: [hub] + cluster.
+        position = {node: i for i, node in enumerate(locations)}
+        problems = []
+        for cluster, cluster_vehicles in zip(clusters, vehicles):
+            rows = [0] + [position[node] for node in cluster]
+            problems.append((hub_node, cluster, cluster_vehicles, capacity,
+                             {node: demands[node] for node in cluster},
+                             cost_matrix[np.ix_(rows, rows)]))
+
+        with instrumentation.span('decomposition.solve'):
+            solutions = self._solve_clusters(problems, net_graph)
+
+        routes = []
+        for solution in solutions:
+            for route in solution.routes:
+                routes.append([position[node] for node in route if node != hub_node])
+        skipped = {position[node] for solution in solutions for node in solution.skipped}
+
+        if self.repair:
+            with instrumentation.span('decomposition.repair'):
+                load = {position[node]: demands[node] for node in customer_nodes}
+                self._repair(routes, skipped, cost_matrix, load, capacity, vehicles)
+
+        travel_times = [_route_cost([0] + route + [0], cost_matrix) for route in routes]
+        return FleetSolution(
+            routes=[[hub_node] + [locations[i] for i in route] + [hub_node] for route in routes],
+            travel_times=travel_times,
+            served={locations[i] for route in routes for i in route},
+            skipped={locations[i] for i in skipped},
+            solver_name="decomposition",
+            locations=locations,
+            cost_matrix=cost_matrix,
+        )
+
+    def _partition(self, hub_node, customer_nodes, cluster_count, net_graph, demands):
+        """Splits customer_nodes into cluster_count non-empty groups."""
+        if cluster_count == 1:
+            return [customer_nodes]
+        graph = net_graph.compiled
+        index = graph.indices_of([hub_node] + customer_nodes)
+        x, y = graph.x[index], graph.y[index]
+
+        if self.partition == 'kmeans':
+            labels = KMeans(n_clusters=cluster_count, init='k-means++', random_state=42,
+                            n_init=1).fit(np.column_stack((x[1:], y[1:]))).labels_
+            clusters = [[] for _ in range(cluster_count)]
+            for node, label in zip(customer_nodes, labels):
+                clusters[label].append(node)
+            return [cluster for cluster in clusters if cluster]
+
+        # Sweep: order stops by angle around the hub, starting after the widest empty
+        # gap so no slice straddles it, then cut into slices of equal demand.
+        angles = np.arctan2(y[1:] - y[0], x[1:] - x[0])
+        order = np.argsort(angles)
+        gaps = np.diff(np.append(angles[order], angles[order[0]] + 2 * np.pi))
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+        weights = np.array([demands[customer_nodes[i]] for i in order], dtype=np.float64) + 1e-9
+        cut = np.minimum((np.cumsum(weights) - weights) / weights.sum() * cluster_count,
+                         cluster_count - 1).astype(int)
+        clusters = [[] for _ in range(cluster_count)]
+        for i, label in zip(order.tolist(), cut.tolist()):
+            clusters[label].append(customer_nodes[i])
+        return [cluster for cluster in clusters if cluster]
+
+    @staticmethod
+    def _allocate_vehicles(clusters, vehicle_count, demands):
+        """One vehicle per cluster, the rest split in proportion to demand (largest remainder)."""
+        totals = np.array([sum(demands[node] for node in cluster) for cluster in clusters], dtype=np.float64)
+        spare = vehicle_count - len(clusters)
+        share = spare * totals / totals.sum() if totals.sum() > 0 else np.full(len(clusters), spare / len(clusters))
+        extra = np.floor(share).astype(int)
+        for i in np.argsort(extra - share)[:spare - extra.sum()]:
+            extra[i] += 1
+        return (1 + extra).tolist()
+
+    def _solve_clusters(self, problems, net_graph):
+        # Daemonic processes (e.g. SolverPortfolio workers) may not start a pool of their own.
+        if self.max_workers == 1 or len(problems) == 1 or mp.current_process().daemon:
+            _attach_worker(net_graph, self.sub_solver)
+            try:
+                return [_solve_cluster(problem) for problem in problems]
+            finally:
+                _worker_state.clear()
+        with mp.Pool(min(self.max_workers, len(problems)), initializer=_attach_worker,
+                     initargs=(net_graph, self.sub_solver)) as pool:
+            return pool.map(_solve_cluster, problems)
+
+    def _repair(self, routes, skipped, matrix, load, capacity, vehicles):
+        """Relocates stops across cluster boundaries and re-inserts skipped stops, in place."""
+        # Route r belongs to cluster owner[r]; only cross-cluster moves are tried, as the
+        # sub-solver has already optimized within each cluster.
+        owner = np.repeat(np.arange(len(vehicles)), vehicles).tolist()
+        loads = [sum(load[i] for i in route) for route in routes]
+        stops = [i for route in routes for i in route]
+        if stops:
+            neighbours = self._nearest_stops(stops, matrix)
+
+        moves = 0
+        for _ in range(self.REPAIR_PASSES):
+            route_of = {i: r for r, route in enumerate(routes) for i in route}
+            improved = False
+            for stop in stops:
+                r = route_of[stop]
+                route = routes[r]
+                k = route.index(stop)
+                prev, nxt = ([0] + route)[k], (route + [0])[k + 1]
+                saving = matrix[prev, stop] + matrix[stop, nxt] - matrix[prev, nxt]
+                best = None
+                for anchor in neighbours[stop]:
+                    t = route_of[anchor]
+                    if owner[t] == owner[r] or loads[t] + load[stop] > capacity:
+                        continue
+                    target = routes[t]
+                    a = target.index(anchor)
+                    # Insert just before or just after the anchor.
+                    for pos in (a, a + 1):
+                        before, after = ([0] + target)[pos], (target + [0])[pos]
+                        delta = matrix[before, stop] + matrix[stop, after] - matrix[before, after] - saving
+                        if delta < -1e-9 and (best is None or delta < best[0]):
+                            best = (delta, t, pos)
+                if best is None:
+                    continue
+                _, t, pos = best
+                route.pop(k)
+                routes[t].insert(pos, stop)
+                loads[r] -= load[stop]
+                loads[t] += load[stop]
+                route_of[stop] = t
+                moves += 1
+                improved = True
+            if not improved:
+                break
+
+        for stop in sorted(skipped):
+            best = None
+            for t, target in enumerate(routes):
+                if loads[t] + load[stop] > capacity:
+                    continue
+                padded = [0] + target + [0]
+                for pos in range(len(padded) - 1):
+                    delta = matrix[padded[pos], stop] + matrix[stop, padded[pos + 1]] - matrix[padded[pos], padded[pos + 1]]
+                    if np.isfinite(delta) and (best is None or delta < best[0]):
+                        best = (delta, t, pos)
+            if best is not None:
+                _, t, pos = best
+                routes[t].insert(pos, stop)
+                loads[t] += load[stop]
+                skipped.discard(stop)
+                moves += 1
+        instrumentation.count('decomposition.repair_moves', moves)
+
+    def _nearest_stops(self, stops, matrix):
+        """For each stop, its REPAIR_NEIGHBOURS closest other stops (symmetrized travel cost)."""
+        sub = matrix[np.ix_(stops, stops)]
+        sub = np.minimum(sub, sub.T)
+        np.fill_diagonal(sub, np.inf)
+        count = min(self.REPAIR_NEIGHBOURS, len(stops) - 1)
+        if count <= 0:
+            return {stop: [] for stop in stops}
+        nearest = np.argpartition(sub, count - 1, axis=1)[:, :count]
+        return {stop: [stops[j] for j in row] for stop, row in zip(stops, nearest.tolist())}
+
+
+def _route_cost(route, matrix):
+    return float(sum(matrix[a, b] for a, b in zip(route, route[1:])))
+
+
+def _attach_worker(net_graph, sub_solver):
+    _worker_state.update(net_graph=net_graph, sub_solver=sub_solver)
+
+
+def _solve_cluster(problem):
+    hub_node, cluster, vehicle_count, capacity, demands, cost_matrix = problem
+    return _worker_state['sub_solver'].solve(hub_node, cluster, vehicle_count=vehicle_count, capacity=capacity,
+                                             net_graph=_worker_state['net_graph'], demands=demands,
+                                             cost_matrix=cost_matrix)
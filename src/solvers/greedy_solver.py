@@ -1,30 +1,63 @@
 from sklearn.cluster import KMeans
 
+from src import instrumentation
+from src.logger import get_logger
 from src.network.network_generator import LogisticsNetwork
 from src.solvers.routing_solver import RoutingSolver
 from src.solvers.solution import FleetSolution
 from src.vehicles.vehicle_router import Vehicle
 
+logger = get_logger(__name__)
+
 
 class GreedySolver(RoutingSolver):
-    """Nearest-neighbor greedy routing, one vehicle per KMeans cluster."""
+    """Nearest-neighbor greedy routing, one vehicle per KMeans cluster.
+
+    expansion selects how the next-nearest stop is found:
+      'matrix' - read legs from one batched cost matrix over hub and customers.
+      'search' - run one early-stopping Dijkstra per step from the vehicle's current node,
+                 so searches grow linearly with the number of stops rather than quadratically.
+    """
+
+    EXPANSIONS = ('matrix', 'search')
+
+    def __init__(self, expansion='matrix'):
+        if expansion not in self.EXPANSIONS:
+            raise ValueError(f"expansion must be one of {self.EXPANSIONS}, got {expansion!r}")
+        self.expansion = expansion
 
     def solve(self, hub_node, customer_nodes, vehicle_count, capacity,
-              net_graph: LogisticsNetwork, demands=None) -> FleetSolution:
+              net_graph: LogisticsNetwork, demands=None, cost_matrix=None) -> FleetSolution:
         customer_nodes = list(customer_nodes)
 
-        clusters = self._cluster_nodes(customer_nodes, net_graph, vehicle_count)
+        with instrumentation.span('greedy.cluster'):
+            clusters = self._cluster_nodes(customer_nodes, net_graph, vehicle_count)
 
         fleet = [Vehicle(vehicle_id=i, start_node=hub_node, capacity=capacity)
                  for i in range(vehicle_count)]
+        locations = None
+
+        if self.expansion == 'search':
+            with instrumentation.span('greedy.routes'):
+                for i, vehicle in enumerate(fleet):
+                    self._generate_search_path(vehicle, clusters[i], net_graph, demands)
+        else:
+            # One batched matrix build covers every leg the nearest-neighbor passes can ask for.
+            locations = [hub_node] + customer_nodes
+            location_index = {node: i for i, node in enumerate(locations)}
+            if cost_matrix is None:
+                cost_matrix = net_graph.build_cost_matrix(locations)
 
-        for i, vehicle in enumerate(fleet):
-            self._generate_greedy_path(vehicle, clusters[i], net_graph, demands)
+            with instrumentation.span('greedy.routes'):
+                for i, vehicle in enumerate(fleet):
+                    self._generate_greedy_path(vehicle, clusters[i], net_graph, demands,
+                                               cost_matrix, location_index)
 
         routes = [vehicle.route_history for vehicle in fleet]
         travel_times = [vehicle.travel_time for vehicle in fleet]
         served = {node for vehicle in fleet for node in vehicle.route_history[1:] if node != hub_node}
         skipped = {node for vehicle in fleet for node in vehicle.skipped_nodes}
+        instrumentation.count('greedy.skipped', len(skipped))
 
         return FleetSolution(
             routes=routes,
@@ -32,14 +65,14 @@ class GreedySolver(RoutingSolver):
             served=served,
             skipped=skipped,
             solver_name="greedy",
+            locations=locations,
+            cost_matrix=cost_matrix,
         )
 
     def _cluster_nodes(self, customer_nodes, net_graph: LogisticsNetwork, vehicle_count):
         """Partition customer_nodes into vehicle_count clusters via KMeans on coordinates."""
-        coords = [
-            (net_graph.NetGraph.nodes[node]['x'], net_graph.NetGraph.nodes[node]['y'])
-            for node in customer_nodes
-        ]
+        # Metric positions come straight from the network's persistent spatial index.
+        coords = net_graph.spatial_index.coordinates(net_graph.compiled.indices_of(customer_nodes))
         kmeans = KMeans(n_clusters=vehicle_count,
                          init='k-means++',
                          random_state=42).fit(coords)
@@ -49,19 +82,20 @@ class GreedySolver(RoutingSolver):
             clusters[label].append(node)
         return clusters
 
-    def _generate_greedy_path(self, vehicle: Vehicle, nodes_to_visit, net_graph: LogisticsNetwork, demands):
-        """Greedy nearest-neighbor traversal of nodes_to_visit for a single vehicle."""
+    def _generate_greedy_path(self, vehicle: Vehicle, nodes_to_visit, net_graph: LogisticsNetwork, demands,
+                              cost_matrix, location_index):
+        """Greedy nearest-neighbor traversal of nodes_to_visit for a single vehicle.
+
+        Leg costs are read from cost_matrix, whose rows/columns follow location_index.
+        """
         unvisited_nodes = set(nodes_to_visit)
         while unvisited_nodes:
+            costs_from_current = cost_matrix[location_index[vehicle.current_node]]
             travel_dist = {}
             for node in unvisited_nodes:
-                dist = net_graph.get_path_distance(vehicle.current_node, node)
-                travel_dist[node] = dist
+                travel_dist[node] = float(costs_from_current[location_index[node]])
             next_node = min(travel_dist, key=travel_dist.get)
-            if demands is None:
-                demand = net_graph.NetGraph.nodes[next_node]['demand']
-            else:
-                demand = demands[next_node]
+            demand = self._node_demand(next_node, net_graph, demands)
             if vehicle.carried_load + demand <= vehicle.capacity:
                 travel_time = travel_dist[next_node]
                 vehicle.move_to_target(next_node, travel_time, demand)
@@ -74,7 +108,49 @@ class GreedySolver(RoutingSolver):
                 unvisited_nodes.remove(next_node)  # Node cannot be visited with the current load
 
         if vehicle.current_node != vehicle.hub:
-            return_time = net_graph.get_path_distance(vehicle.current_node, vehicle.hub)
+            return_time = float(cost_matrix[location_index[vehicle.current_node], location_index[vehicle.hub]])
             vehicle.travel_time += return_time
             vehicle.route_history.append(vehicle.hub)
-            vehicle.current_node = vehicle.hub
\ No newline at end of file
+            vehicle.current_node = vehicle.hub
+
+    def _generate_search_path(self, vehicle: Vehicle, nodes_to_visit, net_graph: LogisticsNetwork, demands):
+        """Nearest-neighbor traversal using one outward Dijkstra per step.
+
+        Each search stops at the first unvisited stop that still fits in the vehicle. Stops
+        settled before it that do not fit are skipped for good, exactly as the matrix pass
+        would skip them, since the carried load only grows.
+        """
+        unvisited_nodes = set(nodes_to_visit)
+        while unvisited_nodes:
+            next_node = None
+            for node, travel_time in net_graph.iter_nearest_nodes(vehicle.current_node):
+                if node not in unvisited_nodes:
+                    continue
+                demand = self._node_demand(node, net_graph, demands)
+                if vehicle.carried_load + demand <= vehicle.capacity:
+                    next_node = node
+                    break
+                vehicle.skipped_nodes.append(node)
+                unvisited_nodes.remove(node)
+
+            if next_node is None:
+                # Whatever is left cannot be reached from the vehicle's current position.
+                if unvisited_nodes:
+                    logger.warning(f"Vehicle {vehicle.vehicle_id} cannot reach {unvisited_nodes}")
+                    vehicle.skipped_nodes.extend(unvisited_nodes)
+                break
+
+            vehicle.move_to_target(next_node, travel_time, demand)
+            vehicle.route_history.append(next_node)
+            unvisited_nodes.remove(next_node)
+
+        if vehicle.current_node != vehicle.hub:
+            vehicle.travel_time += net_graph.get_path_distance(vehicle.current_node, vehicle.hub)
+            vehicle.route_history.append(vehicle.hub)
+            vehicle.current_node = vehicle.hub
+
+    @staticmethod
+    def _node_demand(node, net_graph: LogisticsNetwork, demands):
+        if demands is None:
+            return net_graph.NetGraph.nodes[node]['demand']
+        return demands[node]
@@ -0,0 +1,302 @@
+import time
+
+import numpy as np
+
+from src import instrumentation
+from src.logger import get_logger
+from src.network.network_generator import LogisticsNetwork
+from src.solvers.greedy_solver import GreedySolver
+from src.solvers.routing_solver import RoutingSolver
+from src.solvers.solution import FleetSolution
+
+logger = get_logger(__name__)
+
+EPSILON = 1e-9
+
+
+class LocalSearch:
+    """Improves any FleetSolution with classic route-improvement moves under a time budget.
+
+    Moves, each tried only towards a stop's nearest neighbours (by symmetrized travel cost):
+      2-opt     - reverse a stretch of one route.
+      Or-opt    - move a run of 1-3 consecutive stops elsewhere, in the same route or another
+                  (a run of one into another route is a plain relocate).
+      exchange  - swap two stops of different routes.
+    Every candidate is priced in O(1) from the cost matrix, and all of a stop's candidates
+    for a move are priced together as NumPy arrays. Reversals stay O(1) on asymmetric
+    (one-way) costs through per-route prefix sums of forward and backward arc costs.
+    Skipped customers are inserted first wherever capacity allows, and again after the
+    search in case moves freed room.
+
+    time_limit: seconds of search; the best plan so far is returned when it runs out.
+    """
+
+    NEIGHBOURS = 10  # nearest stops tried as move partners per stop
+    SEGMENT_LENGTHS = (1, 2, 3)
+
+    def __init__(self, time_limit=0.5, neighbours=NEIGHBOURS):
+        self.time_limit = time_limit
+        self.neighbours = neighbours
+
+    def improve(self, solution: FleetSolution, capacity, net_graph: LogisticsNetwork = None,
+                demands=None) -> FleetSolution:
+        """Returns an improved copy of solution; its cost matrix is built if it carries none."""
+        if demands is None and net_graph is None:
+            raise ValueError("improve needs demands, or net_graph to read them from")
+        hub_node = solution.locations[0] if solution.locations else solution.routes[0][0]
+        locations, matrix = solution.locations, solution.cost_matrix
+        if locations is None or matrix is None:
+            if net_graph is None:
+                raise ValueError("A solution without a cost matrix needs net_graph to build one")
+            customers = list(dict.fromkeys(node for route in solution.routes for node in route if node != hub_node))
+            customers += sorted(set(solution.skipped) - set(customers), key=str)
+            locations = [hub_node] + customers
+            matrix = net_graph.build_cost_matrix(locations)
+        if demands is None:
+            demands = {node: net_graph.NetGraph.nodes[node]['demand'] for node in locations[1:]}
+
+        position = {node: i for i, node in enumerate(locations)}
+        routes = [list(dict.fromkeys(position[node] for node in route if node != hub_node))
+                  for route in solution.routes]
+        in_routes = {i for route in routes for i in route}
+        skipped = sorted({position[node] for node in solution.skipped} - in_routes)
+        load = np.zeros(len(locations))
+        for node, i in position.items():
+            if i:
+                load[i] = demands.get(node, 0)
+
+        with instrumentation.span('local_search.improve'):
+            state = _RouteState(np.asarray(matrix, dtype=np.float64), routes, load, capacity)
+            before = state.total_cost()
+            inserted = state.insert_skipped(skipped)
+            moves = self._search(state, time.perf_counter() + self.time_limit)
+            inserted += state.insert_skipped(skipped)
+        instrumentation.count('local_search.moves', moves)
+        logger.info(f"Local search on {solution.solver_name}: {moves} moves, {inserted} skipped stops "
+                    f"inserted, total {before:.1f} -> {state.total_cost():.1f}")
+
+        return FleetSolution(
+            routes=[[hub_node] + [locations[i] for i in route] + [hub_node] for route in state.routes],
+            travel_times=state.route_costs(),
+            served={locations[i] for route in state.routes for i in route},
+            skipped={locations[i] for i in skipped},
+            solver_name=f"{solution.solver_name}+local_search",
+            locations=list(locations),
+            cost_matrix=matrix,
+        )
+
+    def _search(self, state, deadline):
+        neighbours = state.nearest(self.neighbours)
+        moves = 0
+        improved = True
+        while improved:
+            improved = False
+            for stop in [i for route in state.routes for i in route]:
+                if time.perf_counter() > deadline:
+                    return moves
+                candidates = neighbours[stop]
+                candidates = candidates[state.route_of[candidates] >= 0]
+                if not len(candidates):
+                    continue
+                if (state.two_opt(stop, candidates)
+                        or any(state.or_opt(stop, length, candidates) for length in self.SEGMENT_LENGTHS)
+                        or state.exchange(stop, candidates)):
+                    moves += 1
+                    improved = True
+        return moves
+
+
+class _RouteState:
+    """Routes over matrix indices (depot 0 implicit at both ends) with O(1) move pricing.
+
+    Per stop: route_of, pos (index within its route), pred/succ (0 at route ends).
+    Per route: load and prefix sums fwd/bwd over [0] + route + [0], where fwd[k] sums the
+    first k arcs and bwd[k] the same arcs travelled backwards.
+    """
+
+    def __init__(self, matrix, routes, load, capacity):
+        self.matrix = matrix
+        self.routes = routes
+        self.load = load
+        self.capacity = capacity
+        size = len(matrix)
+        self.route_of = np.full(size, -1)
+        self.pos = np.zeros(size, dtype=np.int64)
+        self.pred = np.zeros(size, dtype=np.int64)
+        self.succ = np.zeros(size, dtype=np.int64)
+        self.loads = np.zeros(len(routes))
+        self.fwd = [None] * len(routes)
+        self.bwd = [None] * len(routes)
+        for r in range(len(routes)):
+            self.refresh(r)
+
+    def refresh(self, r):
+        route = self.routes[r]
+        full = np.array([0] + route + [0], dtype=np.int64)
+        stops = full[1:-1]
+        self.route_of[stops] = r
+        self.pos[stops] = np.arange(len(stops))
+        self.pred[stops] = full[:-2]
+        self.succ[stops] = full[2:]
+        self.loads[r] = self.load[stops].sum()
+        self.fwd[r] = np.concatenate(([0.0], np.cumsum(self.matrix[full[:-1], full[1:]])))
+        self.bwd[r] = np.concatenate(([0.0], np.cumsum(self.matrix[full[1:], full[:-1]])))
+
+    def route_costs(self):
+        return [float(fwd[-1]) for fwd in self.fwd]
+
+    def total_cost(self):
+        return sum(self.route_costs())
+
+    def nearest(self, count):
+        """For each location, its count closest other customers (symmetrized travel cost)."""
+        size = len(self.matrix)
+        sym = np.minimum(self.matrix, self.matrix.T)
+        sym[:, 0] = np.inf
+        np.fill_diagonal(sym, np.inf)
+        count = min(count, size - 2)
+        if count <= 0:
+            return np.zeros((size, 0), dtype=np.int64)
+        return np.argpartition(sym, count - 1, axis=1)[:, :count]
+
+    def two_opt(self, a, candidates):
+        """Reverses the stretch between a and a same-route neighbour, if that is shorter."""
+        r = self.route_of[a]
+        b = candidates[(self.route_of[candidates] == r) & (candidates != a)]
+        if not len(b):
+            return False
+        # Positions in the full [0] + route + [0] sequence; reverse full[i+1 .. j].
+        i = np.minimum(self.pos[a], self.pos[b]) + 1
+        j = np.maximum(self.pos[a], self.pos[b]) + 1
+        keep = j > i + 1
+        i, j = i[keep], j[keep]
+        if not len(i):
+            return False
+        full = np.array([0] + self.routes[r] + [0])
+        m, fwd, bwd = self.matrix, self.fwd[r], self.bwd[r]
+        delta = (m[full[i], full[j]] + m[full[i + 1], full[j + 1]] - m[full[i], full[i + 1]] - m[full[j], full[j + 1]]
+                 + (bwd[j] - bwd[i + 1]) - (fwd[j] - fwd[i + 1]))
+        best = _best(delta)
+        if best is None:
+            return False
+        start, end = i[best], j[best]  # route slice [start, end) holds full[i+1 .. j]
+        self.routes[r][start:end] = self.routes[r][start:end][::-1]
+        self.refresh(r)
+        return True
+
+    def or_opt(self, a, length, candidates):
+        """Moves the run of length stops starting at a next to one of its neighbours."""
+        r = self.route_of[a]
+        route = self.routes[r]
+        start = self.pos[a]
+        if start + length > len(route):
+            return False
+        segment = route[start:start + length]
+        e = segment[-1]
+        p, n = self.pred[a], self.succ[e]
+        m = self.matrix
+        gain = m[p, a] + m[e, n] - m[p, n]
+        seg_load = self.load[segment].sum()
+
+        def outside(x):
+            return (self.route_of[x] != r) | (self.pos[x] < start) | (self.pos[x] >= start + length)
+
+        # Insert between (b, succ b) or (pred b, b) for each neighbour b.
+        b = candidates[outside(candidates)]
+        u = np.concatenate((b, self.pred[b]))
+        v = np.concatenate((self.succ[b], b))
+        t = np.concatenate((self.route_of[b], self.route_of[b]))
+        ok = outside(u) & outside(v)
+        ok &= (t == r) | (self.loads[t] + seg_load <= self.capacity + EPSILON)
+        u, v, t = u[ok], v[ok], t[ok]
+        if not len(u):
+            return False
+        delta = m[u, a] + m[e, v] - m[u, v] - gain
+        best = _best(delta)
+        if best is None:
+            return False
+        u, t = u[best], t[best]
+        del route[start:start + length]
+        target = self.routes[t]
+        at = target.index(u) + 1 if u else 0
+        target[at:at] = segment
+        self.refresh(r)
+        if t != r:
+            self.refresh(t)
+        return True
+
+    def exchange(self, a, candidates):
+        """Swaps a with a neighbour on another route."""
+        r = self.route_of[a]
+        b = candidates[self.route_of[candidates] != r]
+        if not len(b):
+            return False
+        t = self.route_of[b]
+        la, lb = self.load[a], self.load[b]
+        ok = ((self.loads[r] - la + lb <= self.capacity + EPSILON)
+              & (self.loads[t] - lb + la <= self.capacity + EPSILON))
+        b, t = b[ok], t[ok]
+        if not len(b):
+            return False
+        m = self.matrix
+        pa, na, pb, nb = self.pred[a], self.succ[a], self.pred[b], self.succ[b]
+        delta = (m[pa, b] + m[b, na] - m[pa, a] - m[a, na]
+                 + m[pb, a] + m[a, nb] - m[pb, b] - m[b, nb])
+        best = _best(delta)
+        if best is None:
+            return False
+        b, t = b[best], t[best]
+        self.routes[r][self.pos[a]] = b
+        self.routes[t][self.pos[b]] = a
+        self.refresh(r)
+        self.refresh(t)
+        return True
+
+    def insert_skipped(self, skipped):
+        """Cheapest-inserts skipped stops (largest demand first) where capacity allows, in place."""
+        inserted = 0
+        for stop in sorted(skipped, key=lambda i: -self.load[i]):
+            best = None
+            for t, route in enumerate(self.routes):
+                if self.loads[t] + self.load[stop] > self.capacity + EPSILON:
+                    continue
+                full = np.array([0] + route + [0])
+                delta = self.matrix[full[:-1], stop] + self.matrix[stop, full[1:]] - self.matrix[full[:-1], full[1:]]
+                delta[~np.isfinite(delta)] = np.inf
+                k = int(np.argmin(delta))
+                if np.isfinite(delta[k]) and (best is None or delta[k] < best[0]):
+                    best = (delta[k], t, k)
+            if best is not None:
+                _, t, k = best
+                self.routes[t].insert(k, stop)
+                self.refresh(t)
+                skipped.remove(stop)
+                inserted += 1
+        return inserted
+
+
+def _best(delta):
+    """Index of the most negative improving delta, or None."""
+    if not len(delta):
+        return None
+    k = int(np.argmin(np.where(np.isnan(delta), np.inf, delta)))
+    return k if delta[k] < -EPSILON else None
+
+
+class LocalSearchSolver(RoutingSolver):
+    """Runs seed_solver (greedy by default), then improves its plan with LocalSearch."""
+
+    def __init__(self, seed_solver=None, time_limit=0.5):
+        self.seed_solver = seed_solver or GreedySolver()
+        self.local_search = LocalSearch(time_limit=time_limit)
+
+    def solve(self, hub_node, customer_nodes, vehicle_count, capacity,
+              net_graph: LogisticsNetwork, demands=None, cost_matrix=None) -> FleetSolution:
+        customer_nodes = list(customer_nodes)
+        if cost_matrix is None:
+            cost_matrix = net_graph.build_cost_matrix([hub_node] + customer_nodes)
+        seed = self.seed_solver.solve(hub_node, customer_nodes, vehicle_count=vehicle_count, capacity=capacity,
+                                      net_graph=net_graph, demands=demands, cost_matrix=cost_matrix)
+        if seed.cost_matrix is None:
+            seed.locations, seed.cost_matrix = [hub_node] + customer_nodes, cost_matrix
+        return self.local_search.improve(seed, capacity, net_graph=net_graph, demands=demands)
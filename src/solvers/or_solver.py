@@ -1,106 +1,299 @@
-﻿from ortools.constraint_solver import pywrapcp
+﻿import numpy as np
+from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
+from src import instrumentation
+from src.network.network_generator import LogisticsNetwork
+from src.network.traffic import TimeDependentCosts
 from src.solvers.solution import FleetSolution
 from src.solvers.routing_solver import RoutingSolver
 
 class ORSolver(RoutingSolver):
-    """OR based routing optimizer."""
+    """OR based routing optimizer.
+
+    The cost matrix and demands are handed to OR-Tools as native arrays, so the search
+    never calls back into Python to price an arc. Costs are converted to fixed point:
+    multiplied by cost_scale and rounded (by default the scale maps the longest leg to
+    MAX_SCALED_COST, so fractional minutes and normalized weights keep their precision).
+    Reported travel times are summed from the unscaled float costs.
+
+    time_limit: search seconds; None scales it with the stop count (SECONDS_PER_STOP,
+    clamped to MIN_/MAX_TIME_LIMIT). first_solution_strategy and local_search_metaheuristic
+    name OR-Tools FirstSolutionStrategy / LocalSearchMetaheuristic values.
+    """
+
+    RESOLVE_TIME_LIMIT = 1  # seconds; a warm-started search begins next to a good solution
+    TIME_DEPENDENT_ITERATIONS = 3  # re-costing rounds; plans usually settle in one or two
+    MAX_SCALED_COST = 1_000_000  # longest leg in fixed point; sums stay far inside int64
+    SECONDS_PER_STOP = 0.02
+    MIN_TIME_LIMIT = 1
+    MAX_TIME_LIMIT = 30
+
+    def __init__(self, time_limit=None, cost_scale=None, first_solution_strategy='PATH_CHEAPEST_ARC',
+                 local_search_metaheuristic='GUIDED_LOCAL_SEARCH'):
+        self.time_limit = time_limit
+        self.cost_scale = cost_scale
+        # Fail on a misspelt name now rather than at the first solve.
+        self.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy, first_solution_strategy)
+        self.local_search_metaheuristic = getattr(routing_enums_pb2.LocalSearchMetaheuristic,
+                                                  local_search_metaheuristic)
+
+    def search_time_limit(self, stop_count):
+        """Seconds of search for a problem with stop_count customers."""
+        if self.time_limit is not None:
+            return self.time_limit
+        return min(max(stop_count * self.SECONDS_PER_STOP, self.MIN_TIME_LIMIT), self.MAX_TIME_LIMIT)
 
     def solve(self, hub_node, customer_nodes, vehicle_count, capacity,
-              net_graph: LogisticsNetwork, demands=None)-> FleetSolution:
+              net_graph: LogisticsNetwork, demands=None, cost_matrix=None)-> FleetSolution:
         """Compute routes for a fleet of vehicles serving customer_nodes."""
         customer_nodes = list(customer_nodes)
-        data = self._build_data_model(hub_node, 
-                                      customer_nodes, 
-                                      vehicle_count, 
-                                      capacity, 
-                                      net_graph, 
-                                      demands)
+        with instrumentation.span('or_tools.data_model'):
+            data = self._build_data_model(hub_node, 
+                                          customer_nodes, 
+                                          vehicle_count, 
+                                          capacity, 
+                                          net_graph, 
+                                          demands,
+                                          cost_matrix)
+        manager, routing = self._build_routing_model(data)
+        search_parameters = self._search_parameters(self.search_time_limit(len(customer_nodes)))
+
+        with instrumentation.span('or_tools.search'):
+            solution = routing.SolveWithParameters(search_parameters)
+
+        if solution:
+            return self._extract_solution(data, manager, routing, solution, customer_nodes)
+        else:
+            raise Exception("No solution found for the given routing problem.")
+
+    def _search_parameters(self, time_limit):
+        """Search parameters for a run of time_limit seconds with the configured strategies."""
+        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+        # Fast initial constructive path discovery strategy
+        search_parameters.first_solution_strategy = self.first_solution_strategy
+        # Advanced Metaheuristic escape logic to optimize routes past local minima
+        search_parameters.local_search_metaheuristic = self.local_search_metaheuristic
+        search_parameters.time_limit.FromMilliseconds(int(time_limit * 1000))
+        return search_parameters
+
+    def resolve(self, previous: FleetSolution, capacity, net_graph: LogisticsNetwork,
+                added=(), removed=(), demands=None, time_limit=RESOLVE_TIME_LIMIT,
+                cost_matrix=None) -> FleetSolution:
+        """Re-plans previous after customers are added to or removed from the run.
+
+        The previous cost matrix is reused: only rows for added customers and the columns
+        from kept stops to them are computed (see LogisticsNetwork.update_cost_matrix).
+        The previous routes, minus removed stops and with each added stop inserted at its
+        cheapest feasible position, seed OR-Tools as the initial assignment, so the search
+        skips the constructive phase and starts from a near-final plan. The fleet size is
+        that of previous.
+
+        cost_matrix: optional costs over the new locations ([hub] + kept + added) to use
+        instead of updating previous.cost_matrix.
+        """
+        removed = set(removed)
+        old_locations = previous.locations or self._locations_from_routes(previous)
+        hub_node = old_locations[0]
+        kept = [node for node in old_locations[1:] if node not in removed]
+        known = set(kept) | removed | {hub_node}
+        customer_nodes = kept + [node for node in dict.fromkeys(added) if node not in known]
+        locations = [hub_node] + customer_nodes
+
+        if cost_matrix is None:
+            with instrumentation.span('or_tools.update_matrix'):
+                if previous.cost_matrix is None:
+                    cost_matrix = net_graph.build_cost_matrix(locations)
+                else:
+                    cost_matrix = net_graph.update_cost_matrix(previous.cost_matrix, old_locations, locations)
+        with instrumentation.span('or_tools.data_model'):
+            data = self._build_data_model(hub_node, customer_nodes, len(previous.routes), capacity,
+                                          net_graph, demands, cost_matrix)
+        manager, routing = self._build_routing_model(data)
+
+        seed_routes = self._seed_routes(previous, data, removed)
+        # The same settings as solve(): an infeasible seed falls back to a search from scratch.
+        search_parameters = self._search_parameters(time_limit)
+
+        with instrumentation.span('or_tools.search'):
+            # Stops left out of the seed start unperformed; the search may still insert them.
+            initial = routing.ReadAssignmentFromRoutes(seed_routes, True)
+            if initial is None:
+                solution = routing.SolveWithParameters(search_parameters)
+            else:
+                solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+
+        if not solution:
+            raise Exception("No solution found for the given routing problem.")
+        return self._extract_solution(data, manager, routing, solution, customer_nodes)
+
+    def solve_time_dependent(self, hub_node, customer_nodes, vehicle_count, capacity,
+                             net_graph: LogisticsNetwork, costs: TimeDependentCosts, departure=0.0, demands=None,
+                             iterations=TIME_DEPENDENT_ITERATIONS) -> FleetSolution:
+        """Routes a fleet leaving the hub at departure through time-bucketed travel costs.
+
+        costs covers [hub] + customer_nodes (see LogisticsNetwork.build_time_dependent_costs).
+        OR-Tools arc costs cannot depend on arrival time, so the plan is refined in rounds:
+        solve with every leg priced for departure, read off when each stop is actually
+        left, re-price each stop's outgoing legs in that bucket (one array gather) and
+        re-solve from the previous routes, until no stop changes bucket. Reported travel
+        times follow each route through the buckets it really runs in.
+        """
+        customer_nodes = list(customer_nodes)
+        if costs.locations != [hub_node] + customer_nodes:
+            raise ValueError("costs must cover [hub] + customer_nodes in that order")
+
+        with instrumentation.span('or_tools.time_dependent'):
+            solution = self.solve(hub_node, customer_nodes, vehicle_count, capacity, net_graph,
+                                  demands, cost_matrix=costs.at(departure))
+            buckets = None
+            for _ in range(iterations):
+                departures = self._departure_times(solution, costs, departure)
+                new_buckets = costs.buckets(departures)
+                if buckets is not None and np.array_equal(new_buckets, buckets):
+                    break
+                buckets = new_buckets
+                instrumentation.count('or_tools.time_dependent_rounds')
+                solution = self.resolve(solution, capacity, net_graph, demands=demands,
+                                        cost_matrix=costs.departure_matrix(departures))
+
+        index = {node: i for i, node in enumerate(costs.locations)}
+        solution.travel_times = [costs.route_times(self._closed_route(route, index), departure)[1]
+                                 for route in solution.routes]
+        return solution
+
+    @staticmethod
+    def _closed_route(route, index):
+        """route as location indices, ending back at the hub (index 0)."""
+        stops = [index[node] for node in route]
+        if len(stops) == 1 or stops[-1] != 0:
+            stops.append(0)
+        return stops
+
+    @staticmethod
+    def _departure_times(solution, costs, departure):
+        """When each location of costs is left under solution; unvisited ones get departure."""
+        index = {node: i for i, node in enumerate(costs.locations)}
+        departures = np.full(len(costs.locations), float(departure))
+        for route in solution.routes:
+            stops = ORSolver._closed_route(route, index)
+            times, _ = costs.route_times(stops, departure)
+            # The hub row keeps departure: every vehicle leaves it at the start of the run.
+            departures[stops[1:-1]] = times[1:-1]
+        return departures
+
+    def _build_routing_model(self, data):
+        """Creates the index manager and routing model with cost, capacity and drop penalties."""
         manager = pywrapcp.RoutingIndexManager(
         len(data["distance_matrix"]), data["num_vehicles"], data["depot"]
         )
         routing = pywrapcp.RoutingModel(manager)
 
-        def distance_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return data["distance_matrix"][from_node][to_node]
-
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-        def demand_callback(from_index):
-            """Tracks capacity requirements per node step."""
-            from_node = manager.IndexToNode(from_index)
-            return data["demands"][from_node]
-
-        demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+        # Native arrays: OR-Tools prices arcs and loads without calling back into Python.
+        transit_index = routing.RegisterTransitMatrix(data["distance_matrix"])
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+        demand_index = routing.RegisterUnaryTransitVector(data["demands"])
 
         routing.AddDimensionWithVehicleCapacity(
-        demand_callback_index,
+        demand_index,
         0,  # Null capacity slack
         data["vehicle_capacities"],  # Max load structural arrays
         True,  # Restrict variables to start empty at base depot
         "Capacity"
         )
 
-        max_distance = max(max(row) for row in data["distance_matrix"])
+        max_distance = data["max_scaled_cost"]
         drop_penalty = max_distance * len(data["locations"])
         for node_index in range(1, len(data["locations"])):
             routing.AddDisjunction([manager.NodeToIndex(node_index)], drop_penalty)
 
-        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        # Fast initial constructive path discovery strategy
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-        )
-        # Advanced Metaheuristic escape logic to optimize routes past local minima
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        if instrumentation.is_enabled():
+            # Counts every improving solution the search reports (one Python call each).
+            routing.AddAtSolutionCallback(lambda: instrumentation.count('or_tools.solutions'))
+        return manager, routing
+
+    def _extract_solution(self, data, manager, routing, solution, customer_nodes):
+        """Reads routes and travel times out of an OR-Tools assignment."""
+        raw_costs = np.asarray(data["cost_matrix"], dtype=np.float64)
+        routes = []
+        travel_times = []
+        served = set()
+
+        for vehicle_id in range(data["num_vehicles"]):
+            index = routing.Start(vehicle_id)
+            stops = [manager.IndexToNode(index)]
+            while not routing.IsEnd(index):
+                index = solution.Value(routing.NextVar(index))
+                stops.append(manager.IndexToNode(index))
+            route = [data["locations"][i] for i in stops[:-1]]
+            served.update(route[1:])
+            routes.append(route)
+            # Exact float minutes, not the rounded fixed-point costs the search worked with.
+            travel_times.append(float(raw_costs[stops[:-1], stops[1:]].sum()) if len(stops) > 2 else 0.0)
+
+        skipped = set(customer_nodes) - served
+        instrumentation.count('or_tools.dropped', len(skipped))
+
+        return FleetSolution(
+            routes=routes,
+            travel_times=travel_times,
+            served=served,
+            skipped=skipped,
+            solver_name="or_tools",
+            locations=list(data["locations"]),
+            cost_matrix=data["cost_matrix"],
         )
-        search_parameters.time_limit.seconds = 5
 
-        solution = routing.SolveWithParameters(search_parameters)
+    @staticmethod
+    def _locations_from_routes(previous):
+        hub_node = previous.routes[0][0]
+        stops = [node for route in previous.routes for node in route if node != hub_node]
+        return [hub_node] + list(dict.fromkeys(stops + sorted(previous.skipped, key=str)))
 
-        if solution:
-            routes = []
-            travel_times = []
-            served = set()
-
-            for vehicle_id in range(data["num_vehicles"]):
-                index = routing.Start(vehicle_id)
-                route = [data["locations"][manager.IndexToNode(index)]]
-                route_time = 0
-                while not routing.IsEnd(index):
-                    previous_index = index
-                    index = solution.Value(routing.NextVar(index))
-                    route_time += routing.GetArcCostForVehicle(previous_index, index, vehicle_id)
-                    node = data["locations"][manager.IndexToNode(index)]
-                    if not routing.IsEnd(index):
-                        route.append(node)
-                        served.add(node)
-                routes.append(route)
-                travel_times.append(route_time)
-
-            skipped = set(customer_nodes) - served
-
-            return FleetSolution(
-                routes=routes,
-                travel_times=travel_times,
-                served=served,
-                skipped=skipped,
-                solver_name="or_tools",
-            )
-        else:
-            raise Exception("No solution found for the given routing problem.")
+    def _seed_routes(self, previous, data, removed):
+        """Previous routes as location indices, minus removed stops, plus new stops inserted cheaply.
+
+        Each new stop goes where it adds the least travel time without breaking capacity;
+        one that fits nowhere is left out (unperformed) for the search to place or drop.
+        """
+        index = data['node_to_index']
+        hub_node = data['locations'][0]
+        routes = [[index[node] for node in route if node != hub_node and node not in removed and node in index]
+                  for route in previous.routes]
+        routes += [[] for _ in range(data['num_vehicles'] - len(routes))]
+        loads = [sum(data['demands'][i] for i in route) for route in routes]
 
+        seeded = {i for route in routes for i in route}
+        matrix = data['distance_matrix']
+        for node in range(1, len(data['locations'])):
+            if node in seeded or data['locations'][node] in previous.skipped:
+                continue
+            best = None
+            for vehicle, route in enumerate(routes):
+                if loads[vehicle] + data['demands'][node] > data['vehicle_capacities'][vehicle]:
+                    continue
+                stops = [0] + route + [0]
+                for pos in range(len(stops) - 1):
+                    a, b = stops[pos], stops[pos + 1]
+                    delta = matrix[a][node] + matrix[node][b] - matrix[a][b]
+                    if best is None or delta < best[0]:
+                        best = (delta, vehicle, pos)
+            if best is not None:
+                _, vehicle, pos = best
+                routes[vehicle].insert(pos, node)
+                loads[vehicle] += data['demands'][node]
+        return routes
 
     def _build_data_model(self, hub_node, customer_nodes, vehicle_count, capacity,
-              net_graph, demands=None):
+              net_graph, demands=None, cost_matrix=None):
         """Builds the data model for OR-Tools routing solver."""
         data = {}
         data['locations'], data['node_to_index'] = self._map_nodes_to_indices(hub_node, customer_nodes)
-        data['distance_matrix'] = self._build_time_matrix(net_graph, data['locations'])
+        # Raw float costs are kept on the solution so a re-plan can reuse them.
+        data['cost_matrix'] = net_graph.build_cost_matrix(data['locations']) if cost_matrix is None else cost_matrix
+        data['cost_scale'] = self._cost_scale(data['cost_matrix'])
+        data['distance_matrix'] = self._build_time_matrix(net_graph, data['locations'], data['cost_matrix'],
+                                                          data['cost_scale'])
+        data['max_scaled_cost'] = max(max(row) for row in data['distance_matrix'])
         data['num_vehicles'] = vehicle_count
         data['vehicle_capacities'] = [capacity] * vehicle_count
         data['depot'] = 0
@@ -109,26 +302,29 @@ class ORSolver(RoutingSolver):
             data['demands'][data['node_to_index'][node]] = round(demands[node])
         return data
 
-    def _build_time_matrix(self, net_graph, nodes):
-        """Builds a square travel-time matrix over hub and customer_nodes."""
+    def _cost_scale(self, cost_matrix):
+        """Fixed-point factor: cost_scale if set, else the one taking the longest leg to MAX_SCALED_COST."""
+        if self.cost_scale is not None:
+            return self.cost_scale
+        costs = np.asarray(cost_matrix, dtype=np.float64)
+        longest = costs[np.isfinite(costs)].max(initial=0)
+        return self.MAX_SCALED_COST / longest if longest > 0 else 1.0
+
+    def _build_time_matrix(self, net_graph, nodes, cost_matrix=None, scale=1.0):
+        """Builds a square fixed-point (cost * scale, rounded) travel-time matrix over hub and customer_nodes."""
         size = len(nodes)
-        raw = [[0] * size for _ in range(size)]
+        # A shared matrix may be read-only, so work on a copy of it.
+        raw = net_graph.build_cost_matrix(nodes) if cost_matrix is None else np.array(cost_matrix, dtype=np.float64)
+        np.fill_diagonal(raw, 0)
 
-        for i in range(size):
-            for j in range(size):
-                if i == j:
-                    continue
-                raw[i][j] = net_graph.get_path_distance(nodes[i], nodes[j])
+        finite = np.isfinite(raw)
+        scaled = np.round(np.where(finite, raw, 0) * scale)
+        unreachable_penalty = int(scaled.max(initial=0)) * size + 1
 
-        finite_values = [v for row in raw for v in row if v != float('inf')]
-        unreachable_penalty = int(max(finite_values, default=0)) * size + 1
+        matrix = np.where(finite, scaled, unreachable_penalty).astype(np.int64) #since OR-Tools requires ints
+        #replace inf with large finite penalty (represents unreachable pairs)
+        return matrix.tolist()
 
-        matrix = [
-            [unreachable_penalty if v == float('inf') else round(v) for v in row] #since OR-Tools requires ints
-            for row in raw
-        ] #replace inf with large finite penalty (represents unreachable pairs)
-        return matrix
-    
     def _map_nodes_to_indices(self, hub_node, customer_nodes):
         """Maps nodes to indices for the OR-Tools solver."""
         nodes = [hub_node] + list(customer_nodes)
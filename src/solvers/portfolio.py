@@ -0,0 +1,164 @@
+import functools
+import multiprocessing as mp
+import queue
+import time
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src import instrumentation
+from src.logger import get_logger
+from src.solvers.solution import FleetSolution
+
+logger = get_logger(__name__)
+
+# Per-worker state set by _attach_worker: the network and a read-only view of the shared matrix.
+_worker_state = {}
+
+
+@dataclass
+class SolverRun:
+    """Outcome of one solver in a portfolio run (solution is None if it failed or ran out of time)."""
+    solver_name: str
+    solution: FleetSolution = None
+    elapsed: float = None
+    error: str = None
+    metrics: dict = None  # instrumentation.snapshot() from the worker, when instrumentation is on
+    shares_matrix: bool = False  # solution.cost_matrix was the shared matrix; reattached in the parent
+
+
+@dataclass
+class PortfolioResult:
+    """Every solver's run, the best solution among them and wall-clock timings (seconds)."""
+    runs: list
+    best: FleetSolution
+    matrix_seconds: float
+    wall_seconds: float
+    timed_out: list = field(default_factory=list)
+
+
+class SolverPortfolio:
+    """Runs several RoutingSolvers on the same problem concurrently.
+
+    The travel-cost matrix over hub and customers is built once in the parent and placed
+    in shared memory; each worker process maps it read-only and hands it to its solver as
+    cost_matrix, so no worker rebuilds or copies it. The network reaches workers through
+    the pool initializer (inherited for free under fork).
+
+    deadline: optional time budget in seconds for the whole run. When it passes, solvers
+    still running are stopped and the best solution found so far is kept.
+    """
+
+    def __init__(self, solvers, max_workers=None, deadline=None):
+        self.solvers = dict(solvers)
+        self.max_workers = max_workers or len(self.solvers)
+        self.deadline = deadline
+
+    def run(self, hub_node, customer_nodes, vehicle_count, capacity, net_graph, demands=None):
+        started = time.perf_counter()
+        customer_nodes = list(customer_nodes)
+        with instrumentation.span('portfolio.matrix'):
+            matrix = net_graph.build_cost_matrix([hub_node] + customer_nodes)
+        matrix_seconds = time.perf_counter() - started
+
+        shared = SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shared.buf)[:] = matrix
+            with instrumentation.span('portfolio.solve'):
+                runs, timed_out = self._run_pool(shared.name, matrix.shape, matrix.dtype, started,
+                                                 (hub_node, customer_nodes, vehicle_count, capacity, demands),
+                                                 net_graph)
+                for run in runs:
+                    if run.metrics:
+                        instrumentation.merge(run.metrics, under=run.solver_name)
+                    if run.shares_matrix:
+                        run.solution.cost_matrix = matrix
+        finally:
+            shared.close()
+            shared.unlink()
+
+        solved = [run.solution for run in runs if run.solution is not None]
+        best = min(solved, key=solution_rank) if solved else None
+        wall_seconds = time.perf_counter() - started
+        logger.info(f"Portfolio finished in {wall_seconds:.2f}s (matrix {matrix_seconds:.2f}s); "
+                    f"best={best.solver_name if best else None}, timed out={timed_out}")
+        return PortfolioResult(runs=runs, best=best, matrix_seconds=matrix_seconds,
+                               wall_seconds=wall_seconds, timed_out=timed_out)
+
+    def _run_pool(self, shm_name, shape, dtype, started, problem, net_graph):
+        """Fans the solvers out and collects runs until all finish or the deadline passes."""
+        finished = queue.Queue()
+        pool = mp.Pool(min(self.max_workers, len(self.solvers)), initializer=_attach_worker,
+                       initargs=(net_graph, shm_name, shape, dtype, instrumentation.is_enabled()))
+        try:
+            for name, solver in self.solvers.items():
+                # A solver or result that cannot be pickled fails outside _solve_in_worker's handler.
+                pool.apply_async(_solve_in_worker, (name, solver, problem), callback=finished.put,
+                                 error_callback=functools.partial(_failed_run, finished.put, name))
+
+            runs = {}
+            while len(runs) < len(self.solvers):
+                remaining = None if self.deadline is None else self.deadline - (time.perf_counter() - started)
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    run = finished.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                runs[run.solver_name] = run
+        finally:
+            # terminate() also stops solvers still running past the deadline.
+            pool.terminate()
+            pool.join()
+
+        timed_out = [name for name in self.solvers if name not in runs]
+        for name in timed_out:
+            logger.warning(f"Solver {name} did not finish within the {self.deadline}s deadline")
+        for run in runs.values():
+            if run.error is not None:
+                logger.error(f"Solver {run.solver_name} failed: {run.error}")
+        return [runs.get(name, SolverRun(name)) for name in self.solvers], timed_out
+
+
+def solution_rank(solution):
+    """Sort key for comparing solutions: most customers served first, then least total time."""
+    return len(solution.skipped), sum(solution.travel_times)
+
+
+def _attach_worker(net_graph, shm_name, shape, dtype, instrumented):
+    # Workers share the parent's resource tracker, which unlinks the segment once the parent is done.
+    shared = SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=dtype, buffer=shared.buf)
+    matrix.flags.writeable = False
+    _worker_state.update(net_graph=net_graph, shared=shared, matrix=matrix)
+    if instrumented:
+        instrumentation.enable()
+
+
+def _failed_run(report, name, ex):
+    report(SolverRun(name, error=repr(ex)))
+
+
+def _solve_in_worker(name, solver, problem):
+    hub_node, customer_nodes, vehicle_count, capacity, demands = problem
+    # Workers may be forked mid-run, so start from a clean slate and ship back only this solve.
+    instrumentation.reset()
+    started = time.perf_counter()
+    try:
+        solution = solver.solve(hub_node, customer_nodes, vehicle_count=vehicle_count, capacity=capacity,
+                                net_graph=_worker_state['net_graph'], demands=demands,
+                                cost_matrix=_worker_state['matrix'])
+    except Exception as ex:
+        return SolverRun(name, elapsed=time.perf_counter() - started, error=repr(ex),
+                         metrics=_worker_metrics())
+    # The parent already holds the shared matrix; don't pickle a copy of it back.
+    shares_matrix = solution.cost_matrix is _worker_state['matrix']
+    if shares_matrix:
+        solution.cost_matrix = None
+    return SolverRun(name, solution=solution, elapsed=time.perf_counter() - started,
+                     metrics=_worker_metrics(), shares_matrix=shares_matrix)
+
+
+def _worker_metrics():
+    return instrumentation.snapshot() if instrumentation.is_enabled() else None
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src import instrumentation
+from src.logger import get_logger
+from src.network.network_generator import LogisticsNetwork
+from src.network.traffic import TrafficScenarios
+from src.solvers.solution import FleetSolution
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class RobustnessReport:
+    """Travel times of one solution's routes across S traffic scenarios (minutes).
+
+    times[s, v] is vehicle v's closed route time under scenario s; fleet_times[s] their
+    sum. mean/p95/worst are per vehicle, fleet_* the same over fleet_times. baseline holds
+    the per-vehicle free-flow times (edge travel_time, no congestion).
+    """
+    solver_name: str
+    baseline: np.ndarray
+    mean: np.ndarray
+    p95: np.ndarray
+    worst: np.ndarray
+    fleet_mean: float
+    fleet_p95: float
+    fleet_worst: float
+    times: np.ndarray = field(repr=False)
+    fleet_times: np.ndarray = field(repr=False)
+
+
+class RobustnessEvaluator:
+    """Scores FleetSolutions against many traffic realizations at once.
+
+    Each route is expanded once into the edge sequence it drives (shortest paths under the
+    network's current weights, i.e. the streets the plan was made for). Scoring is then a
+    single gather of those edges' columns from the (S x E) scenario weight array and a
+    segmented sum per vehicle, with no graph mutation or path search per scenario.
+
+    scenarios: a TrafficScenarios, by default net_graph.traffic_scenarios (see
+    LogisticsNetwork.simulate_traffic_scenarios).
+    """
+
+    P95 = 95
+
+    def __init__(self, net_graph: LogisticsNetwork, scenarios: TrafficScenarios = None):
+        self.net_graph = net_graph
+        self.scenarios = net_graph.traffic_scenarios if scenarios is None else scenarios
+        if self.scenarios is None:
+            raise ValueError("No traffic scenarios; call simulate_traffic_scenarios() first.")
+        if not self.scenarios.matches(net_graph.compiled):
+            raise ValueError("traffic_scenarios were drawn for a different network topology")
+
+    def expand_routes(self, solution: FleetSolution):
+        """(edges, offsets): every route's edge indices, vehicle v's in edges[offsets[v]:offsets[v+1]]."""
+        graph = self.net_graph.compiled
+        hub_node = solution.locations[0] if solution.locations else solution.routes[0][0]
+        with instrumentation.span('robustness.expand'):
+            pieces = []
+            for route in solution.routes:
+                route = list(route)
+                # OR-Tools routes stop at the last customer; every vehicle drives back to the hub.
+                if route[-1] != hub_node or len(route) == 1:
+                    route.append(hub_node)
+                path = graph.indices_of(self.net_graph.stitch_route(route))
+                pieces.append(graph.edge_indices(path[:-1], path[1:]))
+        offsets = np.zeros(len(pieces) + 1, dtype=np.int64)
+        np.cumsum([len(piece) for piece in pieces], out=offsets[1:])
+        edges = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int64)
+        return edges, offsets
+
+    def route_times(self, edges, offsets, weights):
+        """Per-vehicle sums of weights[..., edges] over each route's segment."""
+        totals = np.zeros(weights.shape[:-1] + (len(edges) + 1,))
+        np.cumsum(weights[..., edges], axis=-1, out=totals[..., 1:])
+        return totals[..., offsets[1:]] - totals[..., offsets[:-1]]
+
+    def evaluate(self, solution: FleetSolution) -> RobustnessReport:
+        edges, offsets = self.expand_routes(solution)
+        with instrumentation.span('robustness.score'):
+            times = self.route_times(edges, offsets, self.scenarios.weights)
+            fleet_times = times.sum(axis=1)
+            baseline = self.route_times(edges, offsets, self.net_graph.edge_attribute_array('travel_time', 1.0))
+        report = RobustnessReport(
+            solver_name=solution.solver_name,
+            baseline=baseline,
+            mean=times.mean(axis=0),
+            p95=np.percentile(times, self.P95, axis=0),
+            worst=times.max(axis=0),
+            fleet_mean=float(fleet_times.mean()),
+            fleet_p95=float(np.percentile(fleet_times, self.P95)),
+            fleet_worst=float(fleet_times.max()),
+            times=times,
+            fleet_times=fleet_times,
+        )
+        logger.info(f"[{solution.solver_name}] fleet travel time over {len(self.scenarios)} scenarios: "
+                    f"mean {report.fleet_mean:.1f}, p95 {report.fleet_p95:.1f}, worst {report.fleet_worst:.1f}")
+        return report
+
+    def evaluate_all(self, solutions):
+        """{name: RobustnessReport} for a {name: FleetSolution} mapping."""
+        return {name: self.evaluate(solution) for name, solution in solutions.items()}
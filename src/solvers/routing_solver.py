@@ -8,6 +8,11 @@ class RoutingSolver(ABC):
 
     @abstractmethod
     def solve(self, hub_node, customer_nodes, vehicle_count, capacity,
-              net_graph, demands=None) -> FleetSolution:
-        """Compute routes for a fleet of vehicles serving customer_nodes."""
+              net_graph, demands=None, cost_matrix=None) -> FleetSolution:
+        """Compute routes for a fleet of vehicles serving customer_nodes.
+
+        cost_matrix: optional precomputed travel costs over [hub_node] + customer_nodes
+        (as from net_graph.build_cost_matrix), treated as read-only. Solvers that use a
+        matrix skip building their own when it is given.
+        """
         raise NotImplementedError
@@ -1,5 +1,9 @@
 from dataclasses import dataclass, field
 
+import numpy as np
+
+from src.vehicles.fleet_state import FleetState, RouteView
+
 
 @dataclass
 class FleetSolution:
@@ -9,3 +13,36 @@ class FleetSolution:
     served: set
     skipped: set
     solver_name: str
+    # Problem the routes were solved over, kept so a later re-plan can warm-start from it:
+    # locations is [hub] + customers and cost_matrix their travel costs (may be None).
+    locations: list = None
+    cost_matrix: object = field(default=None, repr=False)
+
+    @classmethod
+    def from_fleet_state(cls, state: FleetState, solver_name, skipped=None, cost_matrix=None):
+        """Wraps state without copying: routes is a RouteView over it and travel_times is state.time.
+
+        skipped defaults to every location other than the hub that no route visits.
+        """
+        served = {state.locations[i] for i in np.unique(state.stops).tolist()}
+        if skipped is None:
+            skipped = set(state.locations[1:]) - served
+        return cls(routes=RouteView(state), travel_times=state.time, served=served, skipped=set(skipped),
+                   solver_name=solver_name, locations=state.locations, cost_matrix=cost_matrix)
+
+    def to_fleet_state(self, capacity, demands=None) -> FleetState:
+        """Columnar form of this solution; the backing FleetState itself if it came from one.
+
+        demands: optional {node: demand} used to fill in the per-vehicle loads.
+        """
+        if isinstance(self.routes, RouteView):
+            return self.routes.state
+        hub_node = self.locations[0] if self.locations else self.routes[0][0]
+        locations = self.locations
+        if locations is None:
+            stops = (node for route in self.routes for node in route if node != hub_node)
+            locations = [hub_node] + list(dict.fromkeys(stops)) + sorted(set(self.skipped), key=str)
+        state = FleetState.from_routes(self.routes, locations, capacity, time=self.travel_times)
+        if demands is not None:
+            state.load = state.route_loads([0.0] + [demands.get(node, 0) for node in locations[1:]])
+        return state
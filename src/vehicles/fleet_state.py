@@ -0,0 +1,159 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+
+class FleetState:
+    """Columnar state of a fleet: one NumPy array per attribute, routes in CSR form.
+
+    Routes are stored as location indices (into locations, whose entry 0 is the hub) in one
+    flat stops array: vehicle v visits stops[offsets[v]:offsets[v+1]], leaving from and
+    returning to the hub, which is not stored. Per vehicle: capacity, load, time (travel
+    minutes so far) and position (location index, 0 at the hub).
+
+    Per-stop and per-leg work is done on whole arrays at once, so replaying a fleet of
+    hundreds of vehicles over many cost scenarios is a handful of gathers and sums rather
+    than a Python loop per stop.
+    """
+
+    def __init__(self, locations, offsets, stops, capacity, load=None, time=None, position=None):
+        self.locations = list(locations)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int32)
+        count = len(self.offsets) - 1
+        self.capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), (count,)).copy()
+        self.load = np.zeros(count) if load is None else np.asarray(load, dtype=np.float64)
+        self.time = np.zeros(count) if time is None else np.asarray(time, dtype=np.float64)
+        self.position = np.zeros(count, dtype=np.int32) if position is None else np.asarray(position, dtype=np.int32)
+        self._legs = None
+
+    @classmethod
+    def from_routes(cls, routes, locations, capacity, **columns):
+        """Builds the CSR arrays from per-vehicle lists of node ids (hub entries are dropped)."""
+        index = {node: i for i, node in enumerate(locations)}
+        hub = locations[0]
+        stops = [[index[node] for node in route if node != hub] for route in routes]
+        offsets = np.zeros(len(stops) + 1, dtype=np.int64)
+        np.cumsum([len(route) for route in stops], out=offsets[1:])
+        flat = np.fromiter((i for route in stops for i in route), dtype=np.int32, count=int(offsets[-1]))
+        return cls(locations, offsets, flat, capacity, **columns)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def vehicle_of(self):
+        """Vehicle index of every entry of stops."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def route(self, vehicle):
+        """Stops of one vehicle as a view into the flat array."""
+        return self.stops[self.offsets[vehicle]:self.offsets[vehicle + 1]]
+
+    def route_nodes(self, vehicle):
+        """Node ids of one vehicle's closed route, hub at both ends."""
+        hub = self.locations[0]
+        return [hub] + [self.locations[i] for i in self.route(vehicle).tolist()] + [hub]
+
+    def legs(self):
+        """(sources, targets, offsets) over every leg, hub to hub; vehicle v owns legs offsets[v]:offsets[v+1]."""
+        if self._legs is None:
+            count = len(self)
+            leg_offsets = self.offsets + np.arange(count + 1)
+            # Each route's legs run over [0] + stops + [0]: shift stops right by one per vehicle.
+            targets = np.zeros(int(leg_offsets[-1]), dtype=np.int32)
+            targets[np.arange(len(self.stops)) + self.vehicle_of] = self.stops
+            sources = np.zeros_like(targets)
+            sources[1:] = targets[:-1]
+            sources[leg_offsets[:-1]] = 0
+            self._legs = sources, targets, leg_offsets
+        return self._legs
+
+    def route_times(self, costs):
+        """Travel time of every route under costs, an (N x N) matrix or an (S x N x N) scenario stack.
+
+        Returns shape (V,) or (S, V).
+        """
+        sources, targets, leg_offsets = self.legs()
+        leg_costs = np.asarray(costs)[..., sources, targets]
+        return _segment_sums(leg_costs, leg_offsets)
+
+    def arrival_times(self, costs, departure=0.0):
+        """Minutes from departure at which each entry of stops is reached (shape of stops, or (S, len(stops)))."""
+        sources, targets, leg_offsets = self.legs()
+        leg_costs = np.asarray(costs)[..., sources, targets]
+        elapsed = _segment_cumsums(leg_costs, leg_offsets)
+        # Drop each route's final leg back to the hub.
+        arrivals = np.ones(len(targets), dtype=bool)
+        arrivals[leg_offsets[1:] - 1] = False
+        return departure + elapsed[..., arrivals]
+
+    def route_loads(self, demand):
+        """Total demand on every route; demand is indexed by location."""
+        demand = np.asarray(demand, dtype=np.float64)
+        return _segment_sums(demand[self.stops], self.offsets)
+
+    def replay(self, costs, demand):
+        """Sets time and load to those of running every route in full; position back at the hub."""
+        self.time = self.route_times(costs)
+        self.load = self.route_loads(demand)
+        self.position[:] = 0
+        return self
+
+    def advance(self, vehicles, targets, travel_times, demands=0.0):
+        """Bulk move: vehicles[i] drives to location targets[i], taking travel_times[i] and picking up demands[i].
+
+        A vehicle listed more than once accumulates every move; it ends at its last target.
+        """
+        vehicles = np.asarray(vehicles, dtype=np.int64)
+        np.add.at(self.time, vehicles, np.broadcast_to(np.asarray(travel_times, dtype=np.float64), vehicles.shape))
+        np.add.at(self.load, vehicles, np.broadcast_to(np.asarray(demands, dtype=np.float64), vehicles.shape))
+        self.position[vehicles] = targets
+
+    def over_capacity(self):
+        """Indices of vehicles carrying more than their capacity."""
+        return np.flatnonzero(self.load > self.capacity + 1e-9)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.offsets, self.stops, self.capacity, self.load, self.time, self.position))
+
+
+class RouteView(Sequence):
+    """Read-only list-of-routes facade over a FleetState (closed routes of node ids, built on access)."""
+
+    def __init__(self, state: FleetState):
+        self.state = state
+
+    def __len__(self):
+        return len(self.state)
+
+    def __getitem__(self, vehicle):
+        if isinstance(vehicle, slice):
+            return [self.state.route_nodes(v) for v in range(len(self))[vehicle]]
+        if vehicle < 0:
+            vehicle += len(self)
+        if not 0 <= vehicle < len(self):
+            raise IndexError(vehicle)
+        return self.state.route_nodes(vehicle)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _segment_sums(values, offsets):
+    """Sums values[..., offsets[k]:offsets[k+1]] for every k (empty segments give 0)."""
+    totals = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=totals[..., 1:])
+    return totals[..., offsets[1:]] - totals[..., offsets[:-1]]
+
+
+def _segment_cumsums(values, offsets):
+    """Running sums of values, restarting at every offset."""
+    totals = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=totals[..., 1:])
+    segment = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return totals[..., 1:] - totals[..., offsets[:-1]][..., segment]
@@ -1,4 +1,7 @@
 class Vehicle:
+    # Slotted: no per-instance dict, which adds up over large simulated fleets.
+    __slots__ = ('vehicle_id', 'capacity', 'hub', 'customer_nodes', 'current_node', 'route_history',
+                 'travel_time', 'carried_load', 'skipped_nodes')
 
     def __init__(self, vehicle_id, start_node, capacity=100):
         self.vehicle_id = vehicle_id
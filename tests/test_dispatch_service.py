@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+from src.service import dispatch_service
+from src.service.dispatch_service import MAX_BODY_BYTES, DispatchService, RequestError
+from src.solvers.greedy_solver import GreedySolver
+from tests.test_solvers_smoke import CAPACITY, CUSTOMERS, DEMANDS, HUB, VEHICLE_COUNT, build_test_network
+
+REQUEST = {"solver": "greedy", "hub": HUB, "customers": CUSTOMERS, "vehicle_count": VEHICLE_COUNT,
+           "capacity": CAPACITY, "demands": [DEMANDS[node] for node in CUSTOMERS]}
+
+
+@pytest.fixture
+def service():
+    service = DispatchService(build_test_network(), solvers={"greedy": GreedySolver}, max_workers=2)
+    yield service
+    service.close()
+
+
+async def http(socket_path, method, path, payload=None):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_service_coalesces_identical_requests_and_reuses_matrices(service, tmp_path):
+    socket_path = str(tmp_path / "dispatch.sock")
+
+    async def scenario():
+        server = asyncio.ensure_future(service.serve(socket_path=socket_path))
+        while not (tmp_path / "dispatch.sock").exists():
+            await asyncio.sleep(0.01)
+        try:
+            first, second = await asyncio.gather(http(socket_path, "POST", "/solve", REQUEST),
+                                                 http(socket_path, "POST", "/solve", REQUEST))
+            third = await http(socket_path, "POST", "/solve", {**REQUEST, "vehicle_count": 1})
+            bad = await http(socket_path, "POST", "/solve", {**REQUEST, "customers": ["nowhere"]})
+            stats = await http(socket_path, "GET", "/stats")
+        finally:
+            server.cancel()
+        return first, second, third, bad, stats
+
+    first, second, third, bad, stats = asyncio.run(scenario())
+
+    assert first[0] == second[0] == third[0] == 200
+    assert first[1] == second[1]
+    assert set(first[1]["served"]) | set(first[1]["skipped"]) == set(CUSTOMERS)
+    assert len(third[1]["routes"]) == 1
+    assert bad[0] == 400 and "nowhere" in bad[1]["error"]
+    assert stats[1]["solves"] == 2
+    assert stats[1]["coalesced"] == 1
+    assert stats[1]["matrix_hits"] == 1 and stats[1]["matrix_misses"] == 1
+
+
+def test_service_solves_with_default_or_tools_solver():
+    service = DispatchService(build_test_network(), max_workers=1)
+    try:
+        result = asyncio.run(service.solve({key: value for key, value in REQUEST.items() if key != "solver"}))
+    finally:
+        service.close()
+
+    assert result["solver"] == "or_tools"
+    assert set(result["served"]) | set(result["skipped"]) == set(CUSTOMERS)
+
+
+@pytest.mark.parametrize("change", [{"demands": [[1]] * len(CUSTOMERS)}, {"demands": ["5"] * len(CUSTOMERS)},
+                                    {"demands": [5]}, {"capacity": 7.5}, {"capacity": "150"},
+                                    {"vehicle_count": "3"}, {"vehicle_count": 2.9}, {"vehicle_count": 0}])
+def test_service_rejects_malformed_counts_and_demands(service, change):
+    with pytest.raises(RequestError):
+        asyncio.run(service.solve({**REQUEST, **change}))
+
+
+def test_worker_does_not_send_the_request_matrix_back(monkeypatch):
+    net_graph = build_test_network()
+    matrix = net_graph.build_cost_matrix([HUB] + CUSTOMERS)
+    monkeypatch.setitem(dispatch_service._worker_state, "net_graph", net_graph)
+
+    solution, shares_matrix = dispatch_service._solve_in_worker(
+        GreedySolver, (HUB, CUSTOMERS, VEHICLE_COUNT, CAPACITY, DEMANDS, matrix))
+
+    assert shares_matrix and solution.cost_matrix is None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /solve HTTP/1.1\r\nContent-Length: lots\r\n\r\n", 400),
+    (b"POST /solve HTTP/1.1\r\nContent-Length: -5\r\n\r\n", 400),
+    (f"POST /solve HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n".encode(), 413),
+])
+def test_service_answers_malformed_http_with_an_error_status(service, tmp_path, raw, status):
+    socket_path = str(tmp_path / "dispatch.sock")
+
+    async def scenario():
+        server = await asyncio.start_unix_server(service.handle_connection, path=socket_path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    head, _, body = asyncio.run(scenario()).partition(b"\r\n\r\n")
+    assert int(head.split()[1]) == status
+    assert "error" in json.loads(body)
+    assert service.stats["errors"] == 1
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from src.solvers.solution import FleetSolution
+from src.vehicles.fleet_state import RouteView
+from tests.test_solvers_smoke import CAPACITY, CUSTOMERS, DEMANDS, HUB
+
+LOCATIONS = [HUB] + CUSTOMERS
+
+
+@pytest.fixture
+def solution():
+    # OR-Tools style open routes, a greedy style closed one and an unused vehicle.
+    return FleetSolution(routes=[[HUB, "c2", "c1"], [HUB, "c3", "c5", HUB], [HUB]], travel_times=[1.0, 2.0, 0.0],
+                         served={"c1", "c2", "c3", "c5"}, skipped={"c4"}, solver_name="manual",
+                         locations=LOCATIONS)
+
+
+def route_cost(route, matrix):
+    index = [LOCATIONS.index(node) for node in route]
+    return sum(matrix[a, b] for a, b in zip(index, index[1:]))
+
+
+def test_fleet_state_round_trip_shares_arrays(solution):
+    state = solution.to_fleet_state(CAPACITY, demands=DEMANDS)
+
+    assert state.offsets.tolist() == [0, 2, 4, 4]
+    assert state.stops.tolist() == [2, 1, 3, 5]
+    assert state.load.tolist() == [20, 20, 0]
+    assert state.time.tolist() == [1.0, 2.0, 0.0]
+
+    wrapped = FleetSolution.from_fleet_state(state, "manual")
+    assert wrapped.routes == [[HUB, "c2", "c1", HUB], [HUB, "c3", "c5", HUB], [HUB, HUB]]
+    assert wrapped.routes[-1] == [HUB, HUB]
+    assert isinstance(wrapped.routes, RouteView)
+    assert wrapped.served == solution.served and wrapped.skipped == {"c4"}
+    # No copies either way: the solution reads the state's arrays, and converts back to the same state.
+    assert wrapped.travel_times is state.time
+    assert wrapped.to_fleet_state(CAPACITY) is state
+    assert np.shares_memory(state.route(1), state.stops)
+
+
+def test_fleet_state_replays_routes_over_scenarios(solution):
+    rng = np.random.default_rng(3)
+    stack = rng.uniform(1, 10, (4, len(LOCATIONS), len(LOCATIONS)))
+    state = solution.to_fleet_state(CAPACITY)
+    routes = [state.route_nodes(v) for v in range(len(state))]
+
+    times = state.route_times(stack)
+    assert times.shape == (4, 3)
+    for s in range(4):
+        assert times[s] == pytest.approx([route_cost(route, stack[s]) for route in routes])
+
+    arrivals = state.arrival_times(stack[0], departure=100)
+    assert arrivals[1] == pytest.approx(100 + route_cost([HUB, "c2", "c1"], stack[0]))
+    assert arrivals[3] == pytest.approx(100 + route_cost([HUB, "c3", "c5"], stack[0]))
+
+    demand = [0] + [DEMANDS[node] for node in CUSTOMERS]
+    state.replay(stack[0], demand)
+    assert state.time == pytest.approx(times[0])
+    assert state.over_capacity().tolist() == []
+
+    state.advance([0, 2, 2], [4, 4, 5], [1.5, 2.0, 3.0], demands=[5, 20, 20])
+    assert state.position.tolist() == [4, 0, 5]
+    assert state.load.tolist() == [25, 20, 40]
+    assert state.over_capacity().tolist() == [2]
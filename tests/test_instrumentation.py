@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from src import instrumentation
+from src.solvers.portfolio import SolverPortfolio
+from src.solvers.greedy_solver import GreedySolver
+from src.solvers.or_solver import ORSolver
+from tests.test_solvers_smoke import CAPACITY, CUSTOMERS, DEMANDS, HUB, VEHICLE_COUNT, build_test_network
+
+
+@pytest.fixture
+def instrumented():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_instrumentation_records_nothing():
+    instrumentation.reset()
+    with instrumentation.span("stage"):
+        instrumentation.count("calls")
+    assert instrumentation.snapshot() == {"spans": {}, "counters": {}}
+
+
+def test_spans_nest_and_network_counters_accumulate(instrumented):
+    net_graph = build_test_network()
+    with instrumentation.span("dispatch"):
+        net_graph.build_cost_matrix([HUB] + CUSTOMERS)
+        net_graph.get_path_distance(HUB, "c3")
+
+    report = json.loads(json.dumps(instrumentation.report()))
+    assert report["spans"]["dispatch"]["count"] == 1
+    assert report["spans"]["dispatch/network.cost_matrix"]["count"] == 1
+    assert report["counters"]["dijkstra.sources"] == len(CUSTOMERS) + 1
+    assert report["counters"]["dijkstra.settled"] == (len(CUSTOMERS) + 1) ** 2
+    assert report["counters"]["path_cache.hits"] == 1
+    assert report["counters"]["queries.dijkstra"] == 1
+
+
+def test_portfolio_merges_worker_metrics(instrumented):
+    portfolio = SolverPortfolio({"greedy": GreedySolver(), "or_tools": ORSolver()})
+    with instrumentation.span("solve"):
+        portfolio.run(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT, capacity=CAPACITY,
+                      net_graph=build_test_network(), demands=DEMANDS)
+
+    spans = instrumentation.snapshot()["spans"]
+    assert "solve/portfolio.solve/greedy/greedy.routes" in spans
+    assert "solve/portfolio.solve/or_tools/or_tools.search" in spans
+    assert instrumentation.snapshot()["counters"]["or_tools.solutions"] >= 1
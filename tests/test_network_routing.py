@@ -0,0 +1,445 @@
+import math
+import random
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.network.geo import haversine_m
+from src.network.network_generator import LogisticsNetwork
+from src.network.path_search import point_to_point
+from src.solvers.greedy_solver import GreedySolver
+from src.solvers.robustness import RobustnessEvaluator
+from tests.test_solvers_smoke import HUB, CUSTOMERS, build_test_network
+
+
+@pytest.fixture
+def net_graph():
+    return build_test_network()
+
+
+def test_cost_matrix_matches_pairwise_queries(net_graph):
+    nodes = [HUB] + CUSTOMERS
+    matrix = net_graph.build_cost_matrix(nodes)
+
+    assert matrix.shape == (len(nodes), len(nodes))
+    for i, u in enumerate(nodes):
+        for j, v in enumerate(nodes):
+            assert math.isclose(matrix[i, j], net_graph.get_path_distance(u, v), abs_tol=1e-12)
+
+
+def test_cost_matrix_supports_rectangular_and_repeated_sources(net_graph):
+    matrix = net_graph.build_cost_matrix(["c1", "c1", HUB], targets=["c5"])
+
+    assert matrix.shape == (3, 1)
+    assert matrix[0, 0] == matrix[1, 0]
+    assert np.isfinite(matrix).all()
+
+
+def test_path_queries_match_networkx(net_graph):
+    graph = net_graph.NetGraph
+    for target in CUSTOMERS:
+        expected = nx.shortest_path_length(graph, HUB, target, weight="weight")
+        assert math.isclose(net_graph.get_path_distance(HUB, target), expected, abs_tol=1e-12)
+
+        path = net_graph.shortest_path(HUB, target)
+        assert path[0] == HUB and path[-1] == target
+        assert math.isclose(nx.path_weight(graph, path, weight="weight"), expected, abs_tol=1e-12)
+
+
+def test_compiled_snapshot_rebuilds_after_traffic_change(net_graph):
+    before = net_graph.compiled
+    assert net_graph.compiled is before
+
+    net_graph.simulate_traffic(intensity=2.5)
+    after = net_graph.compiled
+
+    assert after is not before
+    assert after.version > before.version
+    assert math.isclose(net_graph.get_path_distance(HUB, "c5"),
+                        nx.shortest_path_length(net_graph.NetGraph, HUB, "c5", weight="weight"))
+
+
+def test_path_cache_reuses_trees_until_weights_change(net_graph):
+    cache = net_graph.path_cache
+    net_graph.get_path_distance(HUB, "c1")
+    net_graph.get_path_distance(HUB, "c5")
+    net_graph.build_cost_matrix([HUB], targets=CUSTOMERS)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    net_graph.simulate_traffic(intensity=2.0)
+    assert len(cache) == 0
+    net_graph.get_path_distance(HUB, "c1")
+    assert cache.misses == 2
+
+
+def test_path_cache_evicts_least_recently_used_within_budget():
+    net_graph = build_test_network()
+    distances, predecessors = net_graph._shortest_path_tree(0)
+    net_graph.path_cache.clear()
+    net_graph.path_cache.max_bytes = 2 * (distances.nbytes + predecessors.nbytes)
+
+    for source in ["c1", "c2", "c1", "c3"]:
+        net_graph.get_path_distance(source, HUB)
+
+    cache = net_graph.path_cache
+    assert cache.used_bytes <= cache.max_bytes
+    assert cache.evictions == 1
+    c1, c2, c3 = (net_graph.compiled.index_of(node) for node in ["c1", "c2", "c3"])
+    assert c1 in cache and c3 in cache and c2 not in cache
+
+
+def build_grid_network(size=12, seed=7):
+    # Roughly 100 m blocks around DUMBO so x/y read as lon/lat.
+    rng = random.Random(seed)
+    g = nx.DiGraph()
+    for x in range(size):
+        for y in range(size):
+            g.add_node((x, y), x=-73.9894 + x * 0.0012, y=40.7033 + y * 0.0009)
+    for x in range(size):
+        for y in range(size):
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                neighbour = (x + dx, y + dy)
+                # Drop a few directions to get one-way streets.
+                if neighbour in g and rng.random() > 0.15:
+                    g.add_edge((x, y), neighbour, length=rng.uniform(50, 400), speed_kph=rng.choice([25, 40]))
+    return LogisticsNetwork(input_graph=g)
+
+
+def assert_queries_match(net_graph, pairs, expected):
+    for (s, t), dist in zip(pairs, expected):
+        assert math.isclose(net_graph.get_path_distance(s, t), dist, abs_tol=1e-9)
+        if dist != float("inf"):
+            path = net_graph.shortest_path(s, t)
+            assert (path[0], path[-1]) == (s, t)
+            assert math.isclose(nx.path_weight(net_graph.NetGraph, path, weight="weight"), dist, abs_tol=1e-9)
+
+
+def test_cost_matrix_retains_paths_for_stitching_within_budget():
+    net_graph = build_grid_network()
+    stops = random.Random(3).sample(list(net_graph.NetGraph.nodes), 8)
+
+    for budget in (net_graph.retained_paths.max_bytes, 64):
+        net_graph.retained_paths.max_bytes = budget
+        net_graph.mark_graph_changed()
+        matrix = net_graph.build_cost_matrix(stops)
+        assert net_graph.retained_paths.used_bytes <= budget
+        net_graph.path_cache.clear()
+        misses = net_graph.path_cache.misses
+
+        for i, source in enumerate(stops):
+            for j, target in enumerate(stops):
+                if np.isfinite(matrix[i, j]):
+                    path = net_graph.shortest_path(source, target)
+                    assert (path[0], path[-1]) == (source, target)
+                    assert math.isclose(nx.path_weight(net_graph.NetGraph, path, weight="weight"),
+                                        matrix[i, j], abs_tol=1e-9)
+        # Retained subtrees answer without searching; past the budget it searches on demand.
+        searched = net_graph.path_cache.misses > misses
+        assert searched == (budget == 64)
+
+
+def test_spatial_index_matches_brute_force_and_survives_traffic():
+    net_graph = build_grid_network()
+    graph = net_graph.compiled
+    rng = np.random.default_rng(5)
+    lons = rng.uniform(graph.x.min() - 0.001, graph.x.max() + 0.001, 300)
+    lats = rng.uniform(graph.y.min() - 0.001, graph.y.max() + 0.001, 300)
+    metres = haversine_m(lons[:, None], lats[:, None], graph.x[None, :], graph.y[None, :])
+
+    index = net_graph.spatial_index
+    nearest, distances = index.nearest(lons, lats, k=3)
+    assert np.allclose(distances, np.sort(metres, axis=1)[:, :3], atol=1e-3)
+    assert net_graph.snap_to_nodes(lons, lats) == [graph.node_ids[i] for i in nearest[:, 0]]
+    assert all(node is None for node in net_graph.snap_to_nodes(lons[:5] + 1.0, lats[:5], max_distance=500))
+
+    within = index.within(lons[0], lats[0], 250)
+    assert sorted(within.tolist()) == np.flatnonzero(metres[0] < 250).tolist()
+    assert within[0] == nearest[0, 0]
+
+    # Weight-only changes keep the tree; topology changes rebuild it.
+    net_graph.simulate_traffic(intensity=2.0)
+    assert net_graph.spatial_index is index
+    net_graph.add_location("depot", "warehouse", x=float(lons[0]), y=float(lats[0]))
+    assert net_graph.snap_to_nodes(lons[0], lats[0]) == ["depot"]
+
+
+def test_contraction_hierarchy_matches_dijkstra_before_and_after_traffic():
+    net_graph = build_grid_network()
+    nodes = list(net_graph.NetGraph.nodes)
+    pairs = [(nodes[i], nodes[-1 - 3 * i]) for i in range(0, 40, 3)]
+
+    for intensity in (None, 2.5):
+        if intensity is not None:
+            net_graph.simulate_traffic(intensity=intensity)
+        net_graph.set_query_method("dijkstra")
+        expected = [net_graph.get_path_distance(s, t) for s, t in pairs]
+
+        net_graph.set_query_method("ch")
+        assert_queries_match(net_graph, pairs, expected)
+
+    hierarchy = net_graph.contraction_hierarchy
+    net_graph.simulate_traffic(intensity=1.0)
+    assert net_graph.contraction_hierarchy is hierarchy  # customized, not rebuilt
+
+
+def test_astar_matches_dijkstra_and_settles_fewer_nodes():
+    net_graph = build_grid_network(size=20)
+    net_graph.simulate_traffic(intensity=2.0)
+    graph = net_graph.compiled
+    assert graph.min_cost_per_metre() > 0
+
+    pairs = [((0, 0), (19, 19)), ((0, 19), (19, 0)), ((3, 5), (17, 12))]
+    expected = [net_graph.get_path_distance(s, t) for s, t in pairs]
+    net_graph.set_query_method("astar")
+    assert_queries_match(net_graph, pairs, expected)
+
+    s, t = graph.index_of((0, 0)), graph.index_of((19, 19))
+    _, _, dijkstra_settled = point_to_point(graph, s, t)
+    _, _, astar_settled = point_to_point(graph, s, t, heuristic=True)
+    assert astar_settled <= dijkstra_settled
+
+
+def test_traffic_scenarios_leave_graph_untouched_and_drive_queries():
+    net_graph = build_grid_network()
+    weights_before = net_graph.compiled.weights.copy()
+    scenarios = net_graph.simulate_traffic_scenarios(intensities=[1.0, 2.5], seeds=[1, 2])
+
+    assert scenarios.weights.shape == (2, net_graph.compiled.edge_count)
+    assert np.array_equal(net_graph.compiled.weights, weights_before)
+    travel_times = net_graph.edge_attribute_array("travel_time", 1.0)
+    assert (scenarios.weights >= travel_times).all()
+    assert scenarios.weights[1].sum() > scenarios.weights[0].sum()
+
+    # Reference: write scenario 1 onto a copy of the graph and ask networkx.
+    reference = net_graph.NetGraph.copy()
+    for (u, v), weight in zip(reference.edges, scenarios.weights[1]):
+        reference.edges[u, v]["weight"] = weight
+    source, target = (0, 0), (11, 11)
+    expected = nx.shortest_path_length(reference, source, target, weight="weight")
+
+    for method in ("dijkstra", "astar", "ch"):
+        net_graph.set_query_method(method)
+        assert math.isclose(net_graph.get_path_distance(source, target, scenario=1), expected)
+    matrix = net_graph.build_cost_matrix([source], targets=[target], scenario=1)
+    assert math.isclose(matrix[0, 0], expected)
+
+
+def test_robustness_scores_fixed_routes_across_scenarios():
+    net_graph = build_grid_network()
+    nodes = list(net_graph.NetGraph.nodes)
+    hub, customers = nodes[0], random.Random(4).sample(nodes[1:], 12)
+    solution = GreedySolver().solve(hub, customers, vehicle_count=3, capacity=1000, net_graph=net_graph,
+                                    demands={node: 1 for node in customers})
+    scenarios = net_graph.simulate_traffic_scenarios(intensities=[1.5] * 40, seeds=range(40))
+
+    report = RobustnessEvaluator(net_graph).evaluate(solution)
+
+    assert report.times.shape == (40, 3)
+    # Reference: walk each stitched route edge by edge.
+    edge_weight = {edge: i for i, edge in enumerate(net_graph.NetGraph.edges)}
+    free_flow = net_graph.edge_attribute_array("travel_time", 1.0)
+    for v, route in enumerate(solution.routes):
+        nodes = net_graph.stitch_route(route)
+        path = [edge_weight[edge] for edge in zip(nodes, nodes[1:])]
+        assert report.baseline[v] == pytest.approx(free_flow[path].sum())
+        for s in (0, 17, 39):
+            assert report.times[s, v] == pytest.approx(scenarios.weights[s][path].sum())
+    assert (report.worst >= report.p95).all() and (report.p95 >= report.mean).all()
+    assert (report.mean >= report.baseline).all()
+    assert report.fleet_mean == pytest.approx(report.times.sum(axis=1).mean())
+    assert report.fleet_worst == pytest.approx(report.times.sum(axis=1).max())
+
+
+def test_initialization_fills_metadata_and_composite_weights():
+    net_graph = build_grid_network(size=6)
+    edges = list(net_graph.NetGraph.edges(data=True))
+    minutes = np.array([d["length"] / (d["speed_kph"] * 1000 / 60) for _, _, d in edges])
+    lengths = np.array([d["length"] for _, _, d in edges])
+
+    def scale(values):
+        return (values - values.min()) / (values.max() - values.min())
+
+    expected = 0.7 * scale(minutes) + 0.3 * scale(lengths)
+    assert np.allclose([d["travel_time"] for _, _, d in edges], minutes)
+    assert np.allclose([d["weight"] for _, _, d in edges], expected)
+    assert all(10 <= d["capacity"] <= 50 for _, _, d in edges)
+
+    nodes = net_graph.NetGraph.nodes(data=True)
+    assert all({"type", "urgency", "demand", "pos"} <= set(data) for _, data in nodes)
+    assert sum(data["type"] == "warehouse" for _, data in nodes) == 1
+
+
+def test_npz_cache_round_trip_is_lazy(net_graph, tmp_path):
+    net_graph.NetGraph.edges[HUB, "c1"]["osmid"] = [11, 12]
+    net_graph.NetGraph.edges[HUB, "c1"]["name"] = "Front Street"
+    path = tmp_path / "net.npz"
+    net_graph.save_to_npz(str(path))
+
+    loaded = LogisticsNetwork.load_from_npz(str(path))
+    nodes = [HUB] + CUSTOMERS
+    assert np.array_equal(loaded.build_cost_matrix(nodes), net_graph.build_cost_matrix(nodes))
+    assert np.array_equal(loaded.node_attribute_array("demand", 0), net_graph.node_attribute_array("demand", 0))
+    assert loaded.get_stats()["edge_count"] == net_graph.NetGraph.number_of_edges()
+    assert loaded._net_graph is None
+
+    assert list(loaded.NetGraph.nodes(data=True)) == list(net_graph.NetGraph.nodes(data=True))
+    assert list(loaded.NetGraph.edges(data=True)) == list(net_graph.NetGraph.edges(data=True))
+
+    loaded.simulate_traffic(intensity=2.5)
+    assert math.isclose(loaded.get_path_distance(HUB, "c5"),
+                        nx.shortest_path_length(loaded.NetGraph, HUB, "c5", weight="weight"))
+
+
+def test_tables_select_columns_and_export_to_parquet(net_graph, tmp_path):
+    pytest.importorskip("pyarrow")
+    net_graph.NetGraph.edges[HUB, "c1"]["name"] = ["Front Street", "Main Street"]
+    net_graph.save_to_npz(str(tmp_path / "net.npz"))
+    loaded = LogisticsNetwork.load_from_npz(str(tmp_path / "net.npz"))
+
+    for network in (net_graph, loaded):
+        urgency = network.node_table(columns=["urgency"])
+        assert list(urgency.columns) == ["node_id", "urgency"]
+        assert set(urgency.loc[urgency["urgency"] >= 1, "node_id"]) == set(CUSTOMERS)
+
+        chunks = list(network.iter_edge_tables(columns=["name", "capacity"], chunk_size=7))
+        assert [len(chunk) for chunk in chunks] == [7, 7, 7, 7, 2]
+
+        network.export_to_parquet(str(tmp_path / "export"), edge_columns=["name", "weight"], chunk_size=7)
+        edges = pd.read_parquet(tmp_path / "export_edges.parquet")
+        assert list(edges.columns) == ["start_node", "end_node", "name", "weight"]
+        assert edges.loc[(edges["start_node"] == HUB) & (edges["end_node"] == "c1"), "name"].item() \
+            == "Front Street, Main Street"
+        assert np.allclose(edges["weight"], net_graph.edge_attribute_array("weight", 1))
+    assert loaded._net_graph is None
+
+
+def test_street_visualizations_reuse_the_base_layer(net_graph, tmp_path):
+    route = [HUB] + CUSTOMERS[:3] + [HUB]
+    net_graph.save_street_visualization(tmp_path / "single.png", route=route)
+    renderer = net_graph.street_renderer
+    base = renderer.base_layer()
+
+    jobs = {tmp_path / f"{name}.png": [(route, "#e74c3c"), ([HUB, CUSTOMERS[-1], HUB], "#2ecc71")]
+            for name in ("greedy", "or_tools")}
+    net_graph.save_street_visualizations(jobs, max_workers=2)
+
+    assert net_graph.street_renderer is renderer and renderer.base_layer() is base
+    assert all(path.stat().st_size > 0 for path in [tmp_path / "single.png", *jobs])
+
+    net_graph.simulate_traffic(intensity=2.0)
+    assert net_graph.street_renderer is not renderer
+
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="0.0" lon="0.000"/>
+  <node id="2" lat="0.0" lon="0.001"/>
+  <node id="3" lat="0.0" lon="0.002"/>
+  <node id="4" lat="0.0" lon="0.003"/>
+  <node id="5" lat="0.0" lon="0.004"/>
+  <node id="6" lat="0.0" lon="0.005"/>
+  <node id="7" lat="0.001" lon="0.003"/>
+  <node id="99" lat="1.0" lon="1.0"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><nd ref="5"/><tag k="highway" v="primary"/><tag k="maxspeed" v="30 mph"/></way>
+  <way id="12"><nd ref="5"/><nd ref="6"/><tag k="highway" v="residential"/><tag k="oneway" v="yes"/></way>
+  <way id="13"><nd ref="4"/><nd ref="7"/><tag k="highway" v="footway"/></way>
+  <way id="14"><nd ref="5"/><nd ref="99"/><tag k="highway" v="residential"/></way>
+  <way id="15"><nd ref="3"/><nd ref="5"/><tag k="highway" v="tertiary"/><tag k="oneway" v="-1"/></way>
+  <relation id="20"><member type="way" ref="10" role=""/><tag k="type" v="route"/></relation>
+</osm>
+"""
+
+
+def test_osm_file_loads_offline_into_drivable_strongly_connected_network(tmp_path):
+    from src.network.spatial_data_mapper import SpatialDataMapper
+
+    path = tmp_path / "extract.osm"
+    path.write_text(OSM_EXTRACT)
+    network = SpatialDataMapper.from_file(path, bbox=(-0.01, -0.01, 0.01, 0.01))
+    graph = network.compiled
+
+    # 2 and 4 are plain way nodes (the footway does not count), 6 is a one-way dead end, 99 outside the bbox.
+    assert sorted(graph.node_ids) == [1, 3, 5]
+    assert set(network.NetGraph.edges) == {(1, 3), (3, 1), (3, 5), (5, 3)}
+
+    data = network.NetGraph.edges[1, 3]
+    assert data['length'] == pytest.approx(haversine_m(0.0, 0.0, 0.002, 0.0))
+    assert data['travel_time'] == pytest.approx(data['length'] / (30 * 1000 / 60))
+    # Way 15 also runs 5 -> 3, but slower than the 30 mph primary; the faster edge is kept.
+    assert network.NetGraph.edges[5, 3]['speed_kph'] == pytest.approx(30 * 1.609344)
+    assert network.NetGraph.edges[5, 3]['highway'] == 'primary'
+    assert 0 <= network.NetGraph.edges[5, 3]['weight'] <= 1
+    assert sum(d['type'] == 'warehouse' for _, d in network.NetGraph.nodes(data=True)) == 1
+    assert network.get_path_distance(1, 5) > 0
+
+    # The same area read back from GraphML, cut out around a centre point.
+    exported = nx.DiGraph()
+    exported.add_nodes_from((n, {'x': d['x'], 'y': d['y']}) for n, d in network.NetGraph.nodes(data=True))
+    exported.add_edges_from((u, v, {'length': d['length'], 'highway': d['highway'], 'oneway': bool(d['oneway'])})
+                            for u, v, d in network.NetGraph.edges(data=True))
+    nx.write_graphml(exported, tmp_path / "extract.graphml")
+    reloaded = SpatialDataMapper.from_file(tmp_path / "extract.graphml", center_point=(0.0, 0.0), radius_m=350)
+    assert sorted(reloaded.compiled.node_ids) == [1, 3]
+
+
+def test_from_place_starts_the_sample_at_the_node_nearest_the_centre(monkeypatch):
+    import osmnx as ox
+
+    from src.network import spatial_data_mapper
+
+    download = nx.MultiDiGraph(crs="epsg:4326")
+    for i in range(6):
+        for j in range(6):
+            download.add_node(i * 6 + j, x=0.001 * j, y=0.001 * i)
+            for a, b in ((i * 6 + j, i * 6 + j + 1), (i * 6 + j, (i + 1) * 6 + j)):
+                if b < 36 and (b - a == 6 or j < 5):
+                    for u, v in ((a, b), (b, a)):
+                        download.add_edge(u, v, highway="residential", maxspeed="30", length=111.0)
+    monkeypatch.setattr(ox, "graph_from_place", lambda *args, **kwargs: download)
+
+    network = spatial_data_mapper.SpatialDataMapper.from_place("Anywhere", target_nodes=4,
+                                                               center_point=(0.0031, 0.0019))
+    nodes = network.NetGraph.nodes(data=True)
+    assert 20 in network.NetGraph  # nearest node to the centre starts the sample
+    assert len(nodes) < 36
+    assert [data["type"] for _, data in nodes].count("warehouse") == 1
+
+
+def test_spatial_index_handles_empty_node_sets():
+    from src.network.spatial_index import SpatialIndex
+
+    index = SpatialIndex([], [], [])
+    assert index.coordinates([]).shape == (0, 3)
+    assert index.snap([0.0], [0.0]) == [None]
+    with pytest.raises(ValueError):
+        index.coordinates([0])
+
+
+def test_graphml_loader_reads_list_tags_and_falls_back_from_zero_speeds(tmp_path):
+    from src.network.spatial_data_mapper import SpatialDataMapper
+
+    keys = "".join(f'<key id="{name}" for="{scope}" attr.name="{name}" attr.type="string"/>'
+                   for scope, name in (("node", "x"), ("node", "y"), ("edge", "highway"),
+                                       ("edge", "length"), ("edge", "speed_kph")))
+    nodes = "".join(f'<node id="{i}"><data key="x">{0.001 * i}</data><data key="y">0.0</data></node>'
+                    for i in range(1, 4))
+    edges = [(1, 2, "['residential', 'service']", "0"), (2, 1, "['residential', 'service']", "25"),
+             (2, 3, "primary", "0"), (3, 2, "primary", "abc"), (3, 1, "['service', 'residential']", "30")]
+    edges = "".join(f'<edge source="{u}" target="{v}"><data key="highway">{highway}</data>'
+                    f'<data key="length">100</data><data key="speed_kph">{speed}</data></edge>'
+                    for u, v, highway, speed in edges)
+    path = tmp_path / "extract.graphml"
+    path.write_text(f'<?xml version="1.0"?><graphml xmlns="http://graphml.graphdrawing.org/xmlns">{keys}'
+                    f'<graph edgedefault="directed">{nodes}{edges}</graph></graphml>')
+
+    network = SpatialDataMapper.from_file(path)
+    edges = network.NetGraph.edges
+    # List-valued ways are judged by their first tag, so 3 -> 1 (service first) is not drivable.
+    assert set(edges) == {(1, 2), (2, 1), (2, 3), (3, 2)}
+    assert edges[2, 1]["speed_kph"] == 25
+    # Zero or unreadable speeds fall back to the road type's default instead of an infinite time.
+    assert edges[1, 2]["speed_kph"] == 30 and edges[2, 3]["speed_kph"] == edges[3, 2]["speed_kph"] == 60
+    assert all(np.isfinite(data["travel_time"]) for _, _, data in edges(data=True))
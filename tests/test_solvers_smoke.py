@@ -1,9 +1,18 @@
+import time
+
 import networkx as nx
+import numpy as np
 import pytest
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
 from src.network.network_generator import LogisticsNetwork
+from src.network.traffic import rush_hour_intensities
+from src.solvers.decomposition_solver import DecompositionSolver
 from src.solvers.greedy_solver import GreedySolver
+from src.solvers.local_search import LocalSearch, LocalSearchSolver
 from src.solvers.or_solver import ORSolver
+from src.solvers.portfolio import SolverPortfolio, solution_rank
+from src.solvers.solution import FleetSolution
 
 HUB = "hub"
 CUSTOMERS = ["c1", "c2", "c3", "c4", "c5"]
@@ -70,3 +79,229 @@ def test_or_solver_returns_valid_solution(net_graph):
     )
     assert solution.solver_name == "or_tools"
     assert_valid_solution(solution)
+
+
+def test_or_solver_keeps_fractional_costs_in_fixed_point():
+    # Costs well below one minute, which rounding to whole units would flatten to zero.
+    locations = [HUB] + CUSTOMERS
+    x = np.array([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+    matrix = np.abs(x[:, None] - x[None, :]) + 0.01
+    np.fill_diagonal(matrix, 0)
+    solver = ORSolver(time_limit=0.5)
+    assert solver.search_time_limit(1000) == 0.5
+    assert ORSolver().search_time_limit(5) == ORSolver.MIN_TIME_LIMIT
+    assert ORSolver().search_time_limit(5000) == ORSolver.MAX_TIME_LIMIT
+
+    solution = solver.solve(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT, capacity=CAPACITY,
+                            net_graph=build_test_network(), demands=DEMANDS, cost_matrix=matrix)
+
+    assert_valid_solution(solution)
+    assert solution.skipped == set()
+    position = {node: i for i, node in enumerate(locations)}
+    for route, travel_time in zip(solution.routes, solution.travel_times):
+        legs = zip(route, route[1:] + [HUB])
+        assert travel_time == pytest.approx(sum(matrix[position[u], position[v]] for u, v in legs))
+    # Best plan: c1..c2 then c3..c5, each out and back along the line.
+    assert sum(solution.travel_times) == pytest.approx(0.2 * 2 + 0.5 * 2 + 7 * 0.01)
+
+
+def test_greedy_solver_search_expansion_returns_valid_solution(net_graph):
+    solution = GreedySolver(expansion="search").solve(
+        HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+        capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS,
+    )
+    assert_valid_solution(solution)
+
+
+@pytest.mark.parametrize("partition, max_workers", [("sweep", 1), ("kmeans", 2)])
+def test_decomposition_solver_returns_valid_solution(net_graph, partition, max_workers):
+    solver = DecompositionSolver(sub_solver=GreedySolver(), cluster_size=2, partition=partition,
+                                 max_workers=max_workers)
+    solution = solver.solve(
+        HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+        capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS,
+    )
+    assert solution.solver_name == "decomposition"
+    assert_valid_solution(solution)
+    for route, travel_time in zip(solution.routes, solution.travel_times):
+        legs = zip(route, route[1:])
+        assert travel_time == pytest.approx(sum(net_graph.get_path_distance(u, v) for u, v in legs))
+
+
+def test_local_search_untangles_routes_and_inserts_skipped_stops(net_graph):
+    # Stops on a line (one-way streets make going out dearer than coming back), served by
+    # zig-zagging routes with a stop left out that still fits.
+    locations = [HUB] + CUSTOMERS
+    x = np.arange(len(locations), dtype=float)
+    matrix = np.abs(x[:, None] - x[None, :]) * np.where(x[:, None] < x[None, :], 1.5, 1.0)
+    seed = FleetSolution(routes=[[HUB, "c5", "c1", "c4", HUB], [HUB, "c2"]], travel_times=[0, 0],
+                         served={"c1", "c2", "c4", "c5"}, skipped={"c3"}, solver_name="manual",
+                         locations=locations, cost_matrix=matrix)
+    position = {node: i for i, node in enumerate(locations)}
+
+    def cost(route):
+        return sum(matrix[position[u], position[v]] for u, v in zip(route, route[1:]))
+
+    solution = LocalSearch(time_limit=5).improve(seed, CAPACITY, demands=DEMANDS)
+
+    assert solution.solver_name == "manual+local_search"
+    assert solution.skipped == set()
+    assert_valid_solution(solution)
+    assert solution.travel_times == pytest.approx([cost(route) for route in solution.routes])
+    # Optimal: one vehicle runs out to c5 and back, the other serves c1..c2 on the way.
+    assert sum(solution.travel_times) == pytest.approx(5 * 1.5 + 5 + 2 * 1.5 + 2)
+
+    with pytest.raises(ValueError):
+        LocalSearch().improve(seed, CAPACITY)
+
+    improved = LocalSearchSolver().solve(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT, capacity=CAPACITY,
+                                         net_graph=net_graph, demands=DEMANDS)
+    assert_valid_solution(improved)
+    assert improved.skipped == set()
+
+
+class SleepySolver(GreedySolver):
+    """Greedy solver that overruns any short deadline."""
+
+    def solve(self, *args, **kwargs):
+        time.sleep(30)
+        return super().solve(*args, **kwargs)
+
+
+class BrokenSolver(GreedySolver):
+    """Solver that fails outright."""
+
+    def solve(self, *args, **kwargs):
+        raise RuntimeError("solver bug")
+
+
+class UnpicklableSolver(GreedySolver):
+    """Solver whose solution cannot be sent back from the worker."""
+
+    def solve(self, *args, **kwargs):
+        solution = super().solve(*args, **kwargs)
+        solution.served = {lambda: None}
+        return solution
+
+
+def test_portfolio_runs_solvers_on_a_shared_matrix(net_graph):
+    portfolio = SolverPortfolio({"greedy": GreedySolver(), "or_tools": ORSolver()})
+    result = portfolio.run(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+                           capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+
+    assert [run.solver_name for run in result.runs] == ["greedy", "or_tools"]
+    for run in result.runs:
+        assert run.error is None and run.elapsed >= 0
+        assert_valid_solution(run.solution)
+    assert result.best is min((run.solution for run in result.runs), key=solution_rank)
+    assert result.timed_out == []
+    # Solutions come back without the shared matrix and get the parent's copy.
+    assert result.runs[0].solution.cost_matrix.shape == (len(CUSTOMERS) + 1,) * 2
+
+
+def test_portfolio_reports_failing_solvers_without_aborting(net_graph):
+    portfolio = SolverPortfolio({"greedy": GreedySolver(), "broken": BrokenSolver(),
+                                 "unpicklable": UnpicklableSolver()})
+    result = portfolio.run(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+                           capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+
+    greedy, broken, unpicklable = result.runs
+    assert greedy.error is None and result.best is greedy.solution
+    assert broken.solution is None and "solver bug" in broken.error
+    assert unpicklable.solution is None and unpicklable.error
+    assert result.timed_out == []
+
+
+def test_portfolio_keeps_best_solution_at_deadline(net_graph):
+    portfolio = SolverPortfolio({"greedy": GreedySolver(), "sleepy": SleepySolver()}, deadline=3)
+    started = time.perf_counter()
+    result = portfolio.run(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+                           capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+
+    assert time.perf_counter() - started < 10
+    assert result.timed_out == ["sleepy"]
+    assert result.best.solver_name == "greedy"
+    assert result.runs[1].solution is None
+
+
+def test_portfolio_runs_decomposition_serially_inside_its_workers(net_graph):
+    decomposition = DecompositionSolver(sub_solver=GreedySolver(), cluster_size=2, max_workers=2)
+    portfolio = SolverPortfolio({"greedy": GreedySolver(), "decomposition": decomposition})
+    result = portfolio.run(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+                           capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+
+    greedy, decomposed = result.runs
+    assert greedy.error is None and decomposed.error is None
+    assert decomposed.solution.solver_name == "decomposition"
+    assert_valid_solution(decomposed.solution)
+
+
+def test_update_cost_matrix_matches_full_build(net_graph):
+    old = [HUB, "c1", "c2", "c3"]
+    new = [HUB, "c1", "c3", "c4", "c5"]
+    updated = net_graph.update_cost_matrix(net_graph.build_cost_matrix(old), old, new)
+    assert updated == pytest.approx(net_graph.build_cost_matrix(new))
+
+
+def test_or_solver_resolve_warm_starts_from_previous_solution(net_graph):
+    previous = ORSolver().solve(HUB, ["c1", "c2", "c3", "c4"], vehicle_count=VEHICLE_COUNT,
+                                capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+    assert previous.locations == [HUB, "c1", "c2", "c3", "c4"]
+
+    solution = ORSolver().resolve(previous, capacity=CAPACITY, net_graph=net_graph,
+                                  added=["c5"], removed=["c2"], demands=DEMANDS, time_limit=0.5)
+
+    assert solution.served | solution.skipped == {"c1", "c3", "c4", "c5"}
+    assert "c5" in solution.served
+    assert all("c2" not in route for route in solution.routes)
+    assert solution.locations == [HUB, "c1", "c3", "c4", "c5"]
+    assert len(solution.routes) == VEHICLE_COUNT
+
+
+def test_or_solver_time_dependent_costs_follow_departure_buckets(net_graph):
+    net_graph.simulate_traffic_scenarios(intensities=[1.0, 3.0], seeds=1)
+    locations = [HUB] + CUSTOMERS
+    costs = net_graph.build_time_dependent_costs(locations, bucket_minutes=0.01)
+
+    assert costs.costs.shape == (2, len(locations), len(locations))
+    assert costs.bucket(-5) == 0 and costs.bucket(0.015) == 1 and costs.bucket(99) == 1
+    mixed = costs.departure_matrix([0.0, 0.02, 0.0, 0.02, 0.0, 0.0])
+    assert mixed[1] == pytest.approx(costs.costs[1, 1])
+    assert mixed[2] == pytest.approx(costs.costs[0, 2])
+
+    solution = ORSolver().solve_time_dependent(HUB, CUSTOMERS, VEHICLE_COUNT, CAPACITY, net_graph,
+                                               costs, departure=0.0, demands=DEMANDS)
+    assert_valid_solution(solution)
+    index = {node: i for i, node in enumerate(locations)}
+    for route, travel_time in zip(solution.routes, solution.travel_times):
+        stops = [index[node] for node in route] + [0]
+        assert travel_time == pytest.approx(costs.route_times(stops, 0.0)[1])
+
+
+def test_rush_hour_intensities_peak_at_rush_hours():
+    intensities = rush_hour_intensities(bucket_minutes=15)
+    assert len(intensities) == 96
+    assert intensities[32] > intensities[48] > 1.0 - 1e-9  # 8:00 vs noon
+    assert max(intensities) == pytest.approx(3.0, abs=0.05)
+
+
+def test_or_solver_resolve_falls_back_with_configured_search(net_graph, monkeypatch):
+    previous = ORSolver().solve(HUB, CUSTOMERS, vehicle_count=VEHICLE_COUNT,
+                                capacity=CAPACITY, net_graph=net_graph, demands=DEMANDS)
+    searches = []
+    solve_with_parameters = pywrapcp.RoutingModel.SolveWithParameters
+
+    def record(routing, parameters, *args):
+        searches.append(parameters)
+        return solve_with_parameters(routing, parameters, *args)
+
+    monkeypatch.setattr(pywrapcp.RoutingModel, "SolveWithParameters", record)
+    # Halving capacity makes the previous routes an infeasible warm start.
+    solver = ORSolver(first_solution_strategy="SAVINGS", local_search_metaheuristic="TABU_SEARCH")
+    solution = solver.resolve(previous, capacity=CAPACITY // 2, net_graph=net_graph, demands=DEMANDS,
+                              time_limit=0.5)
+
+    assert len(searches) == 1
+    assert searches[0].first_solution_strategy == routing_enums_pb2.FirstSolutionStrategy.SAVINGS
+    assert searches[0].local_search_metaheuristic == routing_enums_pb2.LocalSearchMetaheuristic.TABU_SEARCH
+    assert all(sum(DEMANDS[node] for node in route[1:]) <= CAPACITY // 2 for route in solution.routes)